@@ -0,0 +1,114 @@
+"""
+Embedding 后端基准与一致性检查：PyTorch (type: local) vs ONNX Runtime (type: onnx)。
+
+用法:
+    python scripts/bench_embeddings.py                  # 使用 config.yaml 中的模型与 ONNX 参数
+    python scripts/bench_embeddings.py -n 200 --tolerance 0.02
+
+从 Vault 中取前 N 个分块作为样本，每个后端在独立子进程中运行 (互不影响峰值内存)，报告：
+- 吞吐量 (分块/秒，不含模型加载) 与加载耗时
+- 峰值 RSS
+- 一致性：同一分块两个后端向量的最小余弦相似度，以及两两相似度的最大偏差
+最大偏差超过 --tolerance 时以非零状态退出。
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+def load_samples(config_path: str, limit: int):
+    from src.core.config import load_config
+    from src.core.chunker import MarkdownChunker
+    from src.core.scanner import VaultScanner
+    from src.utils.hashing import extract_body
+
+    cfg = load_config(config_path)
+    chunker = MarkdownChunker(cfg.embedding.chunk_max_tokens)
+    texts = []
+    for p in VaultScanner(cfg.vault_path, cfg.scanner.ignore).iter_all():
+        body = extract_body(p.read_text(encoding="utf-8", errors="ignore"))
+        texts.extend(c.text for c in chunker.split(body))
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+def run_backend(config_path: str, backend: str, samples_path: str, output_path: str):
+    """子进程：加载一个后端，向量化样本并写出结果与耗时"""
+    from src.core.config import load_config
+    from src.core.vector_store import create_embedding_model
+
+    cfg = load_config(config_path)
+    cfg.embedding.type = backend
+    texts = json.loads(Path(samples_path).read_text(encoding="utf-8"))
+
+    start = time.perf_counter()
+    model = create_embedding_model(cfg.embedding, cfg.get_active_llm_config())
+    load_seconds = time.perf_counter() - start
+
+    model.embed_documents(texts[:2]) # 预热
+    start = time.perf_counter()
+    vectors = model.embed_documents(texts)
+    embed_seconds = time.perf_counter() - start
+
+    Path(output_path).write_text(json.dumps({
+        "vectors": [list(map(float, v)) for v in vectors],
+        "load_seconds": load_seconds,
+        "embed_seconds": embed_seconds,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }), encoding="utf-8")
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding 后端基准与一致性检查")
+    parser.add_argument("-c", "--config", default="config.yaml", help="配置文件路径")
+    parser.add_argument("-n", "--samples", type=int, default=100, help="样本分块数量")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="两两余弦相似度允许的最大偏差")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--samples-file", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        run_backend(args.config, args.backend, args.samples_file, args.output)
+        return
+
+    from src.core.onnx_embeddings import parity_report
+
+    texts = load_samples(args.config, args.samples)
+    if len(texts) < 2:
+        sys.exit("Vault 中的样本不足，无法比较")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        samples_file = Path(tmp) / "samples.json"
+        samples_file.write_text(json.dumps(texts, ensure_ascii=False), encoding="utf-8")
+
+        results = {}
+        for backend in ("local", "onnx"):
+            output = Path(tmp) / f"{backend}.json"
+            subprocess.run([sys.executable, __file__, "-c", args.config, "--backend", backend,
+                            "--samples-file", str(samples_file), "--output", str(output)],
+                           cwd=Path.cwd(), check=True)
+            results[backend] = json.loads(output.read_text(encoding="utf-8"))
+
+    print(f"\n样本: {len(texts)} 个分块")
+    print(f"{'backend':<10}{'load (s)':>10}{'chunks/s':>12}{'peak RSS (MB)':>16}")
+    for backend, r in results.items():
+        print(f"{backend:<10}{r['load_seconds']:>10.1f}{len(texts) / r['embed_seconds']:>12.1f}{r['max_rss_mb']:>16.0f}")
+    speedup = results["local"]["embed_seconds"] / results["onnx"]["embed_seconds"]
+    print(f"ONNX 吞吐量提升: {speedup:.2f}x")
+
+    report = parity_report(results["local"]["vectors"], results["onnx"]["vectors"])
+    print(f"最小自身余弦相似度: {report['min_self_cosine']:.4f}")
+    print(f"两两相似度最大偏差: {report['max_pairwise_delta']:.4f} (容差 {args.tolerance})")
+    if report["max_pairwise_delta"] > args.tolerance:
+        sys.exit("一致性检查未通过")
+    print("一致性检查通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+CLI 启动耗时基准：多次以子进程运行各命令，报告墙钟时间的中位数与最小值。
+
+用法:
+    python scripts/bench_startup.py            # 默认每条命令运行 5 次
+    python scripts/bench_startup.py -n 10
+    python scripts/bench_startup.py --importtime "tags list"   # 打印该命令最慢的导入模块
+
+只读命令 (tags list / blacklist list) 会真实执行；其余命令只测 --help，
+即 "进程启动 + 加载 CLI" 的成本，不会触发索引或 LLM 调用。
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+COMMANDS = [
+    "tags list",
+    "blacklist list",
+    "--help",
+    "init --help",
+    "update --help",
+    "apply --help",
+    "watch --help",
+    "restore --help",
+]
+
+def run_once(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "src.main", *args], cwd=PROJECT_ROOT,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    return (time.perf_counter() - start) * 1000
+
+def bench(repeat: int):
+    print(f"{'command':<20}{'median (ms)':>14}{'min (ms)':>12}")
+    for command in COMMANDS:
+        args = command.split()
+        run_once(args) # 预热 (文件系统缓存 / .pyc)
+        samples = [run_once(args) for _ in range(repeat)]
+        print(f"{command:<20}{statistics.median(samples):>14.0f}{min(samples):>12.0f}")
+
+def importtime(command: str, top: int = 15):
+    """用 python -X importtime 找出某条命令最慢的导入 (按累计耗时排序)"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-m", "src.main", *command.split()],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True, check=False)
+    rows = []
+    for line in result.stderr.splitlines():
+        # 格式: "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].rstrip()))
+    for cumulative_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>10.1f} ms  {name}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CLI 启动耗时基准")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="每条命令运行的次数")
+    parser.add_argument("--importtime", metavar="COMMAND", help="分析某条命令的导入耗时，例如 \"tags list\"")
+    args = parser.parse_args()
+
+    if args.importtime:
+        importtime(args.importtime)
+    else:
+        bench(args.repeat)
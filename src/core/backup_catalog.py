@@ -0,0 +1,167 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+import sqlite3
+import threading
+import time
+
+class BackupCatalog:
+    """
+    备份目录 (SQLite)：每次备份一行 (路径, 日期, 时间, 原修改时间, 内容哈希, 大小, 运行 ID)。
+    恢复时按索引直接查询，不再遍历备份目录；同时支持列出文件的所有版本、按运行撤销与按时间点恢复。
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                started REAL NOT NULL,
+                command TEXT NOT NULL,
+                finished REAL
+            )"""
+        )
+        # 旧版数据库没有 finished 列 (当时的运行都是结束时一次性写入的，视为已完成)
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(runs)")}
+        if "finished" not in columns:
+            self._conn.execute("ALTER TABLE runs ADD COLUMN finished REAL")
+            self._conn.execute("UPDATE runs SET finished = started")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS versions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL,
+                date TEXT NOT NULL,
+                time REAL NOT NULL,
+                mtime REAL,
+                blob TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                run_id TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_versions_path ON versions(path, time)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_versions_date ON versions(date)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_versions_run ON versions(run_id)")
+        self._conn.commit()
+
+    # --- 写入 ---
+    def start_run(self, run_id: str, command: str, started: Optional[float] = None, in_progress: bool = False):
+        """
+        登记一次运行。in_progress=True 表示运行进行中 (finish_run 之前)，
+        进行中的运行之后写入的对象不会被回收 (见 oldest_open_run)。
+        """
+        started = started if started is not None else time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, started, command, finished) VALUES (?, ?, ?, ?)",
+                (run_id, started, command, None if in_progress else started)
+            )
+            self._conn.commit()
+
+    def finish_run(self, run_id: str):
+        """标记运行结束；没有任何备份记录的运行直接删除 (如 watch 中没有修改文件的批次)"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET finished = ? WHERE run_id = ?", (time.time(), run_id))
+            self._conn.execute(
+                "DELETE FROM runs WHERE run_id = ? AND NOT EXISTS (SELECT 1 FROM versions WHERE run_id = ?)",
+                (run_id, run_id)
+            )
+
+    def oldest_open_run(self, since: float) -> Optional[float]:
+        """since 之后开始、尚未结束的运行中最早的开始时间 (更早的未结束运行视为已中断)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(started) FROM runs WHERE finished IS NULL AND started >= ?", (since,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_many(self, records: Iterable[Dict[str, Any]]):
+        """批量写入备份记录 (同一事务)，记录字段：path, date, time, mtime, blob, size, run_id"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO versions (path, date, time, mtime, blob, size, run_id) "
+                "VALUES (:path, :date, :time, :mtime, :blob, :size, :run_id)",
+                list(records)
+            )
+            self._conn.commit()
+
+    def add(self, record: Dict[str, Any]):
+        self.add_many([record])
+
+    def expire(self, before_date: str, before: float) -> int:
+        """
+        删除早于指定日期 (YYYY-MM-DD) 的备份记录及其空运行，返回删除的记录数。
+        进行中的运行 (开始时间晚于 before 的未结束运行) 即使暂时没有记录也保留。
+        """
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM versions WHERE date < ?", (before_date,))
+            self._conn.execute(
+                "DELETE FROM runs WHERE run_id NOT IN (SELECT DISTINCT run_id FROM versions) "
+                "AND (finished IS NOT NULL OR started < ?)", (before,)
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    # --- 查询 ---
+    def _select(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params)]
+
+    def get(self, version_id: int) -> Optional[Dict[str, Any]]:
+        rows = self._select("SELECT * FROM versions WHERE id = ?", (version_id,))
+        return rows[0] if rows else None
+
+    def latest(self, path: str) -> Optional[Dict[str, Any]]:
+        rows = self._select("SELECT * FROM versions WHERE path = ? ORDER BY time DESC, id DESC LIMIT 1", (path,))
+        return rows[0] if rows else None
+
+    def versions(self, path: str) -> List[Dict[str, Any]]:
+        """文件的所有备份版本 (新 -> 旧)"""
+        return self._select("SELECT * FROM versions WHERE path = ? ORDER BY time DESC, id DESC", (path,))
+
+    def by_date(self, date: str) -> List[Dict[str, Any]]:
+        """某天每个文件的最后一次备份"""
+        return self._select(
+            "SELECT * FROM versions WHERE id IN (SELECT MAX(id) FROM versions WHERE date = ? GROUP BY path) "
+            "ORDER BY path", (date,)
+        )
+
+    def by_run(self, run_id: str) -> List[Dict[str, Any]]:
+        """某次运行中每个文件的第一次备份 (即运行开始前的内容)"""
+        return self._select(
+            "SELECT * FROM versions WHERE id IN (SELECT MIN(id) FROM versions WHERE run_id = ? GROUP BY path) "
+            "ORDER BY path", (run_id,)
+        )
+
+    def as_of(self, timestamp: float) -> List[Dict[str, Any]]:
+        """
+        恢复到某个时间点所需的版本：备份记录的是修改前的内容，
+        因此每个文件取该时间点之后的第一次备份；之后没有备份的文件从那时起未被修改。
+        """
+        return self._select(
+            "SELECT * FROM versions WHERE id IN ("
+            "  SELECT MIN(v.id) FROM versions v JOIN ("
+            "    SELECT path, MIN(time) AS t FROM versions WHERE time >= ? GROUP BY path"
+            "  ) f ON v.path = f.path AND v.time = f.t GROUP BY v.path"
+            ") ORDER BY path", (timestamp,)
+        )
+
+    def runs(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """运行列表 (新 -> 旧)，附带每次运行备份的文件数"""
+        sql = ("SELECT r.run_id, r.started, r.command, r.finished, COUNT(DISTINCT v.path) AS files "
+               "FROM runs r LEFT JOIN versions v ON v.run_id = r.run_id "
+               "GROUP BY r.run_id ORDER BY r.started DESC")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._select(sql)
+
+    def referenced_blobs(self) -> Set[str]:
+        with self._lock:
+            return {r[0] for r in self._conn.execute("SELECT DISTINCT blob FROM versions")}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
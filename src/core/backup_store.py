@@ -0,0 +1,99 @@
+from pathlib import Path
+from typing import Optional, Set
+import hashlib
+import os
+import threading
+from rich.console import Console
+
+console = Console()
+
+class BlobStore:
+    """
+    内容寻址的备份对象库：objects/<哈希前两位>/<sha256>[.zst]
+    相同内容只存储一份；可选 zstd 压缩 (需要安装 zstandard)。
+    """
+
+    def __init__(self, root: Path, compression: str = "none", level: int = 3):
+        self.root = Path(root)
+        self.level = level
+        self._lock = threading.Lock()
+        self._compressor = None
+        if compression == "zstd":
+            try:
+                import zstandard
+                self._compressor = zstandard.ZstdCompressor(level=level)
+            except ImportError:
+                console.print("[yellow]未安装 zstandard，备份不压缩 (pip install zstandard)[/yellow]")
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _path(self, digest: str, compressed: bool) -> Path:
+        return self.root / digest[:2] / (digest + (".zst" if compressed else ""))
+
+    def find(self, digest: str) -> Optional[Path]:
+        """对象文件路径 (压缩或未压缩)，不存在时返回 None"""
+        for compressed in (True, False):
+            path = self._path(digest, compressed)
+            if path.exists():
+                return path
+        return None
+
+    def put(self, data: bytes) -> str:
+        """
+        存入内容并返回其哈希。已存在相同内容时不写入 (一次 stat)，
+        否则写入临时文件后重命名，避免中断留下不完整的对象。
+        """
+        digest = self.hash_bytes(data)
+        existing = self.find(digest)
+        if existing is not None:
+            # 刷新修改时间：对象可能正被一次进行中的运行引用，不能被并发的 gc 当作旧对象回收
+            try:
+                os.utime(existing)
+                return digest
+            except OSError:
+                pass # 刚被回收，重新写入
+
+        compressed = self._compressor is not None
+        path = self._path(digest, compressed)
+        payload = self._compressor.compress(data) if compressed else data
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        path = self.find(digest)
+        if path is None:
+            raise FileNotFoundError(f"备份对象不存在: {digest}")
+        data = path.read_bytes()
+        if path.suffix == ".zst":
+            import zstandard
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return data
+
+    def gc(self, referenced: Set[str], keep_after: Optional[float] = None) -> int:
+        """
+        删除不再被任何备份记录引用的对象 (以及中断留下的临时文件)，返回删除数量。
+        keep_after: 修改时间不早于该时间的对象一律保留 (进行中的运行已写入对象、尚未写入备份记录)
+        """
+        removed = 0
+        if not self.root.exists():
+            return 0
+        for path in self.root.glob("*/*"):
+            if path.suffix == ".tmp" or path.name.split(".", 1)[0] not in referenced:
+                try:
+                    if keep_after is not None and path.stat().st_mtime >= keep_after:
+                        continue
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+        for shard in self.root.iterdir():
+            if shard.is_dir() and not any(shard.iterdir()):
+                shard.rmdir()
+        return removed
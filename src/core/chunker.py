@@ -0,0 +1,164 @@
+from typing import List, Tuple, NamedTuple
+import math
+import re
+
+from src.utils.hashing import hash_text
+
+# 中日韩字符：bge 等中文模型的分词器基本按单字切分，每个字约 1 个 token
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]")
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+_PUNCT_RE = re.compile(r"[^\sA-Za-z0-9_]")
+_HEADING_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+# 计数单元：连续空白 / 英文单词 / 其余单个字符 (CJK 字或标点)
+_ATOM_RE = re.compile(r"\s+|[A-Za-z0-9_]+|.", re.S)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计文本的 token 数 (不加载分词器)。
+    CJK 字符按 1 个 token 计，英文单词按每 4 个字符 1 个 token 计，标点按 1 个 token 计。
+    """
+    cjk = len(_CJK_RE.findall(text))
+    rest = _CJK_RE.sub(" ", text)
+    words = sum(math.ceil(len(w) / 4) for w in _WORD_RE.findall(rest))
+    punct = len(_PUNCT_RE.findall(rest))
+    return cjk + words + punct
+
+
+class Chunk(NamedTuple):
+    index: int
+    heading: str # 所在标题路径，如 "安装 > 依赖"
+    text: str
+    hash: str
+    tokens: int
+
+
+class MarkdownChunker:
+    """
+    按 Markdown 标题与 token 预算切分笔记。
+    - 切分结果是正文的连续切片，按顺序拼接 ("".join) 可还原原文
+    - 同样的输入总是得到同样的切分 (确定性)，因此未变化的分块可以通过哈希跳过重新索引
+    """
+
+    def __init__(self, max_tokens: int = 400):
+        self.max_tokens = max(16, max_tokens)
+
+    def split(self, text: str) -> List[Chunk]:
+        if not text.strip():
+            return []
+
+        segments: List[Tuple[str, str]] = [] # (heading, text)
+        for heading, section in self._split_sections(text):
+            if estimate_tokens(section) <= self.max_tokens:
+                segments.append((heading, section))
+            else:
+                segments.extend((heading, piece) for piece in self._split_oversized(section))
+
+        # 贪心合并相邻的小片段，避免产生大量过短的分块
+        merged: List[Tuple[str, str, int]] = []
+        for heading, piece in segments:
+            tokens = estimate_tokens(piece)
+            if merged and merged[-1][2] + tokens <= self.max_tokens:
+                prev_heading, prev_text, prev_tokens = merged[-1]
+                merged[-1] = (prev_heading, prev_text + piece, prev_tokens + tokens)
+            elif merged and not piece.strip():
+                # 纯空白片段并入前一块，保证拼接后可还原原文
+                prev_heading, prev_text, prev_tokens = merged[-1]
+                merged[-1] = (prev_heading, prev_text + piece, prev_tokens)
+            else:
+                merged.append((heading, piece, tokens))
+
+        return [
+            Chunk(index=i, heading=heading, text=piece, hash=hash_text(piece), tokens=tokens)
+            for i, (heading, piece, tokens) in enumerate(merged)
+        ]
+
+    def _split_sections(self, text: str) -> List[Tuple[str, str]]:
+        """按标题行切分 (忽略代码块中的 # 行)"""
+        sections: List[Tuple[str, str]] = []
+        stack: List[Tuple[int, str]] = [] # (level, title)
+        current_heading = ""
+        buf: List[str] = []
+        in_fence = False
+
+        for line in text.splitlines(keepends=True):
+            if _FENCE_RE.match(line):
+                in_fence = not in_fence
+            match = None if in_fence else _HEADING_RE.match(line.rstrip("\r\n"))
+            if match:
+                if buf:
+                    sections.append((current_heading, "".join(buf)))
+                    buf = []
+                level = len(match.group(1))
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, match.group(2).strip()))
+                current_heading = " > ".join(title for _, title in stack)
+            buf.append(line)
+
+        if buf:
+            sections.append((current_heading, "".join(buf)))
+        return sections
+
+    def _split_oversized(self, section: str) -> List[str]:
+        """将超出预算的章节按段落 -> 行 -> 字符逐级切分"""
+        pieces: List[str] = []
+        for para in re.split(r"(?<=\n\n)", section):
+            if not para:
+                continue
+            if estimate_tokens(para) <= self.max_tokens:
+                pieces.append(para)
+                continue
+            for line in para.splitlines(keepends=True):
+                if estimate_tokens(line) <= self.max_tokens:
+                    pieces.append(line)
+                else:
+                    pieces.extend(self._hard_split(line))
+
+        # 合并为不超过预算的片段
+        result: List[str] = []
+        buf, buf_tokens = "", 0
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if buf and buf_tokens + tokens > self.max_tokens:
+                result.append(buf)
+                buf, buf_tokens = "", 0
+            buf += piece
+            buf_tokens += tokens
+        if buf:
+            result.append(buf)
+        return result
+
+    def _hard_split(self, line: str) -> List[str]:
+        """
+        按 token 预算切分超长的单行 (例如没有换行的长段落)，尽量在空白处断开。
+        逐个计数单元 (单词 / 单字 / 标点) 累加，计数方式与 estimate_tokens 一致，切出的片段不会超出预算。
+        """
+        result: List[str] = []
+        start, used, last_space = 0, 0, -1
+        word_chars = self.max_tokens * 4 # 单个超长单词按此长度切开 (每 4 个字符 1 个 token)
+        for m in _ATOM_RE.finditer(line):
+            atom = m.group()
+            if atom.isspace():
+                last_space = m.end()
+                continue
+            cost = estimate_tokens(atom)
+            while used + cost > self.max_tokens and m.start() > start:
+                cut = last_space if last_space > start else m.start()
+                result.append(line[start:cut])
+                start = cut
+                used = estimate_tokens(line[start:m.start()])
+            if cost > self.max_tokens:
+                if used:
+                    result.append(line[start:m.start()])
+                    start = m.start()
+                while m.end() - start > word_chars:
+                    result.append(line[start:start + word_chars])
+                    start += word_chars
+                used = estimate_tokens(line[start:m.end()])
+                continue
+            used += cost
+        if start < len(line):
+            result.append(line[start:])
+        return result
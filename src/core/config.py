@@ -1,4 +1,4 @@
-from typing import Optional, Literal, Dict, Any
+from typing import Optional, Literal, Dict, Any, List
 from pathlib import Path
 import yaml
 import os
@@ -6,8 +6,22 @@ import re
 from pydantic import BaseModel, Field, ValidationError
 
 class EmbeddingConfig(BaseModel):
-    type: Literal["local", "api"] = "local"
+    type: Literal["local", "api", "onnx"] = "local" # onnx = 同一本地模型经 ONNX Runtime 推理 (可 int8 量化)
     model_name: str = "BAAI/bge-large-zh-v1.5"
+    chunk_max_tokens: int = 400 # 单个分块的 token 预算 (bge 系列模型最多 512 token，超出部分会被截断)
+    cache_enable: bool = True # 是否缓存 Embedding 结果 (按分块内容哈希 + 模型名)
+    cache_dir: str = "./.auto_link_cache/embeddings"
+    batch_size: int = Field(default=64, ge=1) # init 时每批写入向量库的分块数量
+    checkpoint_interval: int = Field(default=10, ge=1) # 每隔多少批次保存一次进度 (断点续传)
+    embed_workers: int = Field(default=1, ge=1) # init 时并行计算 Embedding 的进程数 (每个进程各加载一份模型)
+    embed_worker_threads: int = Field(default=0, ge=0) # 每个进程的线程数，0 表示 CPU 核心数 / 进程数
+    # ONNX Runtime 后端 (type: onnx)
+    onnx_dir: str = "./.auto_link_cache/onnx" # 导出 / 量化后的模型存放目录
+    onnx_quantize: bool = True # int8 动态量化 (更快、内存更小，结果与 fp32 略有差异)
+    onnx_threads: int = Field(default=0, ge=0) # intra-op 线程数，0 表示由 onnxruntime 决定
+    onnx_batch_size: int = Field(default=16, ge=1) # 每次推理的文本数量
+    onnx_max_length: int = Field(default=512, ge=8) # 单个文本的最大 token 数 (超出部分截断)
+    onnx_pooling: Optional[Literal["cls", "mean"]] = None # 池化方式，None 表示读取模型的 sentence-transformers 配置
 
 class ProviderConfig(BaseModel):
     provider_type: Literal["openai", "openai_compatible", "anthropic", "google"]
@@ -15,27 +29,79 @@ class ProviderConfig(BaseModel):
     api_key: Optional[str] = None
     model: str
     temperature: float = 0.3
+    # 限流与重试 (同一 Provider 的所有调用共享配额)
+    requests_per_minute: Optional[int] = None # 每分钟请求数上限，None 表示不限制
+    tokens_per_minute: Optional[int] = None # 每分钟输入 token 上限 (按 Prompt 长度估算)
+    max_retries: int = 3 # 遇到 429/超时/5xx 时的最大重试次数
+    retry_base_delay: float = 1.0 # 指数退避的基础等待时间 (秒)
+    retry_max_delay: float = 30.0 # 单次等待的上限 (秒)
+
+class ScannerConfig(BaseModel):
+    # 忽略规则 (glob)，匹配目录/文件名或相对于 Vault 的路径；被忽略的目录不会被遍历
+    ignore: List[str] = Field(default_factory=lambda: [
+        ".git", ".obsidian", ".trash", ".auto_link_backups", "System", "templates", "Templates"
+    ])
+
+class WatchConfig(BaseModel):
+    backend: Literal["auto", "native", "polling"] = "auto" # native = watchdog (inotify 等)，auto 在不可用时回退到轮询
+    debounce_seconds: float = 2.0 # 文件最后一次变化后等待多久再处理 (合并编辑器的连续保存)
+    poll_interval: float = 5.0 # 轮询模式下的扫描间隔
+
+class DaemonConfig(BaseModel):
+    enable: bool = True # 守护进程运行时，CLI 通过它访问 Embedding 模型与向量库 (未运行时自动回退到进程内加载)
+    socket_path: str = "./.auto_link_cache/daemon.sock" # Unix socket 路径
+    idle_timeout_minutes: float = 120 # 空闲多久后自动退出，0 表示不退出
+    request_timeout_seconds: float = Field(default=600, ge=0) # 单次请求等待守护进程响应的上限，0 表示不限制
 
 class PipelineConfig(BaseModel):
     dry_run: bool = False
+    workers: int = Field(default=1, ge=1) # 并发处理笔记的 worker 数量 (1 = 串行)
     # backup 字段已移除，统一由 SafetyConfig 控制
 
 class SafetyConfig(BaseModel):
     enable_backup: bool = True
     backup_retention_days: int = 7
     backup_path: str = "./.auto_link_backups"
+    backup_compression: Literal["none", "zstd"] = "none" # 备份对象压缩方式 (zstd 需要 pip install zstandard)
+    backup_compression_level: int = Field(default=3, ge=1, le=22) # zstd 压缩级别
 
 class ReportingConfig(BaseModel):
     enable_summary: bool = True
     log_folder: str = "System/Auto-Link-Logs"
     summary_template: Literal["markdown", "json"] = "markdown"
 
+class TaggingConfig(BaseModel):
+    batch_enable: bool = False # 是否把多篇短笔记合并到一次请求中打标
+    batch_max_notes: int = Field(default=10, ge=1) # 每个批次最多包含的笔记数
+    batch_token_budget: int = 6000 # 每个批次 Prompt 的 token 预算 (估算)，批次大小据此自适应
+    batch_note_max_chars: int = 1500 # 只有正文不超过该长度的笔记才参与批量打标
+    shortlist_enable: bool = True # 按 Embedding 相似度为每篇笔记筛选候选标签，而不是把整个白名单放进 Prompt
+    shortlist_k: int = Field(default=50, ge=1) # 每篇笔记的候选标签数量
+    cooccurrence_weight: float = Field(default=0.3, ge=0.0) # 标签共现统计的加权系数 (0 表示只看相似度)
+    predict_enable: bool = False # 本地预测标签 (相似笔记标签投票 + 共现统计)，置信度足够时不调用 LLM
+    predict_neighbors: int = Field(default=5, ge=1) # 参与投票的相似笔记数量
+    predict_min_neighbors: int = Field(default=3, ge=1) # 至少有多少篇带标签的相似笔记才尝试预测
+    predict_threshold: float = Field(default=0.6, ge=0.0, le=1.0) # 标签置信度阈值，没有任何标签达到阈值时交给 LLM
+    predict_max_tags: int = Field(default=5, ge=1) # 预测标签数量上限
+    index_path: str = "./.auto_link_cache/tag_index.sqlite3" # 标签倒排索引 (笔记 <-> 标签)，由 init / update 增量维护
+    prompt_min_notes: int = Field(default=0, ge=0) # 使用笔记数少于该值的白名单标签不放进打标 Prompt (0 = 不过滤)
+
 class SummarizationConfig(BaseModel):
     enable: bool = True
     provider: Optional[str] = None # 如果为 None，使用 active_provider
     threshold: int = 1000 # 超过此长度触发处理
     max_input_length: int = 6000 # 开启摘要时：喂给摘要模型的最大文本长度
     hard_truncate_length: int = 2000 # 关闭摘要时：直接截断的长度 (作为上下文喂给主模型)
+    cache_enable: bool = True # 是否缓存参考笔记的摘要
+    cache_path: str = "./.auto_link_cache/summaries.sqlite3"
+    cache_max_entries: int = 5000 # 缓存条目上限，超出后按最近访问时间淘汰
+
+class LLMCacheConfig(BaseModel):
+    enable: bool = True # 缓存 LLM 响应，相同的 Prompt 不再重复付费 (update --no-cache 可临时关闭)
+    path: str = "./.auto_link_cache/responses.sqlite3"
+    ttl_days: float = 30 # 缓存有效期 (天)，0 表示永不过期
+    max_entries: int = 20000 # 条目上限，超出后按最近访问时间淘汰
+    max_size_mb: float = 200 # 总大小上限 (MB)，0 表示不限制
 
 class AppConfig(BaseModel):
     vault_path: Path
@@ -44,7 +110,12 @@ class AppConfig(BaseModel):
     prompt_file: str = "prompts.yaml"
 
     embedding: EmbeddingConfig
+    scanner: ScannerConfig = Field(default_factory=ScannerConfig)
+    watch: WatchConfig = Field(default_factory=WatchConfig)
+    tagging: TaggingConfig = Field(default_factory=TaggingConfig)
     summarization: SummarizationConfig = Field(default_factory=SummarizationConfig)
+    llm_cache: LLMCacheConfig = Field(default_factory=LLMCacheConfig)
+    daemon: DaemonConfig = Field(default_factory=DaemonConfig)
     pipeline: PipelineConfig = Field(default_factory=PipelineConfig)
     safety: SafetyConfig = Field(default_factory=SafetyConfig)
     reporting: ReportingConfig = Field(default_factory=ReportingConfig)
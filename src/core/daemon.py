@@ -0,0 +1,344 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from rich.console import Console
+
+from src.core.config import AppConfig
+from src.core.chunker import MarkdownChunker, Chunk
+from src.core.note_embedding import NoteEmbedding, note_vector
+
+console = Console()
+
+# 消息格式：4 字节大端长度 + UTF-8 JSON
+_HEADER = struct.Struct(">I")
+
+def _send(stream, payload: Dict[str, Any]):
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+def _recv_exact(stream, size: int) -> Optional[bytes]:
+    buf = b""
+    while len(buf) < size:
+        chunk = stream.read(size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return buf
+
+def _recv(stream) -> Optional[Dict[str, Any]]:
+    header = _recv_exact(stream, _HEADER.size)
+    if header is None:
+        return None
+    data = _recv_exact(stream, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return json.loads(data.decode("utf-8"))
+
+def _store_identity(cfg: AppConfig, persist_directory: str) -> Dict[str, Any]:
+    """守护进程与客户端必须使用相同的模型、分块参数与向量库目录"""
+    return {
+        "embedding_type": cfg.embedding.type,
+        "model_name": cfg.embedding.model_name,
+        "chunk_max_tokens": cfg.embedding.chunk_max_tokens,
+        "persist_directory": str(Path(persist_directory).resolve()),
+        "vault_path": str(cfg.vault_path),
+    }
+
+def _encode_note(note: NoteEmbedding) -> Dict[str, Any]:
+    return {"chunks": [list(c) for c in note.chunks], "vectors": note.vectors, "vector": note.vector}
+
+def _decode_note(data: Dict[str, Any]) -> NoteEmbedding:
+    return NoteEmbedding(
+        chunks=[Chunk(*c) for c in data["chunks"]],
+        vectors=data["vectors"],
+        vector=data["vector"],
+    )
+
+# -----------------------------------------------------------------------------
+# 服务端
+# -----------------------------------------------------------------------------
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # 一个连接上可以连续发送多个请求
+        while True:
+            try:
+                request = _recv(self.rfile)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            response = self.server.owner.dispatch(request)
+            try:
+                _send(self.wfile, response)
+            except OSError:
+                return
+
+class VectorStoreDaemon:
+    """
+    常驻进程：持有已加载的 Embedding 模型与 Chroma 客户端，通过 Unix socket 为 CLI 提供
+    embed / search / upsert 服务，避免每次运行都重新加载模型。
+    Embedding 请求可并发执行；向量库读写由一把锁串行化。
+    """
+
+    def __init__(self, cfg: AppConfig, socket_path: Path, idle_timeout: float = 0,
+                 persist_directory: str = "./chroma_db"):
+        from src.core.vector_store import VectorStoreManager
+
+        self.cfg = cfg
+        self.socket_path = Path(socket_path).resolve()
+        self.idle_timeout = idle_timeout
+        self.identity = _store_identity(cfg, persist_directory)
+        self.vector_mgr = VectorStoreManager(cfg.embedding, cfg.get_active_llm_config(), persist_directory,
+                                             vault_root=cfg.vault_path)
+
+        self._db_lock = threading.Lock()
+        self._last_request = time.monotonic()
+        self._server: Optional[_Server] = None
+        self._methods: Dict[str, Callable[..., Any]] = {
+            "ping": self._ping,
+            "shutdown": self._shutdown,
+            "embed_documents": self.vector_mgr.embedding_function.embed_documents,
+            "embed_query": self.vector_mgr.embedding_function.embed_query,
+            "search_notes": self._locked(self.vector_mgr.search_notes),
+            "search_notes_by_vector": self._locked(self.vector_mgr.search_notes_by_vector),
+            "neighbor_tags": self._locked(self.vector_mgr.neighbor_tags),
+            "get_note_tag_lists": self._locked(self.vector_mgr.get_note_tag_lists),
+            "add_texts": self._locked(self.vector_mgr.add_texts),
+            "delete_notes": self._locked(self.vector_mgr.delete_notes),
+            "prune": self._locked(self._prune),
+            "upsert_note": self._locked(self._upsert_note),
+            "flush_cache": self._locked(self.vector_mgr.flush_cache),
+            "cache_stats": self.vector_mgr.cache_stats,
+        }
+
+    def _locked(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        def wrapper(**kwargs):
+            with self._db_lock:
+                return fn(**kwargs)
+        return wrapper
+
+    def _ping(self) -> Dict[str, Any]:
+        return {**self.identity, "pid": os.getpid()}
+
+    def _shutdown(self) -> bool:
+        # shutdown() 会等待 serve_forever 退出，不能在处理请求的线程中同步调用
+        threading.Thread(target=self._server.shutdown, daemon=True).start()
+        return True
+
+    def _prune(self, keep: List[str]) -> int:
+        return self.vector_mgr.prune(set(keep))
+
+    def _upsert_note(self, note: Dict[str, Any], metadata: Dict[str, Any]) -> bool:
+        return self.vector_mgr.upsert_note(_decode_note(note), metadata)
+
+    def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self._last_request = time.monotonic()
+        method = self._methods.get(request.get("method", ""))
+        if method is None:
+            return {"ok": False, "error": f"未知方法: {request.get('method')}"}
+        try:
+            return {"ok": True, "result": method(**request.get("params", {}))}
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    def _watch_idle(self):
+        while self._server is not None:
+            time.sleep(min(30.0, self.idle_timeout))
+            if time.monotonic() - self._last_request > self.idle_timeout:
+                console.print(f"[dim]守护进程空闲超过 {self.idle_timeout / 60:.0f} 分钟，自动退出[/dim]")
+                self._server.shutdown()
+                return
+
+    def serve(self):
+        """阻塞运行，直到收到 shutdown 请求、空闲超时或 Ctrl+C"""
+        if self.socket_path.exists():
+            if ping_daemon(self.socket_path) is not None:
+                raise RuntimeError(f"守护进程已在运行: {self.socket_path}")
+            self.socket_path.unlink() # 上次异常退出残留的 socket 文件
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self._server = _Server(str(self.socket_path), _Handler)
+        self._server.owner = self
+        os.chmod(self.socket_path, 0o600) # 只允许当前用户连接
+
+        if self.idle_timeout > 0:
+            threading.Thread(target=self._watch_idle, daemon=True).start()
+
+        console.print(f"[green]守护进程已启动 (pid {os.getpid()})，监听 {self.socket_path}[/green]")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server, self._server = self._server, None
+            server.server_close()
+            with self._db_lock:
+                self.vector_mgr.flush_cache()
+            try:
+                self.socket_path.unlink()
+            except OSError:
+                pass
+            console.print("[yellow]守护进程已停止[/yellow]")
+
+# -----------------------------------------------------------------------------
+# 客户端
+# -----------------------------------------------------------------------------
+class DaemonClient:
+    """守护进程客户端。每个线程使用独立的连接，流水线的多个 worker 可以并发请求"""
+
+    def __init__(self, socket_path: Path, timeout: Optional[float] = 600.0):
+        self.socket_path = Path(socket_path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(str(self.socket_path))
+            conn = self._local.conn = (sock, sock.makefile("rwb"))
+        return conn
+
+    def call(self, method: str, **params) -> Any:
+        sock, stream = self._connection()
+        try:
+            _send(stream, {"method": method, "params": params})
+            response = _recv(stream)
+        except OSError:
+            self.close()
+            raise
+        if response is None:
+            self.close()
+            raise ConnectionError("守护进程连接已断开")
+        if not response.get("ok"):
+            raise RuntimeError(f"守护进程调用 {method} 失败: {response.get('error')}")
+        return response.get("result")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            try:
+                conn[1].close()
+                conn[0].close()
+            except OSError:
+                pass
+
+def ping_daemon(socket_path: Path, timeout: float = 2.0) -> Optional[Dict[str, Any]]:
+    """守护进程在运行时返回其信息，否则返回 None"""
+    if not Path(socket_path).exists():
+        return None
+    client = DaemonClient(socket_path, timeout=timeout)
+    try:
+        return client.call("ping")
+    except Exception:
+        return None
+    finally:
+        client.close()
+
+class RemoteEmbeddings:
+    """通过守护进程计算 Embedding (接口与 LangChain Embeddings 的 embed_documents / embed_query 一致)"""
+
+    def __init__(self, client: DaemonClient):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.client.call("embed_documents", texts=list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.call("embed_query", text=text)
+
+class RemoteVectorStore:
+    """
+    VectorStoreManager 的守护进程代理，提供流水线与 init 用到的同名方法。
+    分块在本地完成 (纯 Python)，Embedding 与向量库读写交给守护进程。
+    """
+
+    def __init__(self, client: DaemonClient, chunk_max_tokens: int):
+        self.client = client
+        self.chunker = MarkdownChunker(chunk_max_tokens)
+        self.embedding_function = RemoteEmbeddings(client)
+
+    def embed_note(self, text: str) -> NoteEmbedding:
+        chunks = self.chunker.split(text)
+        if not chunks:
+            return NoteEmbedding(chunks=[], vectors=[], vector=[])
+        vectors = self.embedding_function.embed_documents([c.text for c in chunks])
+        return NoteEmbedding(chunks=chunks, vectors=vectors, vector=note_vector(vectors))
+
+    def upsert_note(self, note: NoteEmbedding, metadata: Dict[str, Any]) -> bool:
+        if not note.chunks:
+            return False
+        return self.client.call("upsert_note", note=_encode_note(note), metadata=metadata)
+
+    def add_texts(self, texts: List[str], metadatas: List[Dict[str, Any]], verbose: bool = True) -> int:
+        return self.client.call("add_texts", texts=texts, metadatas=metadatas, verbose=verbose)
+
+    def delete_notes(self, note_ids: List[str]):
+        self.client.call("delete_notes", note_ids=note_ids)
+
+    def prune(self, keep: Set[str]) -> int:
+        return self.client.call("prune", keep=sorted(keep))
+
+    def search_notes(self, query: str, k: int = 3, exclude_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.client.call("search_notes", query=query, k=k, exclude_id=exclude_id)
+
+    def search_notes_by_vector(self, vector: List[float], k: int = 3,
+                               exclude_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.client.call("search_notes_by_vector", vector=vector, k=k, exclude_id=exclude_id)
+
+    def neighbor_tags(self, vector: List[float], k: int = 5,
+                      exclude_id: Optional[str] = None) -> List[Tuple[float, List[str]]]:
+        rows = self.client.call("neighbor_tags", vector=vector, k=k, exclude_id=exclude_id)
+        return [(score, tags) for score, tags in rows]
+
+    def get_note_tag_lists(self) -> List[List[str]]:
+        return self.client.call("get_note_tag_lists")
+
+    def flush_cache(self):
+        self.client.call("flush_cache")
+
+    def cache_stats(self) -> Tuple[int, int]:
+        hits, misses = self.client.call("cache_stats")
+        return hits, misses
+
+    def reset(self):
+        raise RuntimeError("守护进程运行中无法重置向量库，请先执行 daemon stop")
+
+def connect_daemon(cfg: AppConfig, persist_directory: str = "./chroma_db") -> Optional[RemoteVectorStore]:
+    """
+    守护进程在运行且配置一致时返回代理，否则返回 None (调用方回退到进程内加载)。
+    配置不一致但使用同一个向量库目录时抛出 RuntimeError：进程内再打开会出现两个写入方。
+    """
+    if not cfg.daemon.enable:
+        return None
+    socket_path = Path(cfg.daemon.socket_path)
+    info = ping_daemon(socket_path)
+    if info is None:
+        return None
+
+    expected = _store_identity(cfg, persist_directory)
+    mismatched = [k for k, v in expected.items() if info.get(k) != v]
+    if mismatched:
+        if "persist_directory" not in mismatched:
+            raise RuntimeError(f"守护进程 (pid {info.get('pid')}) 正在使用同一个向量库，但配置与当前不一致 "
+                               f"({', '.join(mismatched)})，请先执行 daemon stop")
+        console.print(f"[yellow]守护进程使用的是另一个向量库 ({info.get('persist_directory')})，改为在进程内加载模型[/yellow]")
+        return None
+
+    console.print(f"[dim]使用守护进程 (pid {info.get('pid')}) 提供的 Embedding 模型与向量库[/dim]")
+    client = DaemonClient(socket_path, timeout=cfg.daemon.request_timeout_seconds or None)
+    return RemoteVectorStore(client, cfg.embedding.chunk_max_tokens)
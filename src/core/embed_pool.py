@@ -0,0 +1,120 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional
+import multiprocessing
+import os
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.core.config import EmbeddingConfig, ProviderConfig
+from src.core.embedding_cache import EmbeddingCache
+from src.utils.hashing import hash_text
+
+# 子进程内的 Embedding 模型 (每个 worker 一份)
+_worker_model: Optional[Embeddings] = None
+
+def _init_worker(emb_cfg: EmbeddingConfig, llm_cfg: ProviderConfig, threads: int, counter):
+    """
+    子进程初始化：限制线程数并绑定到各自的 CPU 核心，然后加载模型。
+    必须在导入 torch / onnxruntime 之前设置线程相关的环境变量。
+    """
+    global _worker_model
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    # 进程之间已经并行，tokenizers 内部不再开线程
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    if hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        if len(cpus) > threads:
+            start = index * threads % len(cpus)
+            os.sched_setaffinity(0, {cpus[(start + i) % len(cpus)] for i in range(threads)})
+
+    if emb_cfg.type == "local":
+        import torch
+        torch.set_num_threads(threads)
+    elif emb_cfg.type == "onnx":
+        emb_cfg = emb_cfg.model_copy(update={"onnx_threads": threads})
+
+    from src.core.vector_store import create_embedding_model
+    _worker_model = create_embedding_model(emb_cfg, llm_cfg, verbose=index == 0)
+
+def _embed(texts: List[str]) -> np.ndarray:
+    # 以 float32 数组返回，序列化开销远小于嵌套列表
+    return np.asarray(_worker_model.embed_documents(texts), dtype=np.float32)
+
+class PendingEmbeddings:
+    """EmbeddingPool.submit 的结果：result() 等待子进程完成，并把新向量写入缓存"""
+
+    def __init__(self, vectors: List[Optional[np.ndarray]], keys: List[str],
+                 missing: List[int], future: Optional[Future], cache: Optional[EmbeddingCache]):
+        self._vectors = vectors
+        self._keys = keys
+        self._missing = missing
+        self._future = future
+        self._cache = cache
+
+    def result(self) -> List[List[float]]:
+        if self._future is not None:
+            computed = self._future.result()
+            if self._cache is not None:
+                self._cache.put_many([self._keys[i] for i in self._missing], computed)
+            for i, v in zip(self._missing, computed):
+                self._vectors[i] = v
+            self._future = None
+        return [list(map(float, v)) for v in self._vectors]
+
+class EmbeddingPool(Embeddings):
+    """
+    多进程 Embedding：每个子进程持有一份模型并绑定到独立的 CPU 核心，
+    分词与前后处理不再受单个进程的 GIL 限制。
+    只负责计算向量，写入向量库仍由主进程完成 (Chroma 只有一个写入方)。
+    """
+
+    def __init__(self, emb_cfg: EmbeddingConfig, llm_cfg: ProviderConfig, workers: int, threads_per_worker: int = 0):
+        self.workers = max(1, workers)
+        cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.workers)
+
+        # spawn：不继承主进程中已初始化的 torch 线程池等状态
+        ctx = multiprocessing.get_context("spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(emb_cfg, llm_cfg, self.threads_per_worker, ctx.Value("i", 0)),
+        )
+
+    def submit(self, texts: List[str], cache: Optional[EmbeddingCache] = None) -> PendingEmbeddings:
+        """
+        异步计算一批文本的向量 (整批交给一个子进程)。
+        提供 cache 时先在主进程查缓存，只把未命中的文本发给子进程。
+        """
+        keys = [hash_text(t) for t in texts] if cache is not None else []
+        vectors: List[Optional[np.ndarray]] = cache.get_many(keys) if cache is not None else [None] * len(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        future = self._executor.submit(_embed, [texts[i] for i in missing]) if missing else None
+        return PendingEmbeddings(vectors, keys, missing, future, cache)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # 同步调用：按 worker 数量均分后并行计算
+        size = -(-len(texts) // self.workers)
+        parts = self._executor.map(_embed, [texts[i:i + size] for i in range(0, len(texts), size)])
+        return [list(map(float, v)) for part in parts for v in part]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "EmbeddingPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,189 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import os
+import re
+import threading
+import numpy as np
+from rich.console import Console
+from langchain_core.embeddings import Embeddings
+
+from src.utils.hashing import hash_text
+from src.utils.filelock import file_lock
+
+console = Console()
+
+class EmbeddingCache:
+    """
+    本地 Embedding 缓存：文本哈希 + 模型名 -> float32 向量。
+    每个模型对应两个文件：
+    - <model>.f32: 依次追加的原始 float32 向量 (通过 np.memmap 读取)
+    - <model>.index.json: 文本哈希 -> 行号
+    追加数据与保存索引都在 <model>.lock 文件锁内进行，多个进程可以共用同一缓存目录。
+    """
+
+    def __init__(self, cache_dir: Path, model_name: str):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+        self.data_path = self.cache_dir / f"{slug}.f32"
+        self.index_path = self.cache_dir / f"{slug}.index.json"
+        self.lock_path = self.cache_dir / f"{slug}.lock"
+
+        self._lock = threading.Lock()
+        self.dim: Optional[int] = None
+        self.index: Dict[str, int] = {}
+        self._rows = 0
+        self._index_mtime: Optional[int] = None
+        self._mmap: Optional[np.memmap] = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        with self._lock, file_lock(self.lock_path):
+            self._sync()
+
+    def _sync(self):
+        """
+        与磁盘状态同步 (调用方需持有文件锁)：合并其他进程已保存的索引，行数以数据文件的实际大小为准。
+        多个进程 (如 watch 与定时 update) 共用同一缓存目录时，新行号总是从磁盘上的行数开始分配，不会互相覆盖。
+        """
+        try:
+            mtime = self.index_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime != self._index_mtime:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("model") == self.model_name:
+                    if self.dim is None:
+                        self.dim = data.get("dim")
+                    if data.get("dim") == self.dim:
+                        for key, row in data.get("rows", {}).items():
+                            self.index.setdefault(key, row)
+            except Exception as e:
+                console.print(f"[yellow]Embedding 缓存索引加载失败，将重新建立: {e}[/yellow]")
+            self._index_mtime = mtime
+
+        self._rows = 0
+        if self.dim and self.data_path.exists():
+            row_bytes = self.dim * 4
+            size = self.data_path.stat().st_size
+            if size % row_bytes:
+                # 上次写入中断留下的半行数据，截掉 (写入都在文件锁内进行，此时不会有其他进程正在追加)
+                with open(self.data_path, "r+b") as f:
+                    f.truncate(size - size % row_bytes)
+            self._rows = size // row_bytes
+        # 丢弃指向不存在行的索引 (数据文件被删除或截断)
+        self.index = {k: v for k, v in self.index.items() if v < self._rows}
+
+    def _matrix(self) -> Optional[np.memmap]:
+        if not self._rows or not self.dim:
+            return None
+        if self._mmap is None or self._mmap.shape[0] != self._rows:
+            self._mmap = np.memmap(self.data_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+        return self._mmap
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """批量查找，未命中的位置为 None"""
+        with self._lock:
+            matrix = self._matrix()
+            result: List[Optional[np.ndarray]] = []
+            for key in keys:
+                row = self.index.get(key)
+                if row is None or matrix is None:
+                    self.misses += 1
+                    result.append(None)
+                else:
+                    self.hits += 1
+                    result.append(np.array(matrix[row]))
+            return result
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        if not keys:
+            return
+        arr = np.asarray(vectors, dtype=np.float32)
+        with self._lock, file_lock(self.lock_path):
+            self._sync()
+            if self.dim is None:
+                # 首次写入：按向量维度重新计算数据文件的行数 (其他进程可能已追加但尚未保存索引)
+                self.dim = int(arr.shape[1])
+                self._sync()
+            elif arr.shape[1] != self.dim:
+                console.print(f"[yellow]Embedding 维度变化 ({self.dim} -> {arr.shape[1]})，跳过缓存写入[/yellow]")
+                return
+
+            new_rows = []
+            for key, vec in zip(keys, arr):
+                if key in self.index:
+                    continue
+                self.index[key] = self._rows + len(new_rows)
+                new_rows.append(vec)
+            if not new_rows:
+                return
+
+            with open(self.data_path, "ab") as f:
+                f.write(np.stack(new_rows).tobytes())
+            self._rows += len(new_rows)
+            self._dirty = True
+
+    def save(self):
+        """原子写入索引文件"""
+        with self._lock:
+            if not self._dirty:
+                return
+            with file_lock(self.lock_path):
+                self._write_index()
+
+    def _write_index(self):
+        """合并磁盘上其他进程保存的条目后再写入，避免后写者覆盖先写者"""
+        self._sync()
+        data = {"model": self.model_name, "dim": self.dim, "rows": self.index}
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+            self._index_mtime = self.index_path.stat().st_mtime_ns
+            self._dirty = False
+        except Exception as e:
+            console.print(f"[red]Embedding 缓存索引保存失败: {e}[/red]")
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+class CachedEmbeddings(Embeddings):
+    """在真实 Embedding 模型外包一层缓存，只对未命中的文本调用模型"""
+
+    def __init__(self, inner: Embeddings, cache: EmbeddingCache):
+        self.inner = inner
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [hash_text(t) for t in texts]
+        cached = self.cache.get_many(keys)
+
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            # 同一批次中的重复文本只计算一次
+            unique: Dict[str, int] = {}
+            for i in missing:
+                unique.setdefault(keys[i], i)
+            vectors = self.inner.embed_documents([texts[i] for i in unique.values()])
+            self.cache.put_many(list(unique.keys()), vectors)
+            computed = dict(zip(unique.keys(), vectors))
+            for i in missing:
+                cached[i] = computed[keys[i]]
+
+        return [list(map(float, v)) for v in cached]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = hash_text(text)
+        cached = self.cache.get_many([key])[0]
+        if cached is not None:
+            return list(map(float, cached))
+        vector = self.inner.embed_query(text)
+        self.cache.put_many([key], [vector])
+        return vector
@@ -0,0 +1,187 @@
+from pathlib import Path
+from collections import deque
+from typing import Iterable, List, Dict, Any, Set, Tuple, Deque, Optional, TYPE_CHECKING
+import frontmatter
+from rich.console import Console
+
+from src.core.manifest import VaultManifest
+from src.core.chunker import estimate_tokens
+from src.core.modifier import normalize_tags
+from src.core.note_embedding import encode_tags
+from src.core.tag_index import TagIndex
+from src.utils.hashing import extract_body
+
+if TYPE_CHECKING:
+    from src.core.embed_pool import PendingEmbeddings
+    from src.core.vector_store import PreparedBatch
+
+console = Console()
+
+def read_note(path: Path) -> Tuple[str, List[str]]:
+    """读取笔记正文与 Frontmatter 标签 (Frontmatter 解析失败时只返回正文)"""
+    text = path.read_text(encoding="utf-8", errors="ignore")
+    try:
+        post = frontmatter.loads(text)
+        return post.content, normalize_tags(post.get("tags"))
+    except Exception:
+        return extract_body(text), []
+
+class IngestStats:
+    def __init__(self):
+        self.scanned = 0
+        self.indexed = 0 # 实际写入向量库的笔记
+        self.skipped = 0 # 已索引且未变化的笔记 (清单记录或库中分块一致)
+        self.empty = 0
+        self.failed = 0
+        self.removed = 0 # 从向量库中清理的已删除笔记
+        self.batches = 0
+
+class StreamingIndexer:
+    """
+    流式建立向量索引：逐个读取笔记，按分块数量凑成批次写入向量库，
+    每隔若干批次把进度写入清单 (checkpoint)。
+    内存占用只与批次大小有关，与 Vault 规模无关；中断后再次运行会跳过已完成的笔记。
+    """
+
+    def __init__(self, vector_mgr, manifest: VaultManifest, batch_size: int = 64, checkpoint_interval: int = 10,
+                 embed_pool=None, tag_index: Optional[TagIndex] = None):
+        """
+        :param embed_pool: 多进程 EmbeddingPool。提供时各批次的向量在子进程中并行计算，
+                           主进程继续读取后续笔记，并按提交顺序逐批写入向量库
+        :param tag_index: 标签倒排索引，随读取的笔记一并更新 (索引尚不完整时，断点续传跳过的笔记也会读取标签)
+        """
+        self.vector_mgr = vector_mgr
+        self.manifest = manifest
+        self.batch_size = max(1, batch_size)
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        self.embed_pool = embed_pool
+        # 同时在计算中的批次上限 (每个 worker 两批，保证子进程不空等)
+        self.max_in_flight = 2 * embed_pool.workers if embed_pool is not None else 0
+        self._in_flight: Deque[Tuple["PreparedBatch", "PendingEmbeddings", List[Path]]] = deque()
+
+        self._texts: List[str] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._paths: List[Path] = []
+        self._pending_chunks = 0
+        self.tag_index = tag_index
+        self._tag_rows: List[Tuple[str, List[str]]] = []
+
+    def run(self, paths: Iterable[Path], resume: bool = True) -> IngestStats:
+        """
+        :param paths: 笔记路径 (可以是生成器)
+        :param resume: 跳过清单中已标记为 embedded 且正文未变化的笔记
+        """
+        stats = IngestStats()
+        seen: Set[str] = set()
+        rebuild_tags = self.tag_index is not None and not self.tag_index.is_complete
+
+        for p in paths:
+            stats.scanned += 1
+            note_id = self.manifest.rel_key(p)
+            seen.add(note_id)
+
+            entry = self.manifest.get(p)
+            if resume and entry is not None and entry.embedded and not self.manifest.is_changed(p):
+                stats.skipped += 1
+                if rebuild_tags:
+                    try:
+                        self._tag_rows.append((note_id, read_note(p)[1]))
+                    except Exception:
+                        pass
+                continue
+
+            try:
+                content, tags = read_note(p)
+            except Exception as e:
+                console.print(f"[red]读取文件 {p.name} 失败: {e}[/red]")
+                stats.failed += 1
+                continue
+            self._tag_rows.append((note_id, tags))
+
+            if not content.strip():
+                self.manifest.record(p)
+                stats.empty += 1
+                continue
+
+            self._texts.append(content)
+            self._metas.append({"source": str(p.name), "path": str(p), "note_id": note_id, "tags": encode_tags(tags)})
+            self._paths.append(p)
+            # 按估算的分块数量控制批次大小
+            self._pending_chunks += max(1, estimate_tokens(content) // self.vector_mgr.chunker.max_tokens + 1)
+
+            if self._pending_chunks >= self.batch_size:
+                self._flush(stats)
+
+        self._flush(stats)
+        while self._in_flight:
+            self._write_next(stats)
+        self._write_tag_rows()
+        if self.tag_index is not None:
+            self.tag_index.retain(seen)
+            self.tag_index.mark_complete()
+
+        # 清理已从 Vault 中删除或重命名的笔记：清单记录与向量库中的分块
+        self.manifest.retain(seen)
+        self.manifest.save()
+        stats.removed = self.vector_mgr.prune(seen)
+        return stats
+
+    def _write_tag_rows(self):
+        if self.tag_index is not None and self._tag_rows:
+            self.tag_index.set_many(self._tag_rows)
+        self._tag_rows = []
+
+    def _flush(self, stats: IngestStats):
+        self._write_tag_rows()
+        if not self._texts:
+            return
+        if self.embed_pool is not None:
+            self._submit(stats)
+        else:
+            try:
+                indexed = self.vector_mgr.add_texts(self._texts, self._metas, verbose=False)
+                self._batch_done(stats, self._paths, indexed)
+            except Exception as e:
+                self._batch_failed(stats, self._paths, e)
+
+        self._texts, self._metas, self._paths = [], [], []
+        self._pending_chunks = 0
+
+    def _submit(self, stats: IngestStats):
+        """切分当前批次并交给进程池计算向量；在途批次过多时先写入最早的一批"""
+        try:
+            batch = self.vector_mgr.prepare_texts(self._texts, self._metas)
+            pending = self.embed_pool.submit(batch.texts, cache=self.vector_mgr.embedding_cache)
+        except Exception as e:
+            self._batch_failed(stats, self._paths, e)
+            return
+        self._in_flight.append((batch, pending, self._paths))
+        while len(self._in_flight) > self.max_in_flight:
+            self._write_next(stats)
+
+    def _write_next(self, stats: IngestStats):
+        """等待最早提交的批次完成计算，由主进程写入向量库 (单一写入方)"""
+        batch, pending, paths = self._in_flight.popleft()
+        try:
+            indexed = self.vector_mgr.write_prepared(batch, pending.result(), verbose=False)
+            self._batch_done(stats, paths, indexed)
+        except Exception as e:
+            self._batch_failed(stats, paths, e)
+
+    def _batch_done(self, stats: IngestStats, paths: List[Path], indexed: int):
+        """indexed: 实际重新写入的笔记数；其余笔记的分块与库中一致 (如 init --force 或清单丢失后)，计为跳过"""
+        for p in paths:
+            self.manifest.record(p, embedded=True)
+        stats.indexed += indexed
+        stats.skipped += len(paths) - indexed
+        self._checkpoint(stats)
+
+    def _batch_failed(self, stats: IngestStats, paths: List[Path], error: Exception):
+        console.print(f"[red]批次写入失败 ({len(paths)} 篇笔记): {error}[/red]")
+        stats.failed += len(paths)
+        self._checkpoint(stats)
+
+    def _checkpoint(self, stats: IngestStats):
+        stats.batches += 1
+        if stats.batches % self.checkpoint_interval == 0:
+            self.manifest.save()
@@ -12,9 +12,19 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 from src.core.config import AppConfig, ProviderConfig
+from src.core.summary_cache import SummaryCache
+from src.core.response_cache import ResponseCache
+from src.core.rate_limiter import get_rate_limiter, call_with_retry
+from src.core.chunker import estimate_tokens
+from src.utils.hashing import hash_text
 
 console = Console()
 
+DEFAULT_BATCH_TAGGING_TEMPLATE = """你是一个专业的知识管理助手。请为下面每篇笔记分别提取 3-5 个核心标签。
+现有标签：{existing_tags}
+仅输出 JSON 对象，键为笔记编号，值为标签列表，如 {{"n1": ["tag1", "tag2"]}}。
+笔记：{notes}"""
+
 class LLMClient:
     def __init__(self, config: AppConfig):
         self.app_config = config
@@ -26,15 +36,39 @@ class LLMClient:
 
         # 2. 初始化摘要模型 (如果需要)
         sum_cfg = config.summarization
+        self.summary_provider = config.active_provider
         if sum_cfg.enable and sum_cfg.provider:
             if sum_cfg.provider not in config.providers:
                 console.print(f"[yellow]摘要 Provider '{sum_cfg.provider}' 未定义，将回退到主模型[/yellow]")
                 self.summary_llm = self.llm
             else:
+                self.summary_provider = sum_cfg.provider
                 self.summary_llm = self._init_llm_model(config.providers[sum_cfg.provider])
         else:
             self.summary_llm = self.llm # 复用主模型
 
+        # 3. 摘要缓存
+        self.summary_cache: Optional[SummaryCache] = None
+        if sum_cfg.enable and sum_cfg.cache_enable:
+            try:
+                self.summary_cache = SummaryCache(Path(sum_cfg.cache_path), sum_cfg.cache_max_entries)
+            except Exception as e:
+                console.print(f"[yellow]摘要缓存初始化失败，将不使用缓存: {e}[/yellow]")
+
+        # 4. LLM 响应缓存
+        self.response_cache: Optional[ResponseCache] = None
+        cache_cfg = config.llm_cache
+        if cache_cfg.enable:
+            try:
+                self.response_cache = ResponseCache(
+                    Path(cache_cfg.path),
+                    ttl_seconds=cache_cfg.ttl_days * 86400,
+                    max_entries=cache_cfg.max_entries,
+                    max_bytes=int(cache_cfg.max_size_mb * 1024 * 1024)
+                )
+            except Exception as e:
+                console.print(f"[yellow]LLM 响应缓存初始化失败，将不使用缓存: {e}[/yellow]")
+
     def _load_prompts(self, prompt_file: str) -> Dict[str, Any]:
         """加载外部 Prompt 配置文件"""
         path = Path(prompt_file)
@@ -60,7 +94,8 @@ class LLMClient:
                     openai_api_key=cfg.api_key or "dummy",
                     openai_api_base=cfg.base_url,
                     temperature=cfg.temperature,
-                    max_tokens=2048
+                    max_tokens=2048,
+                    max_retries=0 # 重试由 call_with_retry 统一处理
                 )
 
             elif p_type == "anthropic":
@@ -70,7 +105,8 @@ class LLMClient:
                         model=cfg.model,
                         api_key=cfg.api_key,
                         temperature=cfg.temperature,
-                        max_tokens=2048
+                        max_tokens=2048,
+                        max_retries=0
                     )
                 except ImportError:
                     raise ImportError("请安装 langchain-anthropic 以使用 Claude 模型")
@@ -82,7 +118,8 @@ class LLMClient:
                         model=cfg.model,
                         google_api_key=cfg.api_key,
                         temperature=cfg.temperature,
-                        max_output_tokens=2048
+                        max_output_tokens=2048,
+                        max_retries=0
                     )
                 except ImportError:
                     raise ImportError("请安装 langchain-google-genai 以使用 Gemini 模型")
@@ -94,6 +131,52 @@ class LLMClient:
             console.print(f"[bold red]LLM 初始化失败 ({p_type}): {e}[/bold red]")
             raise e
 
+    def _response_cache_key(self, prompt: ChatPromptTemplate, provider_name: str, prompt_text: str) -> str:
+        """响应缓存键：Provider + 模型 + temperature + Prompt 模板 + 渲染后的 Prompt"""
+        provider_cfg = self.app_config.providers.get(provider_name, self.main_config)
+        template = "".join(getattr(getattr(m, "prompt", None), "template", "") for m in prompt.messages)
+        return ResponseCache.make_key(provider_name, provider_cfg.model, provider_cfg.temperature, template, prompt_text)
+
+    def _discard_response(self, prompt: ChatPromptTemplate, provider_name: str, inputs: Dict[str, Any]):
+        """响应无法解析时删除对应的缓存，避免重跑时命中同样的坏结果"""
+        if self.response_cache is not None:
+            self.response_cache.discard(self._response_cache_key(prompt, provider_name, prompt.format(**inputs)))
+
+    def _invoke(self, prompt: ChatPromptTemplate, llm: BaseChatModel, provider_name: str, inputs: Dict[str, Any],
+                use_cache: bool = True) -> str:
+        """
+        经过响应缓存、限流器与重试执行一次调用。
+        同一 Provider 的所有调用共享令牌桶，并发 worker 会排队等待而不是触发 429。
+        """
+        provider_cfg = self.app_config.providers.get(provider_name, self.main_config)
+        prompt_text = prompt.format(**inputs)
+
+        cache_key = None
+        if use_cache and self.response_cache is not None:
+            cache_key = self._response_cache_key(prompt, provider_name, prompt_text)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        limiter = get_rate_limiter(provider_name, provider_cfg)
+        chain = prompt | llm | StrOutputParser()
+        prompt_tokens = estimate_tokens(prompt_text)
+
+        def attempt() -> str:
+            limiter.acquire(prompt_tokens)
+            return chain.invoke(inputs)
+
+        response = call_with_retry(
+            attempt,
+            max_retries=provider_cfg.max_retries,
+            base_delay=provider_cfg.retry_base_delay,
+            max_delay=provider_cfg.retry_max_delay,
+            label=f"[{provider_name}] "
+        )
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response, provider_name, provider_cfg.model)
+        return response
+
     def _get_prompt_template(self, key: str, default: str) -> str:
         if self.prompts and key in self.prompts:
             return self.prompts[key].get("template", default)
@@ -108,15 +191,15 @@ class LLMClient:
 
         template = self._get_prompt_template("tagging", default_template)
         prompt = ChatPromptTemplate.from_template(template)
-        chain = prompt | self.llm | StrOutputParser()
 
         tags_str = ", ".join(existing_tags) if existing_tags else "无"
+        inputs = {
+            "content": content[:3000],
+            "existing_tags": tags_str
+        }
 
         try:
-            response = chain.invoke({
-                "content": content[:3000],
-                "existing_tags": tags_str
-            })
+            response = self._invoke(prompt, self.llm, self.app_config.active_provider, inputs)
             cleaned_response = re.sub(r"```json|```", "", response).strip()
             match = re.search(r'\[.*\]', cleaned_response, re.DOTALL)
             if match:
@@ -125,21 +208,115 @@ class LLMClient:
             tags = json.loads(cleaned_response)
             return tags if isinstance(tags, list) else []
         except Exception as e:
+            self._discard_response(prompt, self.app_config.active_provider, inputs)
             # 抛出异常以便上层（main.py）感知失败
             raise Exception(f"生成标签失败: {e}")
 
-    def summarize_content(self, content: str) -> str:
-        """为长文本生成摘要 (使用摘要模型)"""
+    def plan_tag_batches(self, notes: Dict[str, str], existing_tags: List[str] = None) -> List[Dict[str, str]]:
+        """
+        按 token 预算把短笔记分成若干批次。
+        固定部分 (指令 + 标签库) 只计算一次，剩余预算用于装入笔记。
+        """
+        tag_cfg = self.app_config.tagging
+        fixed_tokens = estimate_tokens(self._get_prompt_template("tagging_batch", DEFAULT_BATCH_TAGGING_TEMPLATE))
+        fixed_tokens += estimate_tokens(", ".join(existing_tags or []))
+        budget = max(1, tag_cfg.batch_token_budget - fixed_tokens)
+
+        batches: List[Dict[str, str]] = []
+        current: Dict[str, str] = {}
+        used = 0
+        for key, content in notes.items():
+            tokens = estimate_tokens(content) + 8 # 编号标题的开销
+            if current and (used + tokens > budget or len(current) >= tag_cfg.batch_max_notes):
+                batches.append(current)
+                current, used = {}, 0
+            current[key] = content
+            used += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def generate_tags_batch(self, notes: Dict[str, str], existing_tags: List[str] = None) -> Dict[str, List[str]]:
+        """
+        一次请求为多篇笔记生成标签 (使用主模型)。
+        :param notes: 笔记标识 -> 正文
+        :return: 笔记标识 -> 标签列表；解析失败或缺失的笔记不在结果中，由调用方回退到 generate_tags 单独处理
+        """
+        if not notes:
+            return {}
+
+        template = self._get_prompt_template("tagging_batch", DEFAULT_BATCH_TAGGING_TEMPLATE)
+        prompt = ChatPromptTemplate.from_template(template)
+
+        # 用短编号代替路径，减少 token 并避免模型改写键名
+        ids = {f"n{i + 1}": key for i, key in enumerate(notes)}
+        notes_str = "\n\n".join(f"### [{short_id}]\n{notes[key]}" for short_id, key in ids.items())
+        tags_str = ", ".join(existing_tags) if existing_tags else "无"
+
+        inputs = {
+            "notes": notes_str,
+            "existing_tags": tags_str
+        }
+
+        try:
+            response = self._invoke(prompt, self.llm, self.app_config.active_provider, inputs)
+            cleaned_response = re.sub(r"```json|```", "", response).strip()
+            match = re.search(r'\{.*\}', cleaned_response, re.DOTALL)
+            if match:
+                cleaned_response = match.group(0)
+            data = json.loads(cleaned_response)
+        except Exception as e:
+            self._discard_response(prompt, self.app_config.active_provider, inputs)
+            console.print(f"[yellow]批量打标失败 ({len(notes)} 篇)，将逐篇处理: {e}[/yellow]")
+            return {}
+
+        if not isinstance(data, dict):
+            self._discard_response(prompt, self.app_config.active_provider, inputs)
+            return {}
+
+        results: Dict[str, List[str]] = {}
+        for short_id, key in ids.items():
+            tags = data.get(short_id)
+            # 逐项校验：必须是字符串列表
+            if isinstance(tags, list) and tags and all(isinstance(t, str) for t in tags):
+                results[key] = [t.strip() for t in tags if t.strip()]
+        return results
+
+    def _summary_cache_key(self, content_hash: str, template: str) -> str:
+        """摘要缓存键：内容 + 摘要 Prompt + 摘要模型 (以及影响输入的截断长度)"""
+        provider_cfg = self.app_config.providers.get(self.summary_provider, self.main_config)
+        model_id = f"{self.summary_provider}/{provider_cfg.model}/{self.app_config.summarization.max_input_length}"
+        return SummaryCache.make_key(content_hash, hash_text(template), model_id)
+
+    def summarize_content(self, content: str, source: str = "") -> str:
+        """
+        为长文本生成摘要 (使用摘要模型)
+        :param source: 来源笔记标识 (路径)，用于在笔记变化时清理旧摘要
+        """
         cfg = self.app_config.summarization
 
         default_template = """请生成 200 字以内的摘要。内容：{content}"""
         template = self._get_prompt_template("summarize", default_template)
+
+        cache_key = None
+        content_hash = hash_text(content)
+        if self.summary_cache is not None:
+            cache_key = self._summary_cache_key(content_hash, template)
+            cached = self.summary_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         prompt = ChatPromptTemplate.from_template(template)
-        chain = prompt | self.summary_llm | StrOutputParser() # 使用摘要模型
 
         try:
-            # 使用配置的 max_input_length 进行截断
-            return chain.invoke({"content": content[:cfg.max_input_length]})
+            # 使用配置的 max_input_length 进行截断 (使用摘要模型)
+            # 摘要已有专用缓存 (可随来源笔记失效)，不再重复写入响应缓存
+            summary = self._invoke(prompt, self.summary_llm, self.summary_provider,
+                                   {"content": content[:cfg.max_input_length]},
+                                   use_cache=self.summary_cache is None)
+            if cache_key is not None:
+                self.summary_cache.put(cache_key, summary, content_hash, source)
+            return summary
         except Exception as e:
             # 摘要失败可以降级为截断，不必视为整个任务失败，但最好记录日志
             console.print(f"[yellow]摘要生成失败: {e}，将截取原文[/yellow]")
@@ -161,7 +338,7 @@ class LLMClient:
                 if sum_cfg.enable:
                     # 开启摘要：调用模型
                     # console.print(f"[dim]正在为参考笔记 {doc['source']} 生成摘要...[/dim]")
-                    summary = self.summarize_content(raw_content)
+                    summary = self.summarize_content(raw_content, source=doc.get('path', ''))
                     display_content = f"[AI摘要] {summary}"
                 else:
                     # 关闭摘要：硬截断
@@ -180,10 +357,9 @@ class LLMClient:
 
         template = self._get_prompt_template("linking", default_template)
         prompt = ChatPromptTemplate.from_template(template)
-        chain = prompt | self.llm | StrOutputParser() # 使用主模型
 
         try:
-            response = chain.invoke({
+            response = self._invoke(prompt, self.llm, self.app_config.active_provider, { # 使用主模型
                 "current_title": current_note_title,
                 "context": context_str,
                 "current_content": current_note_content[:2000]
@@ -0,0 +1,165 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+import json
+import os
+import time
+from pydantic import BaseModel
+from rich.console import Console
+
+from src.utils.hashing import hash_body
+
+console = Console()
+
+class ManifestEntry(BaseModel):
+    """单个笔记在清单中的记录"""
+    path: str # 相对于 Vault 的路径 (posix 格式)
+    size: int
+    mtime_ns: int
+    content_hash: str # 正文 (不含 Frontmatter) 的摘要
+    embedded: bool = False # 是否已写入向量库
+    tagged: bool = False # 是否已完成打标
+    linked: bool = False # 是否已生成关联见解
+    updated_at: float = 0.0
+
+class VaultManifest:
+    """
+    持久化的文件清单，用于增量变更检测。
+    先比较 size + mtime_ns，不一致时再比较正文摘要；
+    只有正文真正变化的笔记才会被视为变更。
+    """
+    VERSION = 1
+
+    def __init__(self, vault_root: Path, manifest_path: Path = Path(".auto_link_manifest.json")):
+        self.vault_root = vault_root.resolve()
+        self.manifest_path = manifest_path
+        self.entries: Dict[str, ManifestEntry] = self._load()
+        self._dirty = False
+
+    def _load(self) -> Dict[str, ManifestEntry]:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {k: ManifestEntry(**v) for k, v in data.get("files", {}).items()}
+        except Exception as e:
+            console.print(f"[red]清单文件 {self.manifest_path} 加载失败，将重新建立: {e}[/red]")
+            return {}
+
+    def save(self):
+        """原子写入清单 (临时文件 + 重命名)"""
+        if not self._dirty:
+            return
+        data = {
+            "version": self.VERSION,
+            "files": {k: v.model_dump() for k, v in sorted(self.entries.items())}
+        }
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.manifest_path)
+            self._dirty = False
+        except Exception as e:
+            console.print(f"[red]清单文件 {self.manifest_path} 保存失败: {e}[/red]")
+
+    def is_empty(self) -> bool:
+        return not self.entries
+
+    def rel_key(self, path: Path) -> str:
+        """文件在清单中的键：相对于 Vault 的 posix 路径"""
+        # 扫描器产出的已是 Vault 下的绝对路径，先尝试直接计算，避免 resolve() 的额外系统调用
+        try:
+            return path.relative_to(self.vault_root).as_posix()
+        except ValueError:
+            pass
+        try:
+            return path.resolve().relative_to(self.vault_root).as_posix()
+        except ValueError:
+            return path.name
+
+    def get(self, path: Path) -> Optional[ManifestEntry]:
+        return self.entries.get(self.rel_key(path))
+
+    def is_changed(self, path: Path, stat: Optional[os.stat_result] = None) -> bool:
+        """
+        判断文件正文是否发生变化。
+        仅 mtime/size 变化 (touch、git checkout、同步工具重写) 而正文不变时，
+        会刷新记录中的 stat 信息并返回 False。
+        """
+        entry = self.get(path)
+        if entry is None:
+            return True
+
+        if stat is None:
+            stat = path.stat()
+        if stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns:
+            return False
+
+        try:
+            text = path.read_text(encoding="utf-8", errors="ignore")
+        except OSError:
+            return True
+
+        if hash_body(text) != entry.content_hash:
+            return True
+
+        # 正文未变，只刷新 stat，避免下次重复计算摘要
+        entry.size = stat.st_size
+        entry.mtime_ns = stat.st_mtime_ns
+        self._dirty = True
+        return False
+
+    def record(self, path: Path, **state) -> ManifestEntry:
+        """
+        重新读取文件并记录其当前 stat 与正文摘要。
+        在工具自身写回文件后调用，保证下次扫描不会再次拾取该文件。
+        :param state: embedded / tagged / linked 等状态字段
+        """
+        key = self.rel_key(path)
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        stat = path.stat()
+
+        previous = self.entries.get(key)
+        fields = {}
+        if previous is not None:
+            fields = previous.model_dump(include={"embedded", "tagged", "linked"})
+        fields.update(state)
+
+        entry = ManifestEntry(
+            path=key,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            content_hash=hash_body(text),
+            updated_at=time.time(),
+            **fields
+        )
+        self.entries[key] = entry
+        self._dirty = True
+        return entry
+
+    def remove(self, keys: Iterable[str]) -> List[str]:
+        """移除给定键的记录，返回实际被移除的键"""
+        removed = [k for k in dict.fromkeys(keys) if k in self.entries]
+        for k in removed:
+            del self.entries[k]
+        if removed:
+            self._dirty = True
+        return removed
+
+    def retain(self, keys: Set[str]) -> List[str]:
+        """只保留给定键的记录，返回被移除的键"""
+        removed = [k for k in self.entries if k not in keys]
+        for k in removed:
+            del self.entries[k]
+        if removed:
+            self._dirty = True
+        return removed
+
+    def reset_state(self, **state):
+        """批量重置所有记录的状态字段 (例如 init --force 时清除 embedded)"""
+        for entry in self.entries.values():
+            for k, v in state.items():
+                setattr(entry, k, v)
+        if self.entries:
+            self._dirty = True
@@ -5,16 +5,33 @@ from rich.console import Console
 
 console = Console()
 
+def normalize_tags(raw: Any) -> List[str]:
+    """把 Frontmatter 中的 tags 字段规范化为字符串列表"""
+    if raw is None:
+        return []
+    if isinstance(raw, str):
+        return [raw]
+    if isinstance(raw, list):
+        return [str(t) for t in raw if t is not None]
+    # 可能是 int, float 等意外类型
+    return [str(raw)]
+
 class FileModifier:
     def __init__(self, file_path: Path):
         self.file_path = file_path
+        # 读取时的原始内容 (用于判断是否真的需要写回，以及运行级备份，无需再次读取文件)
+        self.original: bytes = file_path.read_bytes()
+        # 是否有实际修改 (由 update_tags / append_callout 设置)
+        self._dirty = False
         try:
-            # 显式转换为 str，满足类型检查和兼容性
-            self.post = frontmatter.load(str(file_path))
+            self.post = frontmatter.loads(self.original.decode("utf-8"))
         except Exception as e:
             # 如果加载失败（例如非 utf-8 文件），抛出异常让上层处理
             raise ValueError(f"无法解析文件 Frontmatter: {e}")
 
+    def get_tags(self) -> List[str]:
+        return normalize_tags(self.post.get("tags", []))
+
     def update_tags(self, new_tags: List[str]) -> bool:
         """
         更新文件的 tags。
@@ -45,6 +62,7 @@ class FileModifier:
             return False
 
         self.post["tags"] = final_tags
+        self._dirty = True
         return True
 
     def append_callout(self, callout_content: str):
@@ -62,10 +80,11 @@ class FileModifier:
             content += "\n"
 
         self.post.content = content + callout_content + "\n"
+        self._dirty = True
 
-    def save(self):
+    def render(self) -> str:
         """
-        保存文件，根据标签数量决定 YAML 格式
+        序列化为文件内容，根据标签数量决定 YAML 格式
         tags <= 5: 行内列表 [a, b]
         tags > 5: 多行列表 - a
         """
@@ -103,9 +122,18 @@ class FileModifier:
                     yaml_lines.append(f"  - {t}")
 
         yaml_lines.append("---\n")
+        return "\n".join(yaml_lines) + self.post.content
 
-        # 写入文件
-        new_content = "\n".join(yaml_lines) + self.post.content
+    def is_modified(self) -> bool:
+        """
+        读取后是否添加过标签或见解。
+        不与原始字节比较：render() 会规范化 YAML 与结尾换行，未修改的笔记也会与原文不同。
+        """
+        return self._dirty
+
+    def save(self):
+        """保存文件 (格式见 render)"""
+        new_content = self.render()
         try:
             self.file_path.write_text(new_content, encoding="utf-8")
             console.print(f"[green]✔ 文件 {self.file_path.name} 已更新[/green]")
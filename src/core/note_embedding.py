@@ -0,0 +1,43 @@
+from typing import Any, List, NamedTuple
+import json
+import numpy as np
+
+from src.core.chunker import Chunk
+
+# 向量化结果与 Chroma 元数据编码。只依赖 numpy，不导入 LangChain / Chroma，
+# 以便流水线在通过守护进程访问向量库时不必加载这些重依赖。
+
+class NoteEmbedding(NamedTuple):
+    """一篇笔记的向量化结果，可复用于检索、写入、去重与相似度报告"""
+    chunks: List[Chunk]
+    vectors: List[List[float]] # 每个分块的向量
+    vector: List[float] # 笔记级向量 (分块向量的归一化均值)
+
+    def similarity(self, other: "NoteEmbedding") -> float:
+        """两篇笔记的余弦相似度"""
+        if not self.vector or not other.vector:
+            return 0.0
+        return float(np.dot(self.vector, other.vector))
+
+def encode_tags(tags: List[str]) -> str:
+    """Chroma 元数据只支持标量，标签列表以 JSON 字符串存储"""
+    return json.dumps(list(tags), ensure_ascii=False)
+
+def decode_tags(value: Any) -> List[str]:
+    if not value:
+        return []
+    try:
+        tags = json.loads(value)
+    except (TypeError, ValueError):
+        return []
+    return [str(t) for t in tags] if isinstance(tags, list) else []
+
+def note_vector(vectors: List[List[float]]) -> List[float]:
+    """分块向量取均值并做 L2 归一化，作为笔记级向量"""
+    if not vectors:
+        return []
+    mean = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+    norm = float(np.linalg.norm(mean))
+    if norm > 0:
+        mean = mean / norm
+    return mean.tolist()
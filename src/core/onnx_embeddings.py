@@ -0,0 +1,194 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import os
+import re
+import threading
+import numpy as np
+from rich.console import Console
+from langchain_core.embeddings import Embeddings
+
+from src.utils.filelock import file_lock
+
+console = Console()
+
+class OnnxEmbeddings(Embeddings):
+    """
+    使用 ONNX Runtime 在 CPU 上推理的 Embedding 模型 (可选 int8 动态量化)。
+    首次使用时把 HuggingFace 模型导出为 ONNX (需要 torch + transformers)，之后只依赖
+    onnxruntime 与 tokenizers，不再加载 PyTorch。
+    池化方式与 sentence-transformers 配置一致 (bge 系列为 CLS)，输出做 L2 归一化，
+    与 HuggingFaceEmbeddings(normalize_embeddings=True) 的结果可直接比较。
+    """
+
+    def __init__(self,
+                 model_name: str,
+                 model_dir: Path,
+                 quantize: bool = True,
+                 threads: int = 0,
+                 batch_size: int = 16,
+                 max_length: int = 512,
+                 pooling: Optional[str] = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+        self.model_dir = Path(model_dir) / slug
+
+        model_path = self._ensure_model(quantize)
+        self.pooling = pooling or self._load_pooling()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        # tokenizers 的 Tokenizer 对象不保证线程安全
+        self._tokenizer_lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # 模型准备：导出 -> 量化
+    # -------------------------------------------------------------------------
+    def _ensure_model(self, quantize: bool) -> Path:
+        """
+        返回可用的模型文件，缺少时导出 / 量化。
+        多进程 Embedding 的 worker 会同时初始化：导出与量化在文件锁内进行 (先到的进程执行，其余等待后直接复用)，
+        产物先写入临时文件再原子重命名，其他进程不会读到写了一半的模型。
+        """
+        fp32_path = self.model_dir / "model.onnx"
+        int8_path = self.model_dir / "model_int8.onnx"
+        target = int8_path if quantize else fp32_path
+        if target.exists():
+            return target
+
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.model_dir / ".export.lock"):
+            if not fp32_path.exists():
+                self._export(fp32_path)
+            if quantize and not int8_path.exists():
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                console.print("[blue]正在对 ONNX 模型做 int8 动态量化...[/blue]")
+                tmp_path = self.model_dir / "model_int8.tmp.onnx"
+                quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+                os.replace(tmp_path, int8_path)
+        return target
+
+    def _export(self, fp32_path: Path):
+        """把 HuggingFace 模型导出为 ONNX，同时保存 tokenizer.json 与池化配置 (只需执行一次)"""
+        try:
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+        except ImportError:
+            raise ImportError("首次导出 ONNX 模型需要 torch 与 transformers (pip install torch transformers)")
+
+        console.print(f"[blue]正在把 {self.model_name} 导出为 ONNX (只需执行一次)...[/blue]")
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        model = AutoModel.from_pretrained(self.model_name).eval()
+
+        dummy = tokenizer(["示例文本", "sample text"], padding=True, return_tensors="pt")
+        input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in dummy]
+        dynamic_axes = {k: {0: "batch", 1: "sequence"} for k in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        # model.onnx 最后才出现：存在即表示 tokenizer 与池化配置也已写好
+        tmp_path = fp32_path.with_name("model.tmp.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(dummy[k] for k in input_names),
+                str(tmp_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=17,
+            )
+        tokenizer.save_pretrained(str(self.model_dir))
+        with open(self.model_dir / "pooling.json", "w", encoding="utf-8") as f:
+            json.dump({"mode": self._detect_pooling()}, f)
+        os.replace(tmp_path, fp32_path)
+
+    def _detect_pooling(self) -> str:
+        """读取 sentence-transformers 的池化配置 (1_Pooling/config.json)，找不到时使用 mean"""
+        config_path = Path(self.model_name) / "1_Pooling" / "config.json"
+        if not config_path.exists():
+            try:
+                from huggingface_hub import hf_hub_download
+                config_path = Path(hf_hub_download(self.model_name, "1_Pooling/config.json"))
+            except Exception:
+                return "mean"
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except Exception:
+            return "mean"
+        return "cls" if config.get("pooling_mode_cls_token") else "mean"
+
+    def _load_pooling(self) -> str:
+        try:
+            with open(self.model_dir / "pooling.json", "r", encoding="utf-8") as f:
+                return json.load(f).get("mode", "mean")
+        except (OSError, ValueError):
+            return "mean"
+
+    # -------------------------------------------------------------------------
+    # 推理
+    # -------------------------------------------------------------------------
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        with self._tokenizer_lock:
+            encodings = self.tokenizer.encode_batch(texts)
+        inputs: Dict[str, np.ndarray] = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        inputs = {k: v for k, v in inputs.items() if k in self.input_names}
+
+        hidden = self.session.run(None, inputs)[0]
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.where(norms > 0, norms, 1.0)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # 按长度排序后分批，减少同一批次内的 padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        result: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            vectors = self._encode_batch([texts[i] for i in idx])
+            for i, v in zip(idx, vectors):
+                result[i] = v.astype(np.float32).tolist()
+        return result
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def parity_report(reference: List[List[float]], candidate: List[List[float]]) -> Dict[str, float]:
+    """
+    比较两个 Embedding 后端对同一组文本的结果：
+    - min_self_cosine: 同一文本在两个后端下向量的最小余弦相似度
+    - max_pairwise_delta: 文本两两之间的余弦相似度在两个后端下的最大差值 (影响检索排序的指标)
+    """
+    ref = np.asarray(reference, dtype=np.float32)
+    cand = np.asarray(candidate, dtype=np.float32)
+    ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+    cand /= np.linalg.norm(cand, axis=1, keepdims=True)
+    return {
+        "min_self_cosine": float(np.min(np.sum(ref * cand, axis=1))),
+        "max_pairwise_delta": float(np.max(np.abs(ref @ ref.T - cand @ cand.T))),
+    }
@@ -0,0 +1,536 @@
+from pathlib import Path
+from typing import List, Any, Optional, Dict, Iterator
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from collections import deque
+import threading
+import numpy as np
+from rich.console import Console
+from rich.panel import Panel
+
+from src.core.config import AppConfig
+from src.core.safety import BackupManager, BackupSnapshot
+from src.core.tag_manager import TagManager
+from src.core.modifier import FileModifier
+from src.core.manifest import VaultManifest
+from src.core.note_embedding import encode_tags
+from src.core.tag_retriever import TagCooccurrence, TagShortlister, TagPredictor
+from src.core.tag_index import TagIndex
+from src.core.ingest import read_note
+from src.core.plan import UpdatePlan, PlanEntry, hash_file
+from src.utils.hashing import hash_text
+
+console = Console()
+
+@dataclass
+class NoteTask:
+    """单个笔记在流水线中的中间结果 (由 worker 计算，由 writer 提交)"""
+    file_path: Path
+    file_hash: str = "" # 读取时整个文件的摘要 (写入 dry-run 计划)
+    modifier: Optional[FileModifier] = None
+    content: str = ""
+    harvested_tags: List[str] = field(default_factory=list) # 用户手写、待学习的标签
+    new_tags: List[str] = field(default_factory=list) # LLM 建议且通过黑名单过滤的标签
+    tags_changed: bool = False
+    insight: str = ""
+    note_embedding: Optional[Any] = None # VectorStoreManager.embed_note 的结果
+    logs: List[Any] = field(default_factory=list) # 延迟输出的日志 (str 或 rich 渲染对象)
+    error: Optional[str] = None
+    parse_failed: bool = False
+
+    def log(self, message: Any):
+        self.logs.append(message)
+
+class UpdatePipeline:
+    """
+    update 任务的执行流水线。
+    - prepare(): 解析、打标、检索、生成见解，只读操作，可在多个 worker 线程中并发执行
+    - commit(): 确认备份、写回文件、学习标签、更新向量库与清单，只在调用线程 (单一 writer) 中执行
+    每次 run() / apply() 是一次备份运行：prepare 阶段登记内容将会变化的笔记 (后台写入备份)，写回前写入备份记录，结束时标记运行完成。
+    """
+
+    def __init__(self,
+                 cfg: AppConfig,
+                 llm_client,
+                 vector_mgr,
+                 tag_mgr: TagManager,
+                 backup_mgr: BackupManager,
+                 manifest: VaultManifest,
+                 tag_index: Optional[TagIndex] = None):
+        self.cfg = cfg
+        self.llm_client = llm_client
+        self.vector_mgr = vector_mgr
+        self.tag_mgr = tag_mgr
+        self.backup_mgr = backup_mgr
+        self.manifest = manifest
+        self.tag_index = tag_index
+        # 标签 -> 使用笔记数 (来自标签索引，用于从 Prompt 候选中剔除冷门标签；None 表示不过滤)
+        self._tag_counts: Optional[Dict[str, int]] = None
+        # TagManager 的集合会被 writer 修改，worker 读取时需加锁
+        self._tag_lock = threading.Lock()
+        # 批量打标的结果：文件路径 -> 标签 (在 run() 开始时计算)
+        self._pretagged: Dict[str, List[str]] = {}
+        # 本地预测的标签：文件路径 -> 标签 (None 表示把握不足，需交给 LLM；每次 run() 开始时清空)
+        self._predicted: Dict[str, Optional[List[str]]] = {}
+        # dry-run 时收集的计划 (由调用方设置后，commit 会把每篇笔记的结果写入计划而不是文件)
+        self.plan: Optional[UpdatePlan] = None
+        # 当前运行的批量备份 (dry-run 时为 None)
+        self._snapshot: Optional[BackupSnapshot] = None
+
+        tag_cfg = cfg.tagging
+        self.cooccurrence = TagCooccurrence()
+        # 候选标签检索：只把与笔记最相关的 top-K 个白名单标签放进打标 Prompt
+        self.shortlister: Optional[TagShortlister] = None
+        if tag_cfg.shortlist_enable:
+            self.shortlister = TagShortlister(
+                vector_mgr.embedding_function,
+                top_k=tag_cfg.shortlist_k,
+                cooccurrence_weight=tag_cfg.cooccurrence_weight,
+                cooccurrence=self.cooccurrence,
+            )
+        # 本地标签预测：置信度足够时不调用 LLM
+        self.predictor: Optional[TagPredictor] = None
+        if tag_cfg.predict_enable:
+            self.predictor = TagPredictor(
+                neighbors=tag_cfg.predict_neighbors,
+                min_neighbors=tag_cfg.predict_min_neighbors,
+                threshold=tag_cfg.predict_threshold,
+                max_tags=tag_cfg.predict_max_tags,
+                cooccurrence_weight=tag_cfg.cooccurrence_weight,
+                cooccurrence=self.cooccurrence,
+            )
+
+    @property
+    def dry_run(self) -> bool:
+        return self.cfg.pipeline.dry_run
+
+    # -------------------------------------------------------------------------
+    # Worker 阶段
+    # -------------------------------------------------------------------------
+    def prepare(self, file_path: Path) -> NoteTask:
+        task = NoteTask(file_path=file_path)
+        try:
+            self._prepare(task)
+        except Exception as e:
+            task.error = str(e)
+        return task
+
+    def _prepare(self, task: NoteTask):
+        file_path = task.file_path
+
+        # 1. 初始化 FileModifier 进行内容读取和操作
+        try:
+            task.file_hash = hash_file(file_path)
+            modifier = FileModifier(file_path)
+            task.modifier = modifier
+            task.content = modifier.post.content # 正文内容
+
+            # --- 自动收割现有 Tags ---
+            current_tags = modifier.get_tags()
+
+            with self._tag_lock:
+                for t in current_tags:
+                    t = str(t).strip()
+                    if t and not self.tag_mgr.has_tag(t) and not self.tag_mgr.is_blacklisted(t):
+                        task.harvested_tags.append(t)
+        except Exception as e:
+            task.log(f"[yellow]文件解析警告: {e}，跳过处理[/yellow]")
+            task.parse_failed = True
+            return
+
+        content = task.content
+        if not content.strip():
+            return
+
+        # 2. Embedding
+        # 只 Embedding 一次：同一组向量既用于候选标签检索和关联检索，也在提交阶段写入向量库
+        task.note_embedding = self.vector_mgr.embed_note(content)
+
+        # 3. Tagging (本地预测 -> 批量打标结果 -> 单篇 LLM 打标)
+        predicted = self._predict_tags(file_path, task.note_embedding.vector, current_tags)
+        pretagged = self._pretagged.get(str(file_path))
+        if predicted is not None:
+            new_tags = predicted
+            task.log("  [dim]标签来自本地预测 (相似笔记投票)[/dim]")
+        elif pretagged is not None:
+            new_tags = pretagged
+            task.log("  [dim]标签来自批量打标[/dim]")
+        else:
+            existing_tags = self._candidate_tags(task.note_embedding.vector, current_tags, task.harvested_tags)
+            new_tags = self.llm_client.generate_tags(content, existing_tags)
+
+        # 过滤黑名单标签
+        with self._tag_lock:
+            valid_new_tags = [t for t in new_tags if not self.tag_mgr.is_blacklisted(t)]
+        if len(valid_new_tags) < len(new_tags):
+            task.log(f"  [dim]已过滤 {len(new_tags)-len(valid_new_tags)} 个黑名单标签[/dim]")
+
+        task.log(f"  🤖 建议标签: {valid_new_tags}")
+        task.new_tags = valid_new_tags
+
+        # 应用标签 (FileModifier 会自动合并去重)
+        if modifier.update_tags(valid_new_tags):
+            task.tags_changed = True
+            task.log("  [green]✔ 标签已更新[/green]")
+
+        # 4. LLM Linking
+        related_docs = []
+        if task.note_embedding.chunks:
+            related_docs = self.vector_mgr.search_notes_by_vector(
+                task.note_embedding.vector, k=3, exclude_id=self.manifest.rel_key(file_path)
+            )
+        # [调试] 打印检索到的原始结果
+        task.log(f"[debug] 原始检索结果: {[(d['source'], round(d['score'], 4)) for d in related_docs]}")
+
+        if related_docs:
+            task.log(f"  🔍 检索到 {len(related_docs)} 篇相关笔记: {[d['source'] for d in related_docs]}")
+            insight = self.llm_client.generate_insight(file_path.stem, content, related_docs)
+            if insight:
+                task.log(Panel(insight, title="生成的关联见解", border_style="magenta"))
+                modifier.append_callout(insight)
+                task.insight = insight
+                task.log("  [green]✔ 见解已追加[/green]")
+
+        self._stage_backup(task)
+
+    def _stage_backup(self, task: NoteTask):
+        """内容将会变化的笔记登记到本次运行的备份 (使用读取时的原始内容，不再重新读取文件)"""
+        if self._snapshot is not None and task.modifier.is_modified():
+            self._snapshot.stage(task.file_path, task.modifier.original, task.file_path.stat().st_mtime)
+
+    def _predict_tags(self, file_path: Path, vector: List[float], current_tags: List[str]) -> Optional[List[str]]:
+        """本地预测标签，结果按路径缓存 (批量打标阶段可能已经算过)"""
+        if self.predictor is None or not vector:
+            return None
+        key = str(file_path)
+        if key not in self._predicted:
+            neighbors = self.vector_mgr.neighbor_tags(vector, k=self.predictor.neighbors,
+                                                      exclude_id=self.manifest.rel_key(file_path))
+            with self._tag_lock:
+                vocabulary = set(self.tag_mgr.whitelist)
+            self._predicted[key] = self.predictor.predict(neighbors, vocabulary, current_tags)
+        return self._predicted[key]
+
+    def _candidate_tags(self, vector: List[float], current_tags: List[str], extra: List[str]) -> List[str]:
+        """打标 Prompt 中的候选标签：白名单中与笔记最相关的 top-K 个 (未开启检索时为整个白名单)"""
+        vocabulary = self._prompt_vocabulary()
+        if self.shortlister is not None:
+            vocabulary = self.shortlister.shortlist(vector, vocabulary, current_tags)
+        return sorted(set(vocabulary).union(extra))
+
+    # -------------------------------------------------------------------------
+    # Writer 阶段
+    # -------------------------------------------------------------------------
+    def commit(self, task: NoteTask) -> bool:
+        """提交单个笔记的结果，返回是否成功"""
+        file_path = task.file_path
+        try:
+            rel_path = file_path.relative_to(self.cfg.vault_path)
+        except ValueError:
+            rel_path = file_path
+        console.print(f"\n[bold]处理文件: {rel_path}[/bold]")
+
+        for message in task.logs:
+            console.print(message)
+
+        if task.parse_failed:
+            return False
+        if task.error:
+            console.print(f"[red]处理文件 {file_path.name} 出错: {task.error}[/red]")
+            return False
+
+        try:
+            with self._tag_lock:
+                # 学习用户自定义标签
+                if not self.dry_run:
+                    for t in task.harvested_tags:
+                        if self.tag_mgr.add_tag(t):
+                            console.print(f"  [cyan]🎓 学习到用户自定义标签: {t}[/cyan]")
+
+            if self.dry_run:
+                self._record_plan(task)
+                return True
+
+            if not task.content.strip():
+                if self.tag_index is not None:
+                    self.tag_index.set_note_tags(self.manifest.rel_key(file_path), task.modifier.get_tags())
+                self.manifest.record(file_path)
+                return True
+
+            # 1. 备份：prepare 阶段已登记并在后台写入，这里确认对象已落盘并写入备份记录；内容没有变化的笔记不备份也不写回
+            modified = task.modifier.is_modified()
+            if modified:
+                if self._snapshot is None:
+                    self.backup_mgr.backup_file(file_path)
+                elif not self._snapshot.ensure(file_path):
+                    return False
+
+            # 2. 学习新标签
+            if task.tags_changed:
+                with self._tag_lock:
+                    for t in task.new_tags:
+                        if self.tag_mgr.add_tag(t):
+                            console.print(f"  [dim]新标签 '{t}' 已加入白名单[/dim]")
+                    self.tag_mgr.record_usage(task.new_tags)
+
+            # 3. 保存修改 & 更新向量库
+            # FileModifier.save() 会负责根据标签数量自动调整 YAML 格式
+            if modified:
+                task.modifier.save()
+            if self.tag_index is not None:
+                self.tag_index.set_note_tags(self.manifest.rel_key(file_path), task.modifier.get_tags())
+
+            # 存入向量库 (复用 prepare 阶段计算的向量)
+            metadata = {"source": file_path.name, "path": str(file_path), "note_id": self.manifest.rel_key(file_path),
+                        "tags": encode_tags(task.modifier.get_tags())}
+            if task.note_embedding is not None:
+                self.vector_mgr.upsert_note(task.note_embedding, metadata)
+            else:
+                self.vector_mgr.add_texts([task.content], [metadata])
+
+            # 笔记内容已变化，丢弃其旧摘要
+            summary_cache = getattr(self.llm_client, "summary_cache", None)
+            if summary_cache is not None:
+                summary_cache.invalidate(str(file_path), keep_hash=hash_text(task.content))
+
+            # 记录写回后的状态，防止下次把工具自己的修改当作变更
+            self.manifest.record(file_path, embedded=True, tagged=True, linked=bool(task.insight))
+            return True
+        except Exception as e:
+            console.print(f"[red]处理文件 {file_path.name} 出错: {e}[/red]")
+            return False
+
+    def _prompt_vocabulary(self) -> List[str]:
+        """打标 Prompt 可用的白名单标签 (按配置剔除使用笔记数过少的标签)"""
+        with self._tag_lock:
+            whitelist = self.tag_mgr.get_all_tags()
+        if self._tag_counts is None:
+            return whitelist
+        return self.tag_index.prompt_vocabulary(whitelist, self.cfg.tagging.prompt_min_notes, self._tag_counts)
+
+    def _load_tag_statistics(self):
+        """
+        读取标签使用统计：各标签的笔记数 (用于剔除冷门标签) 与标签共现 (白名单较小时无需检索，直接跳过)。
+        标签索引完整时直接查询索引，否则从向量库的元数据中读取。
+        """
+        index_ready = self.tag_index is not None and self.tag_index.is_complete
+        if index_ready and self.cfg.tagging.prompt_min_notes > 0:
+            self._tag_counts = self.tag_index.tag_counts()
+
+        if not self.cfg.tagging.cooccurrence_weight:
+            return
+        needs_shortlist = False
+        if self.shortlister is not None:
+            with self._tag_lock:
+                needs_shortlist = len(self.tag_mgr.whitelist) > self.shortlister.top_k
+        if self.predictor is None and not needs_shortlist:
+            return
+        try:
+            tag_lists = self.tag_index.tag_lists() if index_ready else self.vector_mgr.get_note_tag_lists()
+            self.cooccurrence.load(tag_lists)
+        except Exception as e:
+            console.print(f"[yellow]读取标签共现统计失败，仅按相似度筛选候选标签: {e}[/yellow]")
+
+    # -------------------------------------------------------------------------
+    # 计划 (dry-run -> apply)
+    # -------------------------------------------------------------------------
+    def _record_plan(self, task: NoteTask):
+        if self.plan is None:
+            return
+        self.plan.entries.append(PlanEntry(
+            path=self.manifest.rel_key(task.file_path),
+            file_hash=task.file_hash,
+            add_tags=task.new_tags if task.tags_changed else [],
+            learn_tags=task.harvested_tags,
+            callout=task.insight,
+        ))
+
+    def apply(self, plan: UpdatePlan) -> Dict[str, int]:
+        """
+        执行 dry-run 生成的计划：不调用 LLM，直接写入计划中的标签与见解。
+        生成计划后被修改过的文件 (摘要不一致) 会被跳过。
+        :return: {"applied", "skipped", "failed"}
+        """
+        if self.dry_run:
+            # dry-run 下 commit() 只记录计划、不写文件，会把每个条目误报为已应用
+            raise ValueError("dry-run 模式下不能执行计划")
+        stats = {"applied": 0, "skipped": 0, "failed": 0}
+        with self.tag_mgr.transaction(), self._backup_run("apply", self.cfg.pipeline.workers):
+            for entry in plan.entries:
+                self._apply_entry(entry, stats)
+        return stats
+
+    def _apply_entry(self, entry: PlanEntry, stats: Dict[str, int]):
+        file_path = self.cfg.vault_path / entry.path
+        try:
+            if not file_path.is_file() or hash_file(file_path) != entry.file_hash:
+                console.print(f"[yellow]跳过 {entry.path}: 文件在生成计划后已被修改或删除[/yellow]")
+                stats["skipped"] += 1
+                return
+            task = self._task_from_plan(file_path, entry)
+        except Exception as e:
+            console.print(f"[red]处理文件 {entry.path} 出错: {e}[/red]")
+            stats["failed"] += 1
+            return
+
+        if self.commit(task):
+            stats["applied"] += 1
+        else:
+            stats["failed"] += 1
+
+    def _task_from_plan(self, file_path: Path, entry: PlanEntry) -> NoteTask:
+        task = NoteTask(file_path=file_path, file_hash=entry.file_hash)
+        modifier = FileModifier(file_path)
+        task.modifier = modifier
+        task.content = modifier.post.content
+
+        # 黑名单可能在生成计划后有变化，再过滤一次
+        with self._tag_lock:
+            task.harvested_tags = [t for t in entry.learn_tags if not self.tag_mgr.is_blacklisted(t)]
+            task.new_tags = [t for t in entry.add_tags if not self.tag_mgr.is_blacklisted(t)]
+
+        if task.new_tags and modifier.update_tags(task.new_tags):
+            task.tags_changed = True
+            task.log(f"  🏷 添加标签: {task.new_tags}")
+        if entry.callout:
+            modifier.append_callout(entry.callout)
+            task.insight = entry.callout
+            task.log("  [green]✔ 见解已追加[/green]")
+        if task.content.strip():
+            task.note_embedding = self.vector_mgr.embed_note(task.content)
+        self._stage_backup(task)
+        return task
+
+    # -------------------------------------------------------------------------
+    # 批量打标
+    # -------------------------------------------------------------------------
+    def _pretag(self, files: List[Path], workers: int) -> Dict[str, List[str]]:
+        """把短笔记打包成批次一次性打标；未成功的笔记之后在 prepare 中逐篇处理"""
+        tag_cfg = self.cfg.tagging
+        if not tag_cfg.batch_enable:
+            return {}
+
+        notes: Dict[str, str] = {}
+        note_tags: Dict[str, List[str]] = {}
+        for p in files:
+            try:
+                body, tags = read_note(p)
+            except OSError:
+                continue
+            if body.strip() and len(body) <= tag_cfg.batch_note_max_chars:
+                notes[str(p)] = body
+                note_tags[str(p)] = tags
+        if len(notes) < 2:
+            return {}
+
+        whitelist = self._prompt_vocabulary()
+        use_shortlist = self.shortlister is not None and len(whitelist) > self.shortlister.top_k
+
+        # 本地预测有把握的笔记不再参与批量打标；其余笔记计算候选标签，批次内取并集 (相似的短笔记候选高度重叠)
+        shortlists: Dict[str, List[str]] = {}
+        vectors: Dict[str, List[float]] = {}
+        if use_shortlist or self.predictor is not None:
+            for key in list(notes):
+                vector = self.vector_mgr.embed_note(notes[key]).vector
+                if self._predict_tags(Path(key), vector, note_tags[key]) is not None:
+                    del notes[key]
+                elif use_shortlist:
+                    shortlists[key] = self.shortlister.shortlist(vector, whitelist, note_tags[key])
+                    vectors[key] = vector
+            if len(notes) < 2:
+                return {}
+        # 每批的候选标签最多 top_k 个 (见 tag_batch)，按最长的 top_k 个标签估算 Prompt 大小，保证不超预算
+        plan_tags = sorted(whitelist, key=len, reverse=True)[:self.shortlister.top_k] if use_shortlist else whitelist
+
+        batches = self.llm_client.plan_tag_batches(notes, plan_tags)
+        console.print(f"[dim]批量打标: {len(notes)} 篇短笔记合并为 {len(batches)} 次请求[/dim]")
+
+        def tag_batch(batch: Dict[str, str]) -> Dict[str, List[str]]:
+            if shortlists:
+                # 成员候选的并集可能多达 batch_max_notes * top_k 个，再按批次平均向量截取 top_k 个
+                union = sorted(set().union(*(shortlists[key] for key in batch)))
+                centroid = np.mean([vectors[key] for key in batch], axis=0)
+                current = sorted(set().union(*(note_tags[key] for key in batch)))
+                batch_tags = self.shortlister.shortlist(centroid.tolist(), union, current)
+            else:
+                batch_tags = whitelist
+            return self.llm_client.generate_tags_batch(batch, batch_tags)
+
+        results: Dict[str, List[str]] = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="autolink-tag") as pool:
+            for batch_result in pool.map(tag_batch, batches):
+                results.update(batch_result)
+
+        missing = len(notes) - len(results)
+        if missing:
+            console.print(f"[yellow]{missing} 篇笔记未能从批量结果中解析，将逐篇打标[/yellow]")
+        return results
+
+    # -------------------------------------------------------------------------
+    # 调度
+    # -------------------------------------------------------------------------
+    @contextmanager
+    def _backup_run(self, command: str, workers: int) -> Iterator[Optional[BackupSnapshot]]:
+        """在一次运行期间启用批量备份，结束 (包括出错中断) 时提交本次运行的备份记录"""
+        if self.dry_run:
+            yield None
+            return
+        with self.backup_mgr.snapshot(command, workers) as snapshot:
+            self._snapshot = snapshot
+            try:
+                yield snapshot
+            finally:
+                self._snapshot = None
+
+    def run(self, files: List[Path], workers: int = 1, command: str = "update") -> int:
+        """
+        处理一批文件，返回失败数量。
+        workers > 1 时，prepare 在线程池中并发执行 (同时在途的任务数不超过 2 * workers)，
+        commit 始终在当前线程中按提交顺序串行执行 (与 files 的顺序一致)。
+        :param command: 记录在备份运行中的命令名 (restore --run 可撤销整次运行)
+        """
+        self._load_tag_statistics()
+        # 预测结果只在本批次内有效 (watch 会复用同一个流水线，笔记内容与相似笔记都可能已经变化)
+        self._predicted = {}
+        # 标签白名单在整个批次结束时统一写盘，而不是每学到一个标签重写一次
+        with self.tag_mgr.transaction(), self._backup_run(command, workers):
+            self._pretagged = self._pretag(files, workers)
+            failed_count = self._run_tasks(files, workers)
+
+        if self.predictor is not None:
+            predicted = sum(1 for tags in self._predicted.values() if tags is not None)
+            console.print(f"[dim]本地预测标签: {predicted} 篇笔记未调用 LLM 打标[/dim]")
+        return failed_count
+
+    def _run_tasks(self, files: List[Path], workers: int) -> int:
+        failed_count = 0
+        if workers <= 1:
+            for file_path in files:
+                if not self.commit(self.prepare(file_path)):
+                    failed_count += 1
+            return failed_count
+
+        max_in_flight = workers * 2
+        pending = iter(files)
+        in_flight: "deque[Future]" = deque()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="autolink") as pool:
+            def submit_next() -> bool:
+                file_path = next(pending, None)
+                if file_path is None:
+                    return False
+                in_flight.append(pool.submit(self.prepare, file_path))
+                return True
+
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+
+            while in_flight:
+                # 按提交顺序提交结果，保持输出与提交顺序一致
+                task = in_flight.popleft().result()
+                submit_next()
+                if not self.commit(task):
+                    failed_count += 1
+
+        return failed_count
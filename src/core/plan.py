@@ -0,0 +1,43 @@
+from pathlib import Path
+from typing import List
+import json
+import os
+import time
+from pydantic import BaseModel, Field
+
+from src.utils.hashing import hash_text
+
+class PlanEntry(BaseModel):
+    """单个笔记的计划修改"""
+    path: str # 相对于 Vault 的路径 (posix 格式)
+    file_hash: str # 生成计划时整个文件 (含 Frontmatter) 的摘要，apply 时不一致则跳过
+    add_tags: List[str] = Field(default_factory=list) # 需要合并进 Frontmatter 的新标签
+    learn_tags: List[str] = Field(default_factory=list) # 用户手写、需要加入白名单的标签
+    callout: str = "" # 需要追加到文末的关联见解
+
+class UpdatePlan(BaseModel):
+    """
+    update --dry-run 生成的计划文件。
+    记录 LLM 的打标与见解结果，apply 时直接执行，不再重新调用模型。
+    """
+    version: int = 1
+    created_at: float = Field(default_factory=time.time)
+    vault_path: str = ""
+    entries: List[PlanEntry] = Field(default_factory=list)
+
+    def save(self, path: Path):
+        """原子写入计划文件 (临时文件 + 重命名)"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.model_dump(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "UpdatePlan":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+def hash_file(path: Path) -> str:
+    """计算整个文件内容的摘要 (用于判断计划生成后文件是否被修改)"""
+    return hash_text(path.read_text(encoding="utf-8", errors="ignore"))
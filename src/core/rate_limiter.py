@@ -0,0 +1,126 @@
+from typing import Callable, Dict, Optional, TypeVar
+import random
+import threading
+import time
+from rich.console import Console
+
+from src.core.config import ProviderConfig
+
+console = Console()
+
+T = TypeVar("T")
+
+# 令牌桶最多允许积攒多少秒的额度 (突发上限)，避免空闲后瞬间打满一整分钟的配额
+BURST_SECONDS = 10.0
+
+# 视为可重试的 HTTP 状态码 (限流 / 超时 / 服务端错误)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_NAMES = ("RateLimit", "Timeout", "Connection", "ServiceUnavailable", "InternalServer", "Overloaded")
+
+class TokenBucket:
+    """线程安全的令牌桶，rate_per_minute 为每分钟补充的额度"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0):
+        """
+        阻塞直到取得 amount 个令牌。
+        超过桶容量的请求等到桶满即可放行，但按全额扣除 (余额变为负数)，
+        之后的请求要等欠下的额度补回，长期速率不会超过配额。
+        """
+        need = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= need:
+                    self.tokens -= amount
+                    return
+                wait = (need - self.tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+class RateLimiter:
+    """单个 Provider 的限流器：请求数/分钟 + token 数/分钟"""
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens: int = 0):
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None and tokens > 0:
+            self.tokens.acquire(tokens)
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider_name: str, cfg: ProviderConfig) -> RateLimiter:
+    """按 Provider 名称获取进程内共享的限流器 (所有 LLMClient 与 worker 线程共用同一份配额)"""
+    with _limiters_lock:
+        limiter = _limiters.get(provider_name)
+        if limiter is None:
+            limiter = RateLimiter(cfg.requests_per_minute, cfg.tokens_per_minute)
+            _limiters[provider_name] = limiter
+        return limiter
+
+def _status_code(error: Exception) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None:
+        response = getattr(error, "response", None)
+        code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+def is_retryable(error: Exception) -> bool:
+    """判断异常是否为限流或暂时性错误"""
+    code = _status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    name = type(error).__name__
+    return any(key in name for key in RETRYABLE_NAMES)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """读取服务端返回的 Retry-After (秒)"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def call_with_retry(fn: Callable[[], T],
+                    max_retries: int = 3,
+                    base_delay: float = 1.0,
+                    max_delay: float = 30.0,
+                    label: str = "") -> T:
+    """
+    执行 fn，遇到限流/暂时性错误时按带抖动的指数退避重试 (full jitter)。
+    服务端返回 Retry-After 时按其等待，但同样不超过 max_delay。
+    不可重试的异常或重试次数用尽时抛出最后一次的异常。
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is not None:
+                delay = min(max(delay, 0.0), max_delay)
+            else:
+                delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            attempt += 1
+            console.print(f"[yellow]{label}请求失败 ({type(e).__name__})，{delay:.1f}s 后进行第 {attempt} 次重试[/yellow]")
+            time.sleep(delay)
@@ -0,0 +1,119 @@
+from pathlib import Path
+from typing import Optional
+import sqlite3
+import threading
+import time
+from rich.console import Console
+
+from src.utils.hashing import hash_text
+
+console = Console()
+
+class ResponseCache:
+    """
+    LLM 响应的持久化缓存 (SQLite)。
+    键 = Provider + 模型 + temperature + Prompt 模板摘要 + 渲染后 Prompt 摘要，相同输入只付费一次
+    (例如 dry-run 之后再正式运行、失败后重跑、restore 之后再 update)。
+    条目超过 ttl_seconds 视为过期；条目数或总大小超出上限时按最近访问时间 (LRU) 淘汰。
+    """
+
+    def __init__(self, db_path: Path, ttl_seconds: float = 0, max_entries: int = 20000, max_bytes: int = 0):
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # 流水线的 worker 线程会并发访问，统一通过锁串行化
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created_at)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self._purge_expired()
+
+    @staticmethod
+    def make_key(provider: str, model: str, temperature: float, template: str, prompt_text: str) -> str:
+        return hash_text(f"{provider}|{model}|{temperature}|{hash_text(template)}|{hash_text(prompt_text)}")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str, provider: str = "", model: str = ""):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, len(response.encode("utf-8")), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def discard(self, key: str):
+        """删除一条缓存 (例如响应无法解析时，避免下次命中同样的坏结果)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def _purge_expired(self):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+
+    def _evict(self):
+        if self.max_entries > 0:
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+        if self.max_bytes > 0:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                # 从最久未访问的条目开始删除，直到总大小回到上限以内
+                excess = total - self.max_bytes
+                freed = 0
+                keys = []
+                for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+                    keys.append(key)
+                    freed += size
+                    if freed >= excess:
+                        break
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in keys])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,33 +1,76 @@
 import shutil
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Set
+from concurrent.futures import Future, ThreadPoolExecutor
 from rich.console import Console
 import os
+import secrets
+import threading
 
 from src.core.config import SafetyConfig
+from src.core.backup_store import BlobStore
+from src.core.backup_catalog import BackupCatalog
 
 console = Console()
 
 class BackupManager:
+    """
+    备份存储布局 (backup_path 下)：
+    - objects/: 内容寻址的对象库，相同内容只存一份 (可选 zstd 压缩)
+    - catalog.sqlite3: 备份目录，每次备份一行 (路径、时间、内容哈希、运行 ID)，恢复时直接按索引查询
+    旧版备份 (按日期目录的完整复制) 在首次打开时导入备份目录。
+    """
+
     def __init__(self, config: SafetyConfig, vault_root: Path):
         self.config = config
         self.vault_root = vault_root.resolve()
         # 备份根目录 (绝对路径)
         self.backup_root = Path(config.backup_path).resolve()
+        self.store = BlobStore(self.backup_root / "objects", config.backup_compression, config.backup_compression_level)
+        self.catalog = BackupCatalog(self.backup_root / "catalog.sqlite3")
+        self.run_id: Optional[str] = None
+        self._migrate_legacy()
+
+    def _rel_path(self, file_path: Path) -> str:
+        """文件相对于 Vault 的 posix 路径 (不在 Vault 内时直接用文件名)"""
+        try:
+            return file_path.relative_to(self.vault_root).as_posix()
+        except ValueError:
+            return file_path.name
+
+    # -------------------------------------------------------------------------
+    # 运行
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _new_run_id() -> str:
+        return datetime.now().strftime("%Y%m%d-%H%M%S") + "-" + secrets.token_hex(2)
+
+    def start_run(self, command: str) -> str:
+        """开始一次运行，之后通过 backup_file 的备份都归属于该运行，可按运行 ID 整体撤销"""
+        self.run_id = self._new_run_id()
+        self.catalog.start_run(self.run_id, command)
+        return self.run_id
+
+    def snapshot(self, command: str, workers: int = 4) -> "BackupSnapshot":
+        """开始一次运行级的批量备份 (update / apply / watch 的每一批各一次)"""
+        return BackupSnapshot(self, command, workers)
+
+    def list_runs(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.catalog.runs(limit)
 
-    def _get_today_backup_dir(self) -> Path:
-        """获取今日的备份目录"""
-        today_str = datetime.now().strftime("%Y-%m-%d")
-        dir_path = self.backup_root / today_str
-        dir_path.mkdir(parents=True, exist_ok=True)
-        return dir_path
+    def list_versions(self, rel_file_path: str) -> List[Dict[str, Any]]:
+        """文件的所有备份版本 (新 -> 旧)"""
+        return self.catalog.versions(Path(rel_file_path).as_posix())
 
-    def backup_file(self, file_path: Path) -> Optional[Path]:
+    # -------------------------------------------------------------------------
+    # 备份
+    # -------------------------------------------------------------------------
+    def backup_file(self, file_path: Path) -> Optional[str]:
         """
-        备份单个文件
+        备份单个文件：内容已在对象库中时只写入一条备份记录，否则额外写入一个对象。
         :param file_path: 原始文件路径 (绝对路径)
-        :return: 备份文件的路径
+        :return: 备份内容的哈希
         """
         if not self.config.enable_backup:
             return None
@@ -37,120 +80,239 @@ class BackupManager:
             console.print(f"[yellow]警告：尝试备份不存在的文件 {file_path}[/yellow]")
             return None
 
-        # 计算相对路径，以保持备份目录结构
         try:
-            rel_path = file_path.relative_to(self.vault_root)
-        except ValueError:
-            # 如果文件不在 Vault 内，直接用文件名
-            rel_path = Path(file_path.name)
-
-        backup_dir = self._get_today_backup_dir()
-        dest_path = backup_dir / rel_path
-
-        # 确保目标文件的父目录存在
-        dest_path.parent.mkdir(parents=True, exist_ok=True)
-
-        try:
-            # copy2 保留文件元数据 (mtime等)
-            shutil.copy2(file_path, dest_path)
-            # console.print(f"[dim]已备份: {file_path.name} -> {dest_path}[/dim]")
-            return dest_path
+            if self.run_id is None:
+                self.start_run("manual")
+            record = self._store(file_path, file_path.read_bytes(), file_path.stat().st_mtime, self.run_id)
+            self.catalog.add(record)
+            return record["blob"]
         except Exception as e:
             console.print(f"[bold red]备份失败 {file_path}: {e}[/bold red]")
             return None
 
-    def restore_file(self, rel_file_path: str) -> bool:
-        """
-        从最近的备份中恢复文件
-        :param rel_file_path: 相对于 Vault 的路径 (例如 "Notes/AI.md")
-        """
-        target_path = (self.vault_root / rel_file_path).resolve()
-
-        # 查找该文件的所有备份，按时间倒序
-        backups = []
-        if not self.backup_root.exists():
-            console.print("[red]没有找到任何备份记录[/red]")
-            return False
+    def _store(self, file_path: Path, data: bytes, mtime: float, run_id: str) -> Dict[str, Any]:
+        """把内容写入对象库，返回对应的备份记录 (尚未写入备份目录)"""
+        now = datetime.now()
+        return {
+            "path": self._rel_path(file_path),
+            "date": now.strftime("%Y-%m-%d"),
+            "time": now.timestamp(),
+            "mtime": mtime,
+            "blob": self.store.put(data),
+            "size": len(data),
+            "run_id": run_id,
+        }
 
-        # 遍历日期文件夹
-        for date_dir in self.backup_root.iterdir():
-            if not date_dir.is_dir():
-                continue
+    # -------------------------------------------------------------------------
+    # 恢复
+    # -------------------------------------------------------------------------
+    def _write_restored(self, target_path: Path, data: bytes, mtime: Optional[float] = None):
+        """原子写回 Vault，并恢复原文件的修改时间"""
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target_path.with_name(target_path.name + ".restore.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target_path)
+        if mtime is not None:
+            os.utime(target_path, (mtime, mtime))
 
-            potential_backup = date_dir / rel_file_path
-            if potential_backup.exists():
-                backups.append(potential_backup)
+    def _restore_records(self, records: List[Dict[str, Any]]) -> int:
+        count = 0
+        for record in records:
+            try:
+                self._write_restored(self.vault_root / record["path"], self.store.get(record["blob"]), record.get("mtime"))
+                console.print(f"[dim]恢复: {record['path']}[/dim]")
+                count += 1
+            except Exception as e:
+                console.print(f"[red]文件 {record['path']} 恢复失败: {e}[/red]")
+        return count
 
-        if not backups:
-            console.print(f"[red]未找到文件 {rel_file_path} 的任何备份[/red]")
+    def restore_file(self, rel_file_path: str, version_id: Optional[int] = None) -> bool:
+        """
+        恢复单个文件
+        :param rel_file_path: 相对于 Vault 的路径 (例如 "Notes/AI.md")
+        :param version_id: 指定版本 (见 list_versions)，默认最近一次备份
+        """
+        rel_key = Path(rel_file_path).as_posix()
+        record = self.catalog.get(version_id) if version_id is not None else self.catalog.latest(rel_key)
+        if record is None or record["path"] != rel_key:
+            console.print(f"[red]未找到文件 {rel_file_path} 的{'该版本' if version_id is not None else '任何'}备份[/red]")
             return False
 
-        # 取最新的备份 (这里假设日期文件夹名排序即时间排序)
-        # 更好的做法是读取文件mtime，但简单起见直接按目录名排序
-        backups.sort(key=lambda p: p.parent.parent.name, reverse=True) # 父目录的父目录是日期目录？不对
-        # 目录结构是 backup_root / YYYY-MM-DD / rel_path
-        # 所以 backup.parts 里面包含了日期
-        # 简单按字符串排序即可，因为路径包含YYYY-MM-DD
-        backups.sort(key=str, reverse=True)
-
-        latest_backup = backups[0]
-
         try:
-            target_path.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(latest_backup, target_path)
-            console.print(f"[green]✔ 已恢复: {rel_file_path} (来源: {latest_backup.parent})[/green]")
-            return True
+            self._write_restored(self.vault_root / rel_key, self.store.get(record["blob"]), record.get("mtime"))
         except Exception as e:
             console.print(f"[bold red]恢复失败: {e}[/bold red]")
             return False
+        when = datetime.fromtimestamp(record["time"]).strftime("%Y-%m-%d %H:%M:%S")
+        console.print(f"[green]✔ 已恢复: {rel_file_path} (来源: {when}, 运行 {record['run_id']})[/green]")
+        return True
 
     def restore_by_date(self, date_str: str) -> int:
         """
-        恢复指定日期的所有文件
+        恢复指定日期的所有文件 (每个文件取当天最后一次备份)
         :return: 恢复的文件数量
         """
-        backup_dir = self.backup_root / date_str
-        if not backup_dir.exists():
+        records = self.catalog.by_date(date_str)
+        if not records:
             console.print(f"[red]未找到日期 {date_str} 的备份[/red]")
             return 0
+        return self._restore_records(records)
 
-        count = 0
-        # 遍历该日期下的所有文件
-        for backup_file in backup_dir.rglob("*"):
-            if backup_file.is_file():
-                # 计算出它在 Vault 中的原始位置
-                rel_path = backup_file.relative_to(backup_dir)
-                target_path = self.vault_root / rel_path
-
-                try:
-                    target_path.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(backup_file, target_path)
-                    console.print(f"[dim]恢复: {rel_path}[/dim]")
-                    count += 1
-                except Exception as e:
-                    console.print(f"[red]文件 {rel_path} 恢复失败: {e}[/red]")
+    def restore_run(self, run_id: str) -> int:
+        """撤销一次运行：把该运行修改过的文件恢复到运行开始前的内容"""
+        records = self.catalog.by_run(run_id)
+        if not records:
+            console.print(f"[red]未找到运行 {run_id} 的备份[/red]")
+            return 0
+        return self._restore_records(records)
 
-        return count
+    def restore_to_time(self, point: datetime) -> int:
+        """把之后被修改过的文件恢复到指定时间点的内容"""
+        records = self.catalog.as_of(point.timestamp())
+        if not records:
+            console.print(f"[yellow]{point:%Y-%m-%d %H:%M:%S} 之后没有备份记录，无需恢复[/yellow]")
+            return 0
+        return self._restore_records(records)
 
+    # -------------------------------------------------------------------------
+    # 清理
+    # -------------------------------------------------------------------------
     def prune_old_backups(self):
-        """清理超过保留天数的备份"""
+        """删除超过保留天数的备份记录，并回收不再被引用的对象"""
         retention_days = self.config.backup_retention_days
         if retention_days <= 0:
             return
 
-        cutoff_date = datetime.now() - timedelta(days=retention_days)
+        cutoff_time = datetime.now() - timedelta(days=retention_days)
+        cutoff = cutoff_time.strftime("%Y-%m-%d")
+        expired = self.catalog.expire(cutoff, cutoff_time.timestamp())
+        if expired:
+            console.print(f"[yellow]清理过期备份: {expired} 条 ({cutoff} 之前)[/yellow]")
+            # 其他进程中进行中的运行可能已写入对象但尚未写入备份记录，这些对象不能回收
+            # (超过保留期仍未结束的运行视为已中断)
+            keep_after = self.catalog.oldest_open_run(cutoff_time.timestamp())
+            removed = self.store.gc(self.catalog.referenced_blobs(), keep_after)
+            if removed:
+                console.print(f"[dim]已回收 {removed} 个不再被引用的备份对象[/dim]")
 
+    # -------------------------------------------------------------------------
+    # 旧版备份导入
+    # -------------------------------------------------------------------------
+    def _migrate_legacy(self):
+        """把旧版备份 (日期目录) 导入对象库与备份目录，成功后删除旧文件"""
         if not self.backup_root.exists():
             return
 
-        for date_dir in self.backup_root.iterdir():
+        for date_dir in sorted(self.backup_root.iterdir()):
+            try:
+                datetime.strptime(date_dir.name, "%Y-%m-%d")
+            except ValueError:
+                continue
             if not date_dir.is_dir():
                 continue
-
             try:
-                dir_date = datetime.strptime(date_dir.name, "%Y-%m-%d")
-                if dir_date < cutoff_date:
-                    console.print(f"[yellow]清理过期备份: {date_dir.name}[/yellow]")
-                    shutil.rmtree(date_dir)
-            except ValueError:
-                continue # 忽略非日期命名的文件夹
+                self._import_legacy_dir(date_dir)
+                shutil.rmtree(date_dir)
+            except Exception as e:
+                console.print(f"[red]旧版备份 {date_dir} 导入失败: {e}[/red]")
+
+    def _import_legacy_dir(self, date_dir: Path):
+        date_str = date_dir.name
+        day_start = datetime.strptime(date_str, "%Y-%m-%d").timestamp()
+        run_id = f"legacy-{date_str}"
+        records = []
+        for backup_file in sorted(date_dir.rglob("*")):
+            if not backup_file.is_file():
+                continue
+            data = backup_file.read_bytes()
+            mtime = backup_file.stat().st_mtime
+            records.append({
+                "path": backup_file.relative_to(date_dir).as_posix(),
+                "date": date_str,
+                # 旧版备份没有记录备份时间，用 (保留下来的) 原修改时间近似，并限制在当天之内
+                "time": min(max(mtime, day_start), day_start + 86399),
+                "mtime": mtime,
+                "blob": self.store.put(data),
+                "size": len(data),
+                "run_id": run_id,
+            })
+        if records:
+            self.catalog.start_run(run_id, "legacy", day_start)
+            self.catalog.add_many(records)
+            console.print(f"[dim]已导入旧版备份 {date_str}: {len(records)} 个文件[/dim]")
+
+class BackupSnapshot:
+    """
+    一次运行的批量备份：
+    - 创建时登记一次进行中的运行 (之后写入的对象不会被并发的清理回收)
+    - stage(): 登记即将被修改的文件，内容是读取笔记时已拿到的原始字节，在后台线程中写入对象库
+    - ensure(): 覆盖文件之前确认其备份对象已落盘，并写入该文件的备份记录；
+      运行中途崩溃时，已被修改的文件也都能通过 restore 找到
+    - commit(): 运行结束时标记运行已完成
+    同一文件在一次运行中只备份第一次 (运行开始前的内容)；没有被登记的文件 (内容未变化) 不备份。
+    """
+
+    def __init__(self, manager: BackupManager, command: str, workers: int = 4):
+        self.manager = manager
+        self.command = command
+        self.enabled = manager.config.enable_backup
+        self.run_id = manager._new_run_id()
+        self.count = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self._recorded: Set[str] = set()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        if self.enabled:
+            manager.catalog.start_run(self.run_id, command, in_progress=True)
+            self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="autolink-backup")
+
+    def stage(self, file_path: Path, data: bytes, mtime: float):
+        if not self.enabled:
+            return
+        key = str(file_path.resolve())
+        with self._lock:
+            if key not in self._pending:
+                self._pending[key] = self._pool.submit(self.manager._store, file_path.resolve(), data, mtime, self.run_id)
+
+    def ensure(self, file_path: Path) -> bool:
+        """
+        等待该文件的备份对象写入完成，并写入备份记录；
+        备份失败 (或未登记) 时返回 False，调用方不应覆盖文件
+        """
+        if not self.enabled:
+            return True
+        key = str(file_path.resolve())
+        with self._lock:
+            future = self._pending.get(key)
+        if future is None:
+            console.print(f"[bold red]备份失败 {file_path}: 文件未登记备份[/bold red]")
+            return False
+        try:
+            record = future.result()
+            with self._lock:
+                if key in self._recorded:
+                    return True
+                self._recorded.add(key)
+            self.manager.catalog.add(record)
+            self.count += 1
+            return True
+        except Exception as e:
+            console.print(f"[bold red]备份失败 {file_path}: {e}[/bold red]")
+            return False
+
+    def commit(self) -> int:
+        """标记运行结束，返回备份的文件数 (只登记未写回的文件不计入，其对象留待清理时回收)"""
+        if not self.enabled:
+            return 0
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self.manager.catalog.finish_run(self.run_id)
+        return self.count
+
+    def __enter__(self) -> "BackupSnapshot":
+        return self
+
+    def __exit__(self, *exc):
+        count = self.commit()
+        if count:
+            console.print(f"[dim]本次运行备份了 {count} 个文件 (运行 ID: {self.run_id}，可用 restore --run 撤销)[/dim]")
@@ -1,7 +1,25 @@
 from pathlib import Path
-from typing import List, Generator, Set
+from typing import List, Generator, Set, Iterable, Optional, NamedTuple
 from datetime import datetime
+import fnmatch
 import os
+import re
+
+from src.core.manifest import VaultManifest
+
+class NoteEntry(NamedTuple):
+    """扫描结果：复用 os.scandir 的 stat 信息，避免重复系统调用"""
+    path: Path
+    rel_path: str # 相对于 Vault 的 posix 路径
+    stat: os.stat_result
+
+    @property
+    def size(self) -> int:
+        return self.stat.st_size
+
+    @property
+    def mtime_ns(self) -> int:
+        return self.stat.st_mtime_ns
 
 class VaultScanner:
     # 默认忽略的目录名
@@ -15,44 +33,95 @@ class VaultScanner:
         "Templates"
     }
 
-    def __init__(self, vault_root: Path):
+    def __init__(self, vault_root: Path, ignore: Optional[Iterable[str]] = None, extension: str = ".md"):
+        """
+        :param ignore: 忽略规则 (glob)，同时匹配目录/文件名与相对路径，
+                       如 ".git"、"Archive/*"、"*.excalidraw.md"。默认使用 IGNORED_DIRS。
+        """
         self.vault_root = vault_root.resolve()
+        self.extension = extension
+        patterns = sorted(self.IGNORED_DIRS) if ignore is None else list(ignore)
+        # 合并为一个正则，单次匹配即可判断
+        self._ignore_re = re.compile("|".join(fnmatch.translate(p) for p in patterns)) if patterns else None
+
+    def _match_ignore(self, name: str, rel_path: str) -> bool:
+        if self._ignore_re is None:
+            return False
+        return bool(self._ignore_re.match(name) or self._ignore_re.match(rel_path))
 
     def _is_ignored(self, path: Path) -> bool:
         """检查路径是否包含被忽略的目录"""
-        # 检查路径中的每一部分是否在黑名单中
+        # 检查路径中的每一部分 (及其前缀路径) 是否命中忽略规则
         # 例如: /Notes/.obsidian/plugins/ Should be ignored
         rel_parts = path.relative_to(self.vault_root).parts
 
-        # 只要路径中任何一部分在忽略列表中，就跳过
-        for part in rel_parts:
-            if part in self.IGNORED_DIRS:
+        for i, part in enumerate(rel_parts):
+            if self._match_ignore(part, "/".join(rel_parts[:i + 1])):
                 return True
         return False
 
+    def walk(self) -> Generator[NoteEntry, None, None]:
+        """
+        基于 os.scandir 遍历 Vault。
+        被忽略的目录在进入之前就被剪枝 (不会遍历 .git 等大目录)，不跟随目录符号链接。
+        """
+        stack = [(str(self.vault_root), "")]
+        while stack:
+            dir_path, rel_dir = stack.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+
+            subdirs = []
+            for entry in entries:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not self._match_ignore(entry.name, rel):
+                            subdirs.append((entry.path, rel))
+                        continue
+                    if not entry.name.endswith(self.extension) or not entry.is_file():
+                        continue
+                    if self._match_ignore(entry.name, rel):
+                        continue
+                    yield NoteEntry(Path(entry.path), rel, entry.stat())
+                except OSError:
+                    continue
+
+            # 逆序压栈，保证按名称顺序遍历子目录
+            stack.extend(reversed(subdirs))
+
+    def iter_all(self) -> Generator[Path, None, None]:
+        """逐个产出所有 Markdown 文件 (不在内存中保存完整列表)"""
+        for entry in self.walk():
+            yield entry.path
+
     def scan_all(self) -> List[Path]:
         """扫描所有 Markdown 文件"""
-        files = []
-        # 使用 rglob 递归查找
-        for p in self.vault_root.rglob("*.md"):
-            if p.is_file() and not self._is_ignored(p):
-                files.append(p)
-        return files
-
-    def scan_changes(self, last_run_time: float) -> List[Path]:
+        return list(self.iter_all())
+
+    def scan_changes(self, manifest: VaultManifest, legacy_last_run: float = 0.0,
+                     seen: Optional[Set[str]] = None) -> List[Path]:
         """
-        扫描自上次运行以来修改过的文件
-        :param last_run_time: 上次运行的时间戳 (float)
-        :return: 修改过的文件列表
+        扫描正文内容发生变化的文件 (基于清单中的 size/mtime_ns/正文摘要)
+        :param manifest: 文件清单
+        :param legacy_last_run: 旧版 .last_run 时间戳。清单中没有记录、且修改时间早于该时间的文件
+                                视为已处理过，直接记入清单作为基线，避免升级后全库重跑。
+        :param seen: 提供时收集扫描到的所有文件的清单键 (用于清理已删除的笔记)
+        :return: 变更的文件列表
         """
         changed_files = []
-        for p in self.vault_root.rglob("*.md"):
-            if not p.is_file() or self._is_ignored(p):
+        for entry in self.walk():
+            p = entry.path
+            if seen is not None:
+                seen.add(manifest.rel_key(p))
+            if legacy_last_run and manifest.get(p) is None and entry.stat.st_mtime <= legacy_last_run:
+                manifest.record(p, embedded=True, tagged=True, linked=True)
                 continue
 
-            # 获取文件最后修改时间
-            mtime = p.stat().st_mtime
-            if mtime > last_run_time:
+            if manifest.is_changed(p, entry.stat):
                 changed_files.append(p)
 
         return changed_files
@@ -0,0 +1,97 @@
+from pathlib import Path
+from typing import Optional
+import sqlite3
+import threading
+import time
+from rich.console import Console
+
+from src.utils.hashing import hash_text
+
+console = Console()
+
+class SummaryCache:
+    """
+    参考笔记摘要的持久化缓存 (SQLite)。
+    键 = 内容摘要 + 摘要 Prompt 摘要 + 摘要模型标识；超过 max_entries 时按最近访问时间 (LRU) 淘汰。
+    同一来源笔记写入新内容的摘要时，旧内容的摘要会被一并删除。
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = 5000):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # 流水线的 worker 线程会并发访问，统一通过锁串行化
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_source ON summaries(source)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_access ON summaries(last_access)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content_hash: str, prompt_hash: str, model_id: str) -> str:
+        return hash_text(f"{content_hash}|{prompt_hash}|{model_id}")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, summary: str, content_hash: str, source: str = ""):
+        with self._lock:
+            if source:
+                # 来源笔记内容已变化，丢弃其旧摘要
+                self._conn.execute(
+                    "DELETE FROM summaries WHERE source = ? AND content_hash != ?",
+                    (source, content_hash)
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, source, content_hash, summary, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, source, content_hash, summary, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self, source: str, keep_hash: Optional[str] = None) -> int:
+        """删除某个来源笔记的摘要 (可保留与 keep_hash 一致的条目)，返回删除数量"""
+        with self._lock:
+            if keep_hash:
+                cur = self._conn.execute(
+                    "DELETE FROM summaries WHERE source = ? AND content_hash != ?", (source, keep_hash)
+                )
+            else:
+                cur = self._conn.execute("DELETE FROM summaries WHERE source = ?", (source,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def _evict(self):
+        if self.max_entries <= 0:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
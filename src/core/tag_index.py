@@ -0,0 +1,129 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import sqlite3
+import threading
+
+class TagIndex:
+    """
+    Vault 标签倒排索引 (SQLite)：笔记标识 (相对路径) <-> Frontmatter 标签。
+    由 init / update 增量维护，tags stats / tags orphans 直接查询，无需重新扫描 Vault。
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS note_tags (
+                note_id TEXT NOT NULL,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (note_id, tag)
+            )"""
+        )
+        # 没有标签的笔记也要记录，才能统计笔记总数、区分 "未索引" 与 "无标签"
+        self._conn.execute("CREATE TABLE IF NOT EXISTS notes (note_id TEXT PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags(tag)")
+        self._conn.commit()
+
+    # --- 维护 ---
+    def set_note_tags(self, note_id: str, tags: Iterable[str]):
+        """用笔记当前的标签替换索引中的记录"""
+        self.set_many([(note_id, tags)])
+
+    def set_many(self, items: Iterable[Tuple[str, Iterable[str]]]):
+        """批量更新多篇笔记 (同一事务)"""
+        with self._lock:
+            for note_id, tags in items:
+                self._conn.execute("INSERT OR IGNORE INTO notes (note_id) VALUES (?)", (note_id,))
+                self._conn.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO note_tags (note_id, tag) VALUES (?, ?)",
+                    [(note_id, t) for t in dict.fromkeys(str(t).strip() for t in tags) if t]
+                )
+            self._conn.commit()
+
+    def remove_notes(self, note_ids: Iterable[str]):
+        with self._lock:
+            rows = [(n,) for n in note_ids]
+            self._conn.executemany("DELETE FROM note_tags WHERE note_id = ?", rows)
+            self._conn.executemany("DELETE FROM notes WHERE note_id = ?", rows)
+            self._conn.commit()
+
+    def retain(self, note_ids: Set[str]) -> int:
+        """只保留给定笔记的记录 (清理已删除的笔记)，返回被移除的数量"""
+        removed = [n for n in self.note_ids() if n not in note_ids]
+        if removed:
+            self.remove_notes(removed)
+        return len(removed)
+
+    def mark_complete(self):
+        """记录索引已覆盖整个 Vault (init / tags reindex 完成后调用)"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('complete', '1')")
+            self._conn.commit()
+
+    @property
+    def is_complete(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'complete'").fetchone()
+        return row is not None
+
+    # --- 查询 ---
+    def note_ids(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT note_id FROM notes")]
+
+    def note_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def tags_of(self, note_id: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT tag FROM note_tags WHERE note_id = ? ORDER BY tag", (note_id,))
+            return [r[0] for r in rows]
+
+    def notes_with(self, tag: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT note_id FROM note_tags WHERE tag = ? ORDER BY note_id", (tag,))
+            return [r[0] for r in rows]
+
+    def tag_counts(self) -> Dict[str, int]:
+        """标签 -> 使用该标签的笔记数"""
+        with self._lock:
+            rows = self._conn.execute("SELECT tag, COUNT(*) FROM note_tags GROUP BY tag")
+            return {tag: count for tag, count in rows}
+
+    def tag_lists(self) -> List[List[str]]:
+        """每篇有标签的笔记的标签列表 (用于统计标签共现)"""
+        grouped: Dict[str, List[str]] = {}
+        with self._lock:
+            for note_id, tag in self._conn.execute("SELECT note_id, tag FROM note_tags"):
+                grouped.setdefault(note_id, []).append(tag)
+        return list(grouped.values())
+
+    def untagged_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM notes WHERE note_id NOT IN (SELECT DISTINCT note_id FROM note_tags)"
+            ).fetchone()[0]
+
+    def prompt_vocabulary(self, whitelist: List[str], min_notes: int,
+                          counts: Optional[Dict[str, int]] = None) -> List[str]:
+        """从白名单中去掉使用笔记数低于 min_notes 的标签 (min_notes <= 0 时原样返回)"""
+        if min_notes <= 0:
+            return whitelist
+        counts = counts if counts is not None else self.tag_counts()
+        return [t for t in whitelist if counts.get(t, 0) >= min_notes]
+
+    def orphans(self, whitelist: Iterable[str], max_notes: int = 0,
+                counts: Optional[Dict[str, int]] = None) -> List[str]:
+        """白名单中使用笔记数不超过 max_notes 的标签 (默认 0 = 没有笔记使用)"""
+        counts = counts if counts is not None else self.tag_counts()
+        return [t for t in whitelist if counts.get(t, 0) <= max_notes]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,26 +1,50 @@
 from pathlib import Path
-from typing import List, Set
+from typing import List, Set, Dict, Iterable, Iterator, Optional, Any
+from contextlib import contextmanager
 import json
+import os
+import threading
+import time
 from rich.console import Console
 
 console = Console()
 
 class TagManager:
+    """
+    标签白名单 / 黑名单 / 使用次数的内存注册表。
+    修改只标记脏数据，写入时机：
+    - 事务外：每次修改后立即写入 (CLI 单条命令的行为不变)
+    - transaction() 内：事务结束时统一写入一次；事务持续较久时，距上次写入超过 flush_interval 秒后的下一次修改会触发写入
+      (没有定时器，事务内长时间无修改时不会写入；pipeline.run() 每批各开一个事务，批次结束即落盘)
+    写入均为原子操作 (临时文件 + 重命名)。
+    """
+
     def __init__(self,
                  whitelist_path: Path = Path("tags.json"),
-                 blacklist_path: Path = Path("tags_blacklist.json")):
+                 blacklist_path: Path = Path("tags_blacklist.json"),
+                 usage_path: Path = Path("tags_usage.json"),
+                 flush_interval: float = 30.0):
         self.whitelist_path = whitelist_path
         self.blacklist_path = blacklist_path
+        self.usage_path = usage_path
+        self.flush_interval = flush_interval
 
         # 初始化时只创建空列表，不预置任何默认值
         self.whitelist: Set[str] = self._load_or_create_json(whitelist_path, set())
         self.blacklist: Set[str] = self._load_or_create_json(blacklist_path, set())
+        self.usage: Dict[str, int] = self._load_usage(usage_path)
+
+        self._lock = threading.RLock()
+        self._dirty: Set[Path] = set()
+        self._depth = 0 # 嵌套事务层数
+        self._last_flush = time.monotonic()
+        self._sorted_cache: Optional[List[str]] = None
 
     def _load_or_create_json(self, path: Path, default: Set[str]) -> Set[str]:
         """通用加载 JSON 集合，如果不存在则创建并写入默认值"""
         if not path.exists():
             # 立即创建文件 (写入空列表)
-            self._save_json(path, default)
+            self._save_json(path, sorted(default))
             console.print(f"[dim]已创建空白配置文件: {path}[/dim]")
             return default
 
@@ -32,17 +56,75 @@ class TagManager:
             console.print(f"[red]文件 {path} 加载失败: {e}[/red]")
             return default
 
-    def _save_json(self, path: Path, data: Set[str]):
-        """通用保存 JSON 集合"""
+    def _load_usage(self, path: Path) -> Dict[str, int]:
+        if not path.exists():
+            return {}
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(sorted(list(data)), f, indent=2, ensure_ascii=False)
+            with open(path, "r", encoding="utf-8") as f:
+                return {str(k): int(v) for k, v in json.load(f).items()}
+        except Exception as e:
+            console.print(f"[red]文件 {path} 加载失败: {e}[/red]")
+            return {}
+
+    def _save_json(self, path: Path, data: Any):
+        """原子写入 JSON (临时文件 + 重命名)，中途失败不会留下半截文件"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, path)
         except Exception as e:
             console.print(f"[red]文件 {path} 保存失败: {e}[/red]")
 
+    # --- 持久化 ---
+    def _mark_dirty(self, path: Path):
+        self._dirty.add(path)
+        if path == self.whitelist_path:
+            self._sorted_cache = None
+        if self._depth == 0 or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """把有变化的文件写回磁盘"""
+        with self._lock:
+            if self.whitelist_path in self._dirty:
+                self._save_json(self.whitelist_path, self.get_all_tags())
+            if self.blacklist_path in self._dirty:
+                self._save_json(self.blacklist_path, sorted(self.blacklist))
+            if self.usage_path in self._dirty:
+                self._save_json(self.usage_path, dict(sorted(self.usage.items())))
+            self._dirty.clear()
+            self._last_flush = time.monotonic()
+
+    @contextmanager
+    def transaction(self) -> Iterator["TagManager"]:
+        """批量修改：事务内不逐条写盘，退出 (最外层) 事务时统一写入"""
+        with self._lock:
+            self._depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if self._depth == 0 and self._dirty:
+                    self.flush()
+
     # --- Whitelist Operations ---
     def get_all_tags(self) -> List[str]:
-        return sorted(list(self.whitelist))
+        """排序后的白名单 (缓存到下一次修改，避免每次调用都重新排序)"""
+        with self._lock:
+            if self._sorted_cache is None:
+                self._sorted_cache = sorted(self.whitelist)
+            return list(self._sorted_cache)
+
+    def has_tag(self, tag: str) -> bool:
+        return tag in self.whitelist
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self.whitelist
+
+    def __len__(self) -> int:
+        return len(self.whitelist)
 
     def add_tag(self, tag: str) -> bool:
         """添加标签到白名单 (如果不在黑名单中)"""
@@ -50,24 +132,48 @@ class TagManager:
         if not tag:
             return False
 
-        # 检查黑名单
-        if tag in self.blacklist:
-            console.print(f"[yellow]拒绝添加标签 '{tag}' (在黑名单中)[/yellow]")
-            return False
+        with self._lock:
+            # 检查黑名单
+            if tag in self.blacklist:
+                console.print(f"[yellow]拒绝添加标签 '{tag}' (在黑名单中)[/yellow]")
+                return False
 
-        if tag in self.whitelist:
-            return False
+            if tag in self.whitelist:
+                return False
 
-        self.whitelist.add(tag)
-        self._save_json(self.whitelist_path, self.whitelist)
-        return True
+            self.whitelist.add(tag)
+            self._mark_dirty(self.whitelist_path)
+            return True
 
     def remove_tag(self, tag: str) -> bool:
-        if tag not in self.whitelist:
-            return False
-        self.whitelist.remove(tag)
-        self._save_json(self.whitelist_path, self.whitelist)
-        return True
+        with self._lock:
+            if tag not in self.whitelist:
+                return False
+            self.whitelist.remove(tag)
+            self._mark_dirty(self.whitelist_path)
+            return True
+
+    # --- Usage Counts ---
+    def record_usage(self, tags: Iterable[str]):
+        """记录标签被写入笔记的次数 (用于后续按常用程度排序)"""
+        with self._lock:
+            changed = False
+            for tag in tags:
+                tag = str(tag).strip()
+                if tag:
+                    self.usage[tag] = self.usage.get(tag, 0) + 1
+                    changed = True
+            if changed:
+                self._mark_dirty(self.usage_path)
+
+    def usage_count(self, tag: str) -> int:
+        return self.usage.get(tag, 0)
+
+    def most_used(self, n: Optional[int] = None) -> List[str]:
+        """按使用次数降序排列的白名单标签"""
+        with self._lock:
+            ranked = sorted(self.whitelist, key=lambda t: (-self.usage.get(t, 0), t))
+        return ranked if n is None else ranked[:n]
 
     # --- Blacklist Operations ---
     def get_blacklist(self) -> List[str]:
@@ -79,25 +185,27 @@ class TagManager:
         if not tag:
             return False
 
-        if tag in self.blacklist:
-            return False
+        with self._lock:
+            if tag in self.blacklist:
+                return False
 
-        self.blacklist.add(tag)
-        self._save_json(self.blacklist_path, self.blacklist)
+            self.blacklist.add(tag)
+            self._mark_dirty(self.blacklist_path)
 
-        # 如果白名单里有，由于互斥原则，应该移除
-        if tag in self.whitelist:
-            self.remove_tag(tag)
-            console.print(f"[yellow]标签 '{tag}' 已从白名单移至黑名单[/yellow]")
+            # 如果白名单里有，由于互斥原则，应该移除
+            if tag in self.whitelist:
+                self.remove_tag(tag)
+                console.print(f"[yellow]标签 '{tag}' 已从白名单移至黑名单[/yellow]")
 
-        return True
+            return True
 
     def remove_from_blacklist(self, tag: str) -> bool:
-        if tag not in self.blacklist:
-            return False
-        self.blacklist.remove(tag)
-        self._save_json(self.blacklist_path, self.blacklist)
-        return True
+        with self._lock:
+            if tag not in self.blacklist:
+                return False
+            self.blacklist.remove(tag)
+            self._mark_dirty(self.blacklist_path)
+            return True
 
     def is_blacklisted(self, tag: str) -> bool:
         return tag in self.blacklist
@@ -0,0 +1,159 @@
+from typing import Dict, List, Iterable, Optional, Set, Tuple
+from collections import Counter
+import threading
+import numpy as np
+
+class TagCooccurrence:
+    """标签共现统计：P(标签 B | 笔记含有标签 A)，由 Vault 中各笔记的标签列表建立"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tag_counts: Counter = Counter()
+        self._pair_counts: Dict[str, Counter] = {}
+
+    def load(self, tag_lists: Iterable[List[str]]):
+        tag_counts: Counter = Counter()
+        pair_counts: Dict[str, Counter] = {}
+        for tags in tag_lists:
+            unique = set(tags)
+            tag_counts.update(unique)
+            for a in unique:
+                pairs = pair_counts.setdefault(a, Counter())
+                pairs.update(t for t in unique if t != a)
+        with self._lock:
+            self._tag_counts, self._pair_counts = tag_counts, pair_counts
+
+    def __bool__(self) -> bool:
+        return bool(self._tag_counts)
+
+    def scores(self, current_tags: List[str]) -> Dict[str, float]:
+        """对每个候选标签取 max P(候选 | 笔记已有标签)"""
+        scores: Dict[str, float] = {}
+        with self._lock:
+            for tag in current_tags:
+                total = self._tag_counts.get(tag, 0)
+                if not total:
+                    continue
+                for other, n in self._pair_counts.get(tag, {}).items():
+                    p = n / total
+                    if p > scores.get(other, 0.0):
+                        scores[other] = p
+        return scores
+
+class TagShortlister:
+    """
+    标签候选检索：为每个标签计算 Embedding，按与笔记向量的相似度 (可叠加共现统计) 选出 top-K 候选，
+    只把候选标签放入打标 Prompt，使 Prompt 长度不随标签库增长。
+    标签向量通过 VectorStoreManager 的 Embedding 函数计算，因此同样会命中 Embedding 缓存。
+    """
+
+    def __init__(self, embedding_function, top_k: int = 50, cooccurrence_weight: float = 0.3,
+                 cooccurrence: Optional[TagCooccurrence] = None):
+        self.embedding_function = embedding_function
+        self.top_k = top_k
+        self.cooccurrence_weight = cooccurrence_weight
+        self.cooccurrence = cooccurrence if cooccurrence is not None else TagCooccurrence()
+
+        self._lock = threading.Lock()
+        self._tags: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+
+    # --- 标签向量 ---
+    def _ensure_indexed(self, tags: Iterable[str]):
+        """增量为新标签计算向量 (已计算过的标签不会重复计算)"""
+        missing = [t for t in tags if t not in self._rows]
+        if not missing:
+            return
+        vectors = np.asarray(self.embedding_function.embed_documents(missing), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1.0)
+        for t in missing:
+            self._rows[t] = len(self._tags)
+            self._tags.append(t)
+        self._matrix = vectors if self._matrix is None else np.vstack([self._matrix, vectors])
+
+    # --- 候选检索 ---
+    def shortlist(self, note_vector: List[float], vocabulary: List[str],
+                  current_tags: Optional[List[str]] = None) -> List[str]:
+        """
+        :param note_vector: 笔记级向量 (NoteEmbedding.vector)
+        :param vocabulary: 当前白名单
+        :param current_tags: 笔记已有的标签 (用于共现加权)
+        :return: 最相关的 top_k 个候选标签；白名单不超过 top_k 时原样返回
+        """
+        if len(vocabulary) <= self.top_k or not note_vector:
+            return list(vocabulary)
+
+        with self._lock:
+            self._ensure_indexed(vocabulary)
+            rows = np.fromiter((self._rows[t] for t in vocabulary), dtype=np.int64, count=len(vocabulary))
+            query = np.asarray(note_vector, dtype=np.float32)
+            scores = self._matrix[rows] @ query
+
+        if self.cooccurrence_weight and current_tags:
+            cooc = self.cooccurrence.scores(current_tags)
+            if cooc:
+                boost = np.fromiter((cooc.get(t, 0.0) for t in vocabulary), dtype=np.float32, count=len(vocabulary))
+                scores = scores + self.cooccurrence_weight * boost
+
+        top = np.argsort(-scores)[:self.top_k]
+        return sorted(vocabulary[i] for i in top)
+
+class TagPredictor:
+    """
+    本地标签预测：不调用 LLM，根据向量库中相似笔记的标签投票 (kNN) 并结合共现统计给出标签。
+    只有置信度足够高时才采用预测结果，否则返回 None，由调用方交给 LLM 打标。
+    """
+
+    def __init__(self,
+                 neighbors: int = 5,
+                 min_neighbors: int = 3,
+                 threshold: float = 0.6,
+                 max_tags: int = 5,
+                 cooccurrence_weight: float = 0.3,
+                 cooccurrence: Optional[TagCooccurrence] = None):
+        self.neighbors = neighbors
+        self.min_neighbors = min_neighbors
+        self.threshold = threshold
+        self.max_tags = max_tags
+        self.cooccurrence_weight = cooccurrence_weight
+        self.cooccurrence = cooccurrence if cooccurrence is not None else TagCooccurrence()
+
+    def score(self, neighbors: List[Tuple[float, List[str]]], current_tags: Optional[List[str]] = None) -> Dict[str, float]:
+        """
+        :param neighbors: [(距离, 标签列表)]，只包含有标签的相似笔记
+        :return: 标签 -> 置信度 (0~1)；邻居按 1 / (1 + 距离) 加权投票
+        """
+        total = 0.0
+        votes: Dict[str, float] = {}
+        for distance, tags in neighbors:
+            weight = 1.0 / (1.0 + max(0.0, distance))
+            total += weight
+            for t in set(tags):
+                votes[t] = votes.get(t, 0.0) + weight
+        if not total:
+            return {}
+
+        scores = {t: v / total for t, v in votes.items()}
+        if self.cooccurrence_weight and current_tags and self.cooccurrence:
+            cooc = self.cooccurrence.scores(current_tags)
+            w = self.cooccurrence_weight
+            for t in set(scores).union(cooc):
+                scores[t] = (1 - w) * scores.get(t, 0.0) + w * cooc.get(t, 0.0)
+        return scores
+
+    def predict(self, neighbors: List[Tuple[float, List[str]]], vocabulary: Set[str],
+                current_tags: Optional[List[str]] = None) -> Optional[List[str]]:
+        """
+        :param vocabulary: 允许预测的标签 (白名单)
+        :return: 置信度达到阈值的标签 (按置信度降序，最多 max_tags 个)；把握不足时返回 None
+        """
+        if len(neighbors) < self.min_neighbors:
+            return None
+        scores = self.score(neighbors, current_tags)
+        confident = sorted(
+            (t for t, s in scores.items() if s >= self.threshold and t in vocabulary),
+            key=lambda t: (-scores[t], t),
+        )
+        return confident[:self.max_tags] or None
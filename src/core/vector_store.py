@@ -1,99 +1,450 @@
 import shutil
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, NamedTuple, Set
 from rich.console import Console
 
+import chromadb
+
 # LangChain Imports
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
 from src.core.config import EmbeddingConfig, ProviderConfig
+from src.core.chunker import MarkdownChunker, Chunk
+from src.core.embedding_cache import EmbeddingCache, CachedEmbeddings
+from src.core.note_embedding import NoteEmbedding, note_vector, decode_tags
 
 console = Console()
 
+class PreparedBatch(NamedTuple):
+    """切分完成、等待 Embedding 与写入的一批分块"""
+    texts: List[str]
+    metadatas: List[Dict[str, Any]]
+    ids: List[str] # 稳定 ID: <相对路径>#<分块序号>
+    stale_ids: List[str] # 需要删除的旧分块 (笔记变短后多出的分块、旧版随机 ID)
+    note_count: int
+
+def embedding_cache_name(emb_cfg: EmbeddingConfig) -> str:
+    """Embedding 缓存的模型标识：量化后的 ONNX 向量与 fp32 略有差异，不能共用同一份缓存"""
+    if emb_cfg.type == "onnx" and emb_cfg.onnx_quantize:
+        return f"{emb_cfg.model_name}@onnx-int8"
+    return emb_cfg.model_name
+
+def create_embedding_model(emb_cfg: EmbeddingConfig, llm_cfg: ProviderConfig, verbose: bool = True) -> Embeddings:
+    """初始化 Embedding 模型 (不含缓存)"""
+    try:
+        if emb_cfg.type == "local":
+            if verbose:
+                console.print(f"[blue]正在加载本地 Embedding 模型: {emb_cfg.model_name}...[/blue]")
+                console.print("[dim]首次运行可能需要下载模型，请耐心等待...[/dim]")
+            # 使用 CPU 推理，保证兼容性
+            return HuggingFaceEmbeddings(
+                model_name=emb_cfg.model_name,
+                model_kwargs={'device': 'cpu'},
+                encode_kwargs={'normalize_embeddings': True}
+            )
+        elif emb_cfg.type == "onnx":
+            from src.core.onnx_embeddings import OnnxEmbeddings
+            if verbose:
+                console.print(f"[blue]正在加载 ONNX Embedding 模型: {emb_cfg.model_name}"
+                              f"{' (int8)' if emb_cfg.onnx_quantize else ''}...[/blue]")
+            return OnnxEmbeddings(
+                emb_cfg.model_name,
+                Path(emb_cfg.onnx_dir),
+                quantize=emb_cfg.onnx_quantize,
+                threads=emb_cfg.onnx_threads,
+                batch_size=emb_cfg.onnx_batch_size,
+                max_length=emb_cfg.onnx_max_length,
+                pooling=emb_cfg.onnx_pooling
+            )
+        elif emb_cfg.type == "api":
+            if verbose:
+                console.print(f"[blue]正在初始化 API Embedding 模型...[/blue]")
+            if not llm_cfg.api_key:
+                console.print("[yellow]警告: 未配置 API Key，API Embedding 可能失败[/yellow]")
+
+            return OpenAIEmbeddings(
+                model=emb_cfg.model_name,
+                openai_api_key=llm_cfg.api_key,
+                openai_api_base=llm_cfg.base_url
+            )
+        else:
+            raise ValueError(f"不支持的 Embedding 类型: {emb_cfg.type}")
+    except Exception as e:
+        console.print(f"[bold red]Embedding 模型初始化失败: {e}[/bold red]")
+        raise e
+
 class VectorStoreManager:
-    def __init__(self, embedding_config: EmbeddingConfig, llm_config: ProviderConfig, persist_directory: str = "./chroma_db"):
+    # 单次写入/删除的最大条目数 (Chroma 对单次请求的条目数有上限)
+    WRITE_BATCH = 5000
+
+    def __init__(self, embedding_config: EmbeddingConfig, llm_config: ProviderConfig, persist_directory: str = "./chroma_db",
+                 embedding_model: Optional[Embeddings] = None, vault_root: Optional[Path] = None):
+        """
+        :param embedding_model: 外部提供的 Embedding 模型 (如多进程 EmbeddingPool)，为 None 时在进程内加载
+        :param vault_root: Vault 根目录，用于把旧版数据的绝对路径换算为笔记标识
+        """
         self.config = embedding_config
         self.persist_directory = persist_directory
-        self.embedding_function = self._init_embedding_model(embedding_config, llm_config)
+        self.vault_root = Path(vault_root).resolve() if vault_root else None
+        self.chunker = MarkdownChunker(embedding_config.chunk_max_tokens)
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self.embedding_function = embedding_model or create_embedding_model(embedding_config, llm_config)
+        if embedding_config.cache_enable:
+            # 先查本地缓存，只对未命中的分块调用模型
+            self.embedding_cache = EmbeddingCache(Path(embedding_config.cache_dir), embedding_cache_name(embedding_config))
+            self.embedding_function = CachedEmbeddings(self.embedding_function, self.embedding_cache)
         self.db = self._init_db()
+        self._migrate_legacy_metadata()
 
-    def _init_embedding_model(self, emb_cfg: EmbeddingConfig, llm_cfg: ProviderConfig):
-        """初始化 Embedding 模型"""
-        try:
-            if emb_cfg.type == "local":
-                console.print(f"[blue]正在加载本地 Embedding 模型: {emb_cfg.model_name}...[/blue]")
-                console.print("[dim]首次运行可能需要下载模型，请耐心等待...[/dim]")
-                # 使用 CPU 推理，保证兼容性
-                return HuggingFaceEmbeddings(
-                    model_name=emb_cfg.model_name,
-                    model_kwargs={'device': 'cpu'},
-                    encode_kwargs={'normalize_embeddings': True}
-                )
-            elif emb_cfg.type == "api":
-                console.print(f"[blue]正在初始化 API Embedding 模型...[/blue]")
-                if not llm_cfg.api_key:
-                    console.print("[yellow]警告: 未配置 API Key，API Embedding 可能失败[/yellow]")
-
-                return OpenAIEmbeddings(
-                    model=emb_cfg.model_name,
-                    openai_api_key=llm_cfg.api_key,
-                    openai_api_base=llm_cfg.base_url
-                )
-            else:
-                raise ValueError(f"不支持的 Embedding 类型: {emb_cfg.type}")
-        except Exception as e:
-            console.print(f"[bold red]Embedding 模型初始化失败: {e}[/bold red]")
-            raise e
+    COLLECTION_NAME = "langchain"  # 与 LangChain Chroma 的默认集合名一致，兼容已有数据库
 
     def _init_db(self):
-        """初始化 Chroma 向量库"""
+        """
+        初始化 Chroma 向量库。
+        客户端与集合通过 chromadb 公开 API 创建后交给 LangChain：
+        检索走 self.db，按 ID 的 upsert/update/delete 直接走 self.collection。
+        """
+        self.client = chromadb.PersistentClient(path=self.persist_directory)
+        self.collection = self.client.get_or_create_collection(self.COLLECTION_NAME)
         return Chroma(
-            persist_directory=self.persist_directory,
+            client=self.client,
+            collection_name=self.COLLECTION_NAME,
             embedding_function=self.embedding_function
         )
 
-    def add_texts(self, texts: List[str], metadatas: List[Dict[str, Any]]):
-        """添加文本到向量库 (先删后加，防止重复)"""
-        if not texts:
+    def note_key(self, meta: Dict[str, Any]) -> str:
+        """
+        笔记在向量库中的唯一标识：相对于 Vault 的 posix 路径 (元数据 note_id)。
+        旧版数据没有 note_id，由绝对路径换算；都没有时退回文件名。
+        """
+        if meta.get("note_id"):
+            return meta["note_id"]
+        path = meta.get("path")
+        if path:
+            if self.vault_root is not None:
+                try:
+                    return Path(path).relative_to(self.vault_root).as_posix()
+                except ValueError:
+                    pass
+            return Path(path).as_posix()
+        return meta.get("source", "")
+
+    @staticmethod
+    def _chunk_id(note_id: str, index: int) -> str:
+        return f"{note_id}#{index}"
+
+    def _migrate_legacy_metadata(self):
+        """
+        旧版按文件名 (source) 标识笔记，不同目录下的同名笔记会互相覆盖。
+        为缺少 note_id 的分块补写标识 (只更新元数据，不重新 Embedding)；
+        它们的随机 ID 会在笔记下次变化时被稳定 ID 替换。
+        """
+        try:
+            sample = self.db.get(limit=1, include=["metadatas"])
+        except Exception:
+            return
+        metas = sample.get("metadatas") or []
+        if not metas or "note_id" in (metas[0] or {}):
             return
 
-        # 1. 清理旧数据
-        # 提取所有涉及到 source 文件名
-        sources_to_delete = list(set([m.get("source") for m in metadatas if m.get("source")]))
+        result = self.db.get(include=["metadatas"])
+        ids, new_metas = [], []
+        for id_, meta in zip(result.get("ids") or [], result.get("metadatas") or []):
+            meta = meta or {}
+            if "note_id" not in meta:
+                ids.append(id_)
+                new_metas.append({**meta, "note_id": self.note_key(meta)})
+        for start in range(0, len(ids), self.WRITE_BATCH):
+            self.collection.update(ids=ids[start:start + self.WRITE_BATCH],
+                                   metadatas=new_metas[start:start + self.WRITE_BATCH])
+        if ids:
+            console.print(f"[blue]已为 {len(ids)} 条旧版分块补写笔记标识 (按相对路径)[/blue]")
+
+    def _get_existing_chunks(self, note_ids: List[str]) -> Dict[str, Tuple[List[str], List[Dict[str, Any]]]]:
+        """一次查询读取多篇笔记在库中已有分块的 (ids, metadatas)，各自按 chunk_index 排序"""
+        if not note_ids:
+            return {}
+        where = {"note_id": note_ids[0]} if len(note_ids) == 1 else {"note_id": {"$in": note_ids}}
+        try:
+            existing = self.db.get(where=where, include=["metadatas"])
+        except Exception:
+            return {}
+        grouped: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for id_, meta in zip(existing.get("ids") or [], existing.get("metadatas") or []):
+            grouped.setdefault(meta.get("note_id", ""), []).append((id_, meta))
+        result = {}
+        for note_id, pairs in grouped.items():
+            pairs.sort(key=lambda p: p[1].get("chunk_index", 0))
+            result[note_id] = ([p[0] for p in pairs], [p[1] for p in pairs])
+        return result
+
+    def _plan_notes(self, notes: List[Tuple[List[Chunk], Dict[str, Any]]]) -> PreparedBatch:
+        """
+        与库中已有分块比较 (整批只查询一次)，得到需要写入的分块。
+        分块哈希一致的笔记无需重新 Embedding：元数据 (如标签) 有变化则批量原地更新；
+        其余笔记按稳定 ID upsert，不再被复用的旧分块 ID 记入 stale_ids。
+        """
+        existing = self._get_existing_chunks(list(dict.fromkeys(self.note_key(m) for _, m in notes)))
+
+        texts: List[str] = []
+        metas: List[Dict[str, Any]] = []
+        ids: List[str] = []
+        stale_ids: List[str] = []
+        update_ids: List[str] = []
+        update_metas: List[Dict[str, Any]] = []
+        note_count = 0
+
+        for chunks, meta in notes:
+            note_id = self.note_key(meta)
+            meta = {**meta, "note_id": note_id}
+            old_ids, old_metas = existing.get(note_id, ([], []))
+            new_metas = [self._chunk_metadata(meta, c, len(chunks)) for c in chunks]
 
-        if sources_to_delete:
+            if [m.get("chunk_hash", "") for m in old_metas] == [c.hash for c in chunks]:
+                # 内容未变化，跳过 (只同步元数据)
+                if new_metas != old_metas:
+                    update_ids.extend(old_ids)
+                    update_metas.extend(new_metas)
+                continue
+
+            new_ids = [self._chunk_id(note_id, c.index) for c in chunks]
+            reused = set(new_ids)
+            stale_ids.extend(i for i in old_ids if i not in reused)
+            note_count += 1
+            texts.extend(c.text for c in chunks)
+            metas.extend(new_metas)
+            ids.extend(new_ids)
+
+        if update_ids:
+            self.collection.update(ids=update_ids, metadatas=update_metas)
+        return PreparedBatch(texts, metas, ids, stale_ids, note_count)
+
+    @staticmethod
+    def _chunk_metadata(meta: Dict[str, Any], chunk: Chunk, chunk_count: int) -> Dict[str, Any]:
+        return {
+            **meta,
+            "chunk_index": chunk.index,
+            "chunk_count": chunk_count,
+            "heading": chunk.heading,
+            "chunk_hash": chunk.hash,
+        }
+
+    def prepare_texts(self, texts: List[str], metadatas: List[Dict[str, Any]]) -> PreparedBatch:
+        """
+        把笔记切分为待写入的分块 (不做 Embedding)。
+        分块哈希与库中完全一致的笔记会被跳过 (元数据有变化时原地更新)。
+        """
+        notes = []
+        for text, meta in zip(texts, metadatas):
+            chunks = self.chunker.split(text)
+            if chunks:
+                notes.append((chunks, meta))
+        return self._plan_notes(notes)
+
+    def write_prepared(self, batch: PreparedBatch, embeddings: Optional[List[List[float]]] = None,
+                       verbose: bool = True) -> int:
+        """
+        写入 prepare_texts 的结果：按稳定 ID upsert，并一次性删除不再使用的旧分块。
+        :param embeddings: 预先计算好的分块向量 (如来自多进程 Embedding)，为 None 时调用模型计算
+        :return: 实际重新索引的笔记数量
+        """
+        if not batch.texts:
+            return 0
+
+        if embeddings is None:
+            embeddings = self.embedding_function.embed_documents(batch.texts)
+        if verbose:
+            console.print(f"正在存入 {batch.note_count} 篇笔记的 {len(batch.texts)} 条分块向量...")
+        self._delete_ids(batch.stale_ids)
+        for start in range(0, len(batch.ids), self.WRITE_BATCH):
+            end = start + self.WRITE_BATCH
+            self.collection.upsert(
+                ids=batch.ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=batch.texts[start:end],
+                metadatas=batch.metadatas[start:end],
+            )
+        self.flush_cache()
+        return batch.note_count
+
+    def _delete_ids(self, ids: List[str]):
+        for start in range(0, len(ids), self.WRITE_BATCH):
+            self.collection.delete(ids=ids[start:start + self.WRITE_BATCH])
+
+    def delete_notes(self, note_ids: List[str]):
+        """删除给定笔记的全部分块 (一次批量操作)，用于清理已从 Vault 中删除或重命名的笔记"""
+        for start in range(0, len(note_ids), self.WRITE_BATCH):
+            part = note_ids[start:start + self.WRITE_BATCH]
+            where = {"note_id": part[0]} if len(part) == 1 else {"note_id": {"$in": part}}
+            self.collection.delete(where=where)
+
+    def prune(self, keep: Set[str]) -> int:
+        """
+        垃圾回收：删除不属于 keep (当前 Vault 中的笔记标识) 的全部分块。
+        :return: 被清理的笔记数量
+        """
+        stale_ids, stale_notes = [], set()
+        offset = 0
+        # 分页读取 (每页 WRITE_BATCH 条)，峰值内存与库的大小无关；删除放到遍历结束后，避免分页错位
+        while True:
             try:
-                # 使用 where 过滤器删除旧记录
-                # Chroma 的 filter 语法: where={"source": {"$in": sources_to_delete}}
-                # 但 delete 方法通常接受 ids 或 where
-                # 逐个删除比较稳妥，防止过滤器语法兼容性问题
-                for source in sources_to_delete:
-                    self.db.delete(where={"source": source})
-                    # console.print(f"[dim]已清理旧向量: {source}[/dim]")
-            except Exception as e:
-                console.print(f"[yellow]清理旧向量失败 (可能是首次运行): {e}[/yellow]")
-
-        # 2. 存入新数据
-        console.print(f"正在存入 {len(texts)} 条向量数据...")
-        self.db.add_texts(texts=texts, metadatas=metadatas)
+                page = self.collection.get(include=["metadatas"], limit=self.WRITE_BATCH, offset=offset)
+            except Exception:
+                return 0
+            ids = page.get("ids") or []
+            for id_, meta in zip(ids, page.get("metadatas") or []):
+                note_id = self.note_key(meta or {})
+                if note_id not in keep:
+                    stale_ids.append(id_)
+                    stale_notes.add(note_id)
+            if len(ids) < self.WRITE_BATCH:
+                break
+            offset += len(ids)
+        self._delete_ids(stale_ids)
+        return len(stale_notes)
+
+    def add_texts(self, texts: List[str], metadatas: List[Dict[str, Any]], verbose: bool = True) -> int:
+        """
+        按笔记添加文本到向量库 (先切分为分块，再先删后加，防止重复)。
+        分块哈希与库中完全一致的笔记会被跳过，不会重新 Embedding。
+        :return: 实际重新索引的笔记数量
+        """
+        if not texts:
+            return 0
+        return self.write_prepared(self.prepare_texts(texts, metadatas), verbose=verbose)
+
+    def flush_cache(self):
+        """持久化 Embedding 缓存索引"""
+        if self.embedding_cache is not None:
+            self.embedding_cache.save()
+
+    def cache_stats(self) -> Tuple[int, int]:
+        """返回 Embedding 缓存的 (命中数, 未命中数)"""
+        if self.embedding_cache is None:
+            return 0, 0
+        return self.embedding_cache.hits, self.embedding_cache.misses
 
     def search(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
-        """相似度搜索"""
+        """相似度搜索 (分块级别)"""
         # 返回结果为 (Document, score) 列表
         return self.db.similarity_search_with_score(query, k=k)
 
+    def get_note_tag_lists(self) -> List[List[str]]:
+        """读取库中每篇笔记的 Frontmatter 标签 (来自首个分块的元数据)，用于统计标签共现"""
+        try:
+            result = self.db.get(where={"chunk_index": 0}, include=["metadatas"])
+        except Exception:
+            return []
+        tag_lists = []
+        for meta in result.get("metadatas") or []:
+            tags = decode_tags(meta.get("tags"))
+            if tags:
+                tag_lists.append(tags)
+        return tag_lists
+
+    def _load_note_text(self, note_id: str) -> str:
+        """按分块顺序拼接还原整篇笔记正文"""
+        result = self.db.get(where={"note_id": note_id}, include=["documents", "metadatas"])
+        pairs = zip(result.get("metadatas") or [], result.get("documents") or [])
+        ordered = sorted(pairs, key=lambda p: p[0].get("chunk_index", 0))
+        return "".join(doc for _, doc in ordered)
+
+    def _group_note_hits(self, raw: List[Tuple[Document, float]], k: int,
+                         exclude_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """将分块命中按笔记 (note_id) 聚合，取每篇笔记的最小距离，并还原整篇正文"""
+        hits: Dict[str, Dict[str, Any]] = {}
+        for doc, score in raw:
+            note_id = self.note_key(doc.metadata)
+            if exclude_id and note_id == exclude_id:
+                continue
+            hit = hits.get(note_id)
+            if hit is None:
+                hit = hits[note_id] = {
+                    "note_id": note_id,
+                    "source": doc.metadata.get("source", "Unknown"),
+                    "path": doc.metadata.get("path", ""),
+                    "score": score,
+                    "headings": [],
+                }
+            hit["score"] = min(hit["score"], score)
+            heading = doc.metadata.get("heading")
+            if heading and heading not in hit["headings"]:
+                hit["headings"].append(heading)
+
+        top = sorted(hits.values(), key=lambda h: h["score"])[:k]
+        for hit in top:
+            hit["content"] = self._load_note_text(hit["note_id"])
+        return top
+
+    def search_notes(self, query: str, k: int = 3, exclude_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        相似度搜索并按笔记聚合分块命中结果。
+        :param exclude_id: 排除的笔记标识 (相对路径)，通常是正在处理的笔记本身
+        :return: [{"note_id", "source", "path", "content", "score", "headings"}]，按距离升序，
+                 content 为整篇笔记正文 (由分块拼接还原)
+        """
+        return self._group_note_hits(self.search(query, k=k * 4), k, exclude_id)
+
+    def search_notes_by_vector(self, vector: List[float], k: int = 3,
+                               exclude_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """与 search_notes 相同，但直接使用已有向量检索，不再调用 Embedding 模型"""
+        raw = self.db.similarity_search_by_vector_with_relevance_scores(vector, k=k * 4)
+        return self._group_note_hits(raw, k, exclude_id)
+
+    def neighbor_tags(self, vector: List[float], k: int = 5,
+                      exclude_id: Optional[str] = None) -> List[Tuple[float, List[str]]]:
+        """
+        检索最相似的 k 篇笔记并返回其标签 (取自分块元数据，不还原正文)。
+        :return: [(距离, 标签列表)]，按距离升序，只包含有标签的笔记
+        """
+        raw = self.db.similarity_search_by_vector_with_relevance_scores(vector, k=k * 4)
+        best: Dict[str, Tuple[float, List[str]]] = {}
+        for doc, score in raw:
+            note_id = self.note_key(doc.metadata)
+            if exclude_id and note_id == exclude_id:
+                continue
+            if note_id not in best or score < best[note_id][0]:
+                best[note_id] = (score, decode_tags(doc.metadata.get("tags")))
+        ranked = sorted(best.values(), key=lambda x: x[0])[:k]
+        return [(score, tags) for score, tags in ranked if tags]
+
+    # --- Embed once: 同一次 Embedding 结果既用于检索也用于写入 ---
+    def embed_note(self, text: str) -> NoteEmbedding:
+        """切分并向量化整篇笔记，返回分块向量与笔记级向量"""
+        chunks = self.chunker.split(text)
+        if not chunks:
+            return NoteEmbedding(chunks=[], vectors=[], vector=[])
+        vectors = self.embedding_function.embed_documents([c.text for c in chunks])
+        return NoteEmbedding(chunks=chunks, vectors=vectors, vector=note_vector(vectors))
+
+    def upsert_note(self, note: NoteEmbedding, metadata: Dict[str, Any]) -> bool:
+        """
+        使用预先计算好的向量写入笔记 (按稳定 ID upsert)。
+        :return: 是否实际写入 (分块哈希与库中一致时跳过)
+        """
+        if not note.chunks:
+            return False
+        batch = self._plan_notes([(note.chunks, metadata)])
+        if not batch.note_count:
+            return False
+        self.write_prepared(batch, note.vectors, verbose=False)
+        return True
+
     def reset(self):
         """重置向量库 (物理删除数据库文件)"""
         console.print(f"[yellow]正在重置向量数据库: {self.persist_directory}[/yellow]")
 
         # 尝试通过 API 删除集合 (如果有必要)
         try:
-            self.db.delete_collection()
+            self.client.delete_collection(self.COLLECTION_NAME)
         except:
             pass
+        # chromadb 按路径缓存客户端，删除文件前先释放，否则重建时会写入已删除的数据库
+        self.client.clear_system_cache()
 
         # 物理删除文件夹，确保彻底重置
         if Path(self.persist_directory).exists():
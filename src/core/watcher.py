@@ -0,0 +1,229 @@
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import threading
+import time
+from rich.console import Console
+
+from src.core.manifest import VaultManifest
+from src.core.scanner import VaultScanner
+
+console = Console()
+
+class VaultWatcher:
+    """
+    监听 Vault 的文件变化并去抖 (debounce) 后回调。
+    - 优先使用 watchdog (Linux 下为 inotify) 订阅文件系统事件，只在启动时按清单补扫一次
+    - watchdog 未安装或不可用时回退到轮询 (基于清单的 stat 比较)
+    - 回调前会用清单过滤掉正文未变化的文件，因此工具自身写回 (FileModifier.save 后记入清单) 不会再次触发
+    - 处理失败的文件 (回调后仍未记入清单) 在再次被修改之前不会重试，避免每次轮询都重复调用 LLM
+    - 删除或重命名的笔记从清单中移除，并通过 on_removed 回调 (参数为清单键) 清理向量库等索引
+    """
+
+    def __init__(self,
+                 scanner: VaultScanner,
+                 manifest: VaultManifest,
+                 on_changes: Callable[[List[Path]], None],
+                 debounce_seconds: float = 2.0,
+                 poll_interval: float = 5.0,
+                 backend: str = "auto",
+                 on_removed: Optional[Callable[[List[str]], None]] = None):
+        self.scanner = scanner
+        self.manifest = manifest
+        self.on_changes = on_changes
+        self.on_removed = on_removed
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.backend = backend
+
+        # 路径 -> 最近一次事件时间；由 watchdog 线程写入，主循环读取
+        self._pending: Dict[Path, float] = {}
+        # 处理失败的文件 -> 失败时的 mtime_ns (mtime 变化后才重试)
+        self._failed: Dict[Path, int] = {}
+        # 目录被删除或移动时 (不会逐个文件发事件) 需要全量核对一次清单
+        self._rescan = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """阻塞运行，直到 stop() 或 Ctrl+C"""
+        observer = None
+        if self.backend in ("auto", "native"):
+            observer = self._start_observer()
+            if observer is None and self.backend == "native":
+                raise RuntimeError("无法启用文件系统事件监听，请安装 watchdog 或改用 polling 模式")
+
+        try:
+            if observer is not None:
+                console.print(f"[green]👀 正在监听 {self.scanner.vault_root} (文件系统事件)[/green]")
+                # 监听停止期间修改的笔记不会产生事件，启动时先按清单补扫一次
+                # (在订阅事件之后扫描，扫描期间的修改也不会遗漏；重复的路径在 _pending 中合并)
+                self._catch_up()
+                self._event_loop()
+            else:
+                console.print(f"[green]👀 正在监听 {self.scanner.vault_root} (轮询，每 {self.poll_interval}s)[/green]")
+                self._poll_loop()
+        except KeyboardInterrupt:
+            console.print("[yellow]监听已停止[/yellow]")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    # -------------------------------------------------------------------------
+    # 文件系统事件
+    # -------------------------------------------------------------------------
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            console.print("[yellow]未安装 watchdog，回退到轮询模式 (pip install watchdog)[/yellow]")
+            return None
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                watcher._on_event(event.src_path, event.is_directory)
+
+            def on_modified(self, event):
+                watcher._on_event(event.src_path, event.is_directory)
+
+            def on_moved(self, event):
+                watcher._on_event(event.src_path, event.is_directory, removed=True)
+                watcher._on_event(event.dest_path, event.is_directory)
+
+            def on_deleted(self, event):
+                watcher._on_event(event.src_path, event.is_directory, removed=True)
+
+        try:
+            observer = Observer()
+            observer.schedule(_Handler(), str(self.scanner.vault_root), recursive=True)
+            observer.start()
+            return observer
+        except Exception as e:
+            console.print(f"[yellow]文件系统事件监听启动失败，回退到轮询模式: {e}[/yellow]")
+            return None
+
+    def _on_event(self, src_path, is_directory: bool, removed: bool = False):
+        if is_directory:
+            if removed:
+                with self._lock:
+                    self._rescan = True
+            return
+        path = Path(src_path if isinstance(src_path, str) else src_path.decode())
+        if path.suffix != self.scanner.extension:
+            return
+        try:
+            if self.scanner._is_ignored(path):
+                return
+        except ValueError:
+            return
+        with self._lock:
+            self._pending[path] = time.monotonic()
+
+    def _take_settled(self) -> List[Path]:
+        """取出最近 debounce_seconds 内没有新事件的文件 (编辑器连续保存只处理一次)"""
+        now = time.monotonic()
+        with self._lock:
+            settled = [p for p, t in self._pending.items() if now - t >= self.debounce_seconds]
+            for p in settled:
+                del self._pending[p]
+        return sorted(settled)
+
+    def _event_loop(self):
+        tick = min(0.5, self.debounce_seconds)
+        while not self._stop.wait(tick):
+            with self._lock:
+                rescan, self._rescan = self._rescan, False
+            if rescan:
+                self._catch_up()
+            settled = self._take_settled()
+            if settled:
+                self._dispatch(settled)
+
+    def _catch_up(self):
+        """按清单全量扫描一次：变更的文件加入待处理队列，已不存在的笔记从清单中移除"""
+        seen: Set[str] = set()
+        changed = self.scanner.scan_changes(self.manifest, seen=seen)
+        self._remove_keys(self.manifest.retain(seen))
+        # 视为已稳定，下一轮即可处理 (之后若有新事件会重新计时)
+        settled_at = time.monotonic() - self.debounce_seconds
+        with self._lock:
+            for p in changed:
+                self._pending.setdefault(p, settled_at)
+
+    def _remove_keys(self, keys: List[str]):
+        """已从清单移除的笔记：通知调用方清理向量库与标签索引"""
+        if keys and self.on_removed is not None:
+            self.on_removed(keys)
+
+    def _is_failed(self, path: Path, mtime_ns: int) -> bool:
+        """上次处理失败且之后没有再被修改"""
+        if path not in self._failed:
+            return False
+        if self._failed[path] == mtime_ns:
+            return True
+        del self._failed[path]
+        return False
+
+    def _dispatch(self, paths: List[Path]):
+        changed: List[Tuple[Path, int]] = []
+        missing: List[str] = []
+        for p in paths:
+            try:
+                if not p.is_file():
+                    # 已删除或被重命名走的笔记
+                    self._failed.pop(p, None)
+                    missing.append(self.manifest.rel_key(p))
+                    continue
+                mtime_ns = p.stat().st_mtime_ns
+                if not self._is_failed(p, mtime_ns) and self.manifest.is_changed(p):
+                    changed.append((p, mtime_ns))
+            except OSError:
+                continue
+        self._remove_keys(self.manifest.remove(missing))
+        if not changed:
+            return
+
+        self.on_changes([p for p, _ in changed])
+        # 处理成功的文件已记入清单；仍显示为变更的文件记为失败，等它再次被修改时重试
+        for p, mtime_ns in changed:
+            try:
+                if self.manifest.is_changed(p):
+                    self._failed[p] = mtime_ns
+            except OSError:
+                continue
+
+    # -------------------------------------------------------------------------
+    # 轮询
+    # -------------------------------------------------------------------------
+    def _poll_loop(self):
+        # 路径 -> (mtime_ns, 发现时间)；mtime 再次变化时重新计时，稳定 debounce_seconds 后才处理
+        candidates: Dict[Path, Tuple[int, float]] = {}
+        while True:
+            now = time.monotonic()
+            seen: Set[str] = set()
+            changed = self.scanner.scan_changes(self.manifest, seen=seen)
+            self._remove_keys(self.manifest.retain(seen))
+            for p in changed:
+                try:
+                    mtime_ns = p.stat().st_mtime_ns
+                except OSError:
+                    continue
+                if self._is_failed(p, mtime_ns):
+                    continue
+                if p not in candidates or candidates[p][0] != mtime_ns:
+                    candidates[p] = (mtime_ns, now)
+
+            settled = sorted(p for p, (_, t) in candidates.items() if now - t >= self.debounce_seconds)
+            for p in settled:
+                del candidates[p]
+            if settled:
+                self._dispatch(settled)
+
+            if self._stop.wait(self.poll_interval):
+                break
@@ -1,9 +1,8 @@
 import typer
 from rich.console import Console
 from rich.panel import Panel
-from typing import Optional
+from typing import Optional, List, Iterable, TYPE_CHECKING
 from pathlib import Path
-import time
 import sys
 
 # 将项目根目录添加到 sys.path
@@ -11,24 +10,34 @@ project_root = Path(__file__).resolve().parent.parent
 if str(project_root) not in sys.path:
     sys.path.append(str(project_root))
 
-from src.core.config import load_config, AppConfig
-from src.core.safety import BackupManager
-from src.core.scanner import VaultScanner
-from src.core.vector_store import VectorStoreManager
+# 顶层只导入轻量模块：tags / blacklist 只读写两个 JSON 文件，应当瞬间启动。
+# 配置 (pydantic)、向量库 (chromadb / torch)、LLM 客户端 (langchain) 等重依赖在各命令内部按需导入。
 from src.core.tag_manager import TagManager
-from src.core.llm import LLMClient
-from src.core.modifier import FileModifier
+
+if TYPE_CHECKING:
+    from src.core.config import AppConfig
+    from src.core.safety import BackupManager
+    from src.core.manifest import VaultManifest
+    from src.core.llm import LLMClient
+    from src.core.tag_index import TagIndex
 
 # 初始化 Typer 应用
 app = typer.Typer(help="Obsidian Auto-Link Core: 你的全自动知识库园丁")
 tags_app = typer.Typer(help="管理 Tag 白名单")
 blacklist_app = typer.Typer(help="管理 Tag 黑名单")
+daemon_app = typer.Typer(help="常驻守护进程 (保持 Embedding 模型与向量库加载)")
+backups_app = typer.Typer(help="查看备份记录 (运行与文件版本)")
 
 app.add_typer(tags_app, name="tags")
 app.add_typer(blacklist_app, name="blacklist")
+app.add_typer(daemon_app, name="daemon")
+app.add_typer(backups_app, name="backups")
 
 console = Console()
+# 旧版本使用的运行时间戳文件，仅用于升级到清单 (Manifest) 时建立基线
 LAST_RUN_FILE = Path(".last_run")
+# update --dry-run 默认把计划写入该目录
+PLAN_DIR = Path(".auto_link_plans")
 
 # ... (Helpers) ...
 
@@ -75,24 +84,59 @@ def remove_blacklist(tag: str):
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
-def get_config_or_exit(config_path: str) -> AppConfig:
+def get_config_or_exit(config_path: str) -> "AppConfig":
     """辅助函数：加载配置，失败则退出"""
+    from src.core.config import load_config
     try:
         return load_config(config_path)
     except Exception as e:
         console.print(f"[bold red]❌ 配置加载失败:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-def get_backup_manager(cfg: AppConfig) -> BackupManager:
+def get_backup_manager(cfg: "AppConfig") -> "BackupManager":
+    from src.core.safety import BackupManager
     return BackupManager(cfg.safety, cfg.vault_path)
 
-def save_last_run_time():
-    """保存当前时间为最后运行时间"""
-    with open(LAST_RUN_FILE, "w") as f:
-        f.write(str(time.time()))
+def get_tag_index(cfg: "AppConfig") -> "TagIndex":
+    from src.core.tag_index import TagIndex
+    return TagIndex(Path(cfg.tagging.index_path))
+
+def get_manifest(cfg: "AppConfig") -> "VaultManifest":
+    from src.core.manifest import VaultManifest
+    return VaultManifest(cfg.vault_path)
+
+def get_vector_store(cfg: "AppConfig"):
+    """优先使用已在运行的守护进程 (模型已加载)，否则在进程内加载 Embedding 模型与向量库"""
+    from src.core.daemon import connect_daemon
+    remote = connect_daemon(cfg)
+    if remote is not None:
+        return remote
+    from src.core.vector_store import VectorStoreManager
+    return VectorStoreManager(cfg.embedding, cfg.get_active_llm_config(), vault_root=cfg.vault_path)
+
+def create_embed_pool(cfg: "AppConfig", workers: int):
+    """init 的多进程 Embedding 池 (workers <= 1、API Embedding 或守护进程运行中时返回 None)"""
+    if workers <= 1:
+        return None
+    if cfg.embedding.type == "api":
+        console.print("[yellow]API Embedding 不需要多进程，忽略 --embed-workers[/yellow]")
+        return None
+    from src.core.daemon import ping_daemon
+    if cfg.daemon.enable and ping_daemon(cfg.daemon.socket_path):
+        console.print("[yellow]守护进程正在运行，向量库由它写入，忽略 --embed-workers[/yellow]")
+        return None
+
+    from src.core.embed_pool import EmbeddingPool
+    pool = EmbeddingPool(cfg.embedding, cfg.get_active_llm_config(), workers, cfg.embedding.embed_worker_threads)
+    console.print(f"[blue]启动 {pool.workers} 个 Embedding 进程 (每个 {pool.threads_per_worker} 线程)[/blue]")
+    return pool
+
+def get_scanner(cfg: "AppConfig"):
+    from src.core.scanner import VaultScanner
+    return VaultScanner(cfg.vault_path, cfg.scanner.ignore)
 
 def get_last_run_time() -> float:
-    """获取上次运行时间，如果不存在则返回 0"""
+    """获取旧版 .last_run 中的运行时间，如果不存在则返回 0"""
     if not LAST_RUN_FILE.exists():
         return 0.0
     try:
@@ -101,16 +145,80 @@ def get_last_run_time() -> float:
     except:
         return 0.0
 
+def print_embedding_cache_stats(vector_mgr):
+    hits, misses = vector_mgr.cache_stats()
+    if hits or misses:
+        console.print(f"[dim]Embedding 缓存: 命中 {hits}，未命中 {misses}[/dim]")
+
+def print_llm_cache_stats(llm_client: "LLMClient"):
+    cache = llm_client.response_cache
+    if cache is not None and (cache.hits or cache.misses):
+        console.print(f"[dim]LLM 响应缓存: 命中 {cache.hits}，未命中 {cache.misses}[/dim]")
+
+def disable_llm_caches(cfg: "AppConfig"):
+    """--no-cache: 本次运行不读写 LLM 响应缓存与摘要缓存"""
+    cfg.llm_cache.enable = False
+    cfg.summarization.cache_enable = False
+
+def run_precompute_summaries(cfg: "AppConfig", paths: Iterable[Path]):
+    """为超过阈值的笔记预先生成摘要，使 update 中的见解生成不必等待摘要调用"""
+    from concurrent.futures import ThreadPoolExecutor
+    from src.core.llm import LLMClient
+    from src.utils.hashing import extract_body
+
+    sum_cfg = cfg.summarization
+    if not sum_cfg.enable or not sum_cfg.cache_enable:
+        console.print("[yellow]摘要或摘要缓存未开启，跳过预计算[/yellow]")
+        return
+
+    try:
+        llm_client = LLMClient(cfg)
+    except Exception as e:
+        console.print(f"[red]LLM 初始化失败，跳过摘要预计算: {e}[/red]")
+        return
+    # 摘要缓存初始化失败时 LLMClient 会禁用缓存，预计算的结果无处保存
+    cache = llm_client.summary_cache
+    if cache is None:
+        console.print("[yellow]摘要缓存不可用，跳过预计算[/yellow]")
+        return
+
+    def summarize(p: Path):
+        try:
+            content = extract_body(p.read_text(encoding="utf-8", errors="ignore"))
+        except Exception:
+            return
+        if len(content) > sum_cfg.threshold:
+            llm_client.summarize_content(content, source=str(p))
+
+    # 分批提交，避免一次性把整个 Vault 读入内存
+    window = cfg.pipeline.workers * 4
+    with console.status("[bold green]正在预计算长笔记的摘要...[/bold green]"):
+        with ThreadPoolExecutor(max_workers=cfg.pipeline.workers) as pool:
+            batch: List[Path] = []
+            for p in paths:
+                batch.append(p)
+                if len(batch) >= window:
+                    list(pool.map(summarize, batch))
+                    batch = []
+            list(pool.map(summarize, batch))
+
+    console.print(f"[green]摘要预计算完成 (缓存命中 {cache.hits}，新生成 {cache.misses})[/green]")
+
 # -----------------------------------------------------------------------------
 # Tag Management Commands
 # -----------------------------------------------------------------------------
 @tags_app.command("list")
-def list_tags():
+def list_tags(
+    by_usage: bool = typer.Option(False, "--by-usage", "-u", help="按使用次数降序排列并显示次数")
+):
     """列出所有已知的标签"""
     mgr = TagManager()
-    tags = mgr.get_all_tags()
+    tags = mgr.most_used() if by_usage else mgr.get_all_tags()
     if not tags:
         console.print("[dim]当前没有标签。[/dim]")
+    elif by_usage:
+        console.print(Panel(", ".join(f"{t} ({mgr.usage_count(t)})" for t in tags),
+                            title=f"已知标签 ({len(tags)})", border_style="blue"))
     else:
         console.print(Panel(", ".join(tags), title=f"已知标签 ({len(tags)})", border_style="blue"))
 
@@ -132,23 +240,112 @@ def remove_tag(tag: str):
     else:
         console.print(f"[red]标签 '{tag}' 不存在[/red]")
 
+@tags_app.command("stats")
+def tag_stats(
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径"),
+    top: int = typer.Option(20, "--top", "-n", min=1, help="显示使用最多的前 N 个标签")
+):
+    """标签使用统计 (读取标签索引，不扫描 Vault)"""
+    from rich.table import Table
+
+    cfg = get_config_or_exit(config_path)
+    index = get_tag_index(cfg)
+    if not index.is_complete:
+        console.print("[yellow]标签索引尚未建立，请先运行 init 或 tags reindex[/yellow]")
+        raise typer.Exit(code=1)
+
+    mgr = TagManager()
+    counts = index.tag_counts()
+    whitelist = set(mgr.get_all_tags())
+    singletons = sum(1 for c in counts.values() if c == 1)
+    unused = sum(1 for t in whitelist if t not in counts)
+
+    console.print(Panel(f"笔记: {index.note_count()} (无标签 {index.untagged_count()})\n"
+                        f"标签: {len(counts)} 个在用，白名单 {len(whitelist)} 个\n"
+                        f"只被 1 篇笔记使用: {singletons}\n"
+                        f"白名单中无笔记使用: {unused}",
+                        title="标签统计", border_style="blue"))
+
+    table = Table(title=f"使用最多的 {top} 个标签")
+    table.add_column("标签")
+    table.add_column("笔记数", justify="right")
+    table.add_column("白名单", justify="center")
+    for tag, count in sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:top]:
+        table.add_row(tag, str(count), "✔" if tag in whitelist else "")
+    console.print(table)
+
+@tags_app.command("orphans")
+def tag_orphans(
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径"),
+    max_notes: int = typer.Option(0, "--max-notes", "-m", min=0, help="列出使用笔记数不超过该值的白名单标签 (默认 0 = 无笔记使用)"),
+    remove: bool = typer.Option(False, "--remove", help="从白名单中删除这些标签")
+):
+    """列出 (并可删除) 白名单中很少或没有笔记使用的标签"""
+    cfg = get_config_or_exit(config_path)
+    index = get_tag_index(cfg)
+    if not index.is_complete:
+        console.print("[yellow]标签索引尚未建立，请先运行 init 或 tags reindex[/yellow]")
+        raise typer.Exit(code=1)
+
+    mgr = TagManager()
+    counts = index.tag_counts()
+    orphans = index.orphans(mgr.get_all_tags(), max_notes, counts)
+    if not orphans:
+        console.print("[green]没有符合条件的标签。[/green]")
+        return
+
+    console.print(Panel(", ".join(f"{t} ({counts.get(t, 0)})" for t in orphans),
+                        title=f"使用笔记数 ≤ {max_notes} 的标签 ({len(orphans)})", border_style="yellow"))
+    if remove:
+        with mgr.transaction():
+            for t in orphans:
+                mgr.remove_tag(t)
+        console.print(f"[green]✔ 已从白名单删除 {len(orphans)} 个标签[/green]")
+
+@tags_app.command("reindex")
+def tag_reindex(
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径")
+):
+    """重新扫描 Vault 的 Frontmatter，重建标签索引 (不涉及 Embedding)"""
+    from src.core.ingest import read_note
+
+    cfg = get_config_or_exit(config_path)
+    index = get_tag_index(cfg)
+    manifest = get_manifest(cfg)
+    rows = []
+    with console.status("[bold green]正在读取笔记标签...[/bold green]"):
+        for p in get_scanner(cfg).iter_all():
+            try:
+                rows.append((manifest.rel_key(p), read_note(p)[1]))
+            except Exception as e:
+                console.print(f"[red]读取文件 {p.name} 失败: {e}[/red]")
+        index.set_many(rows)
+        index.retain({note_id for note_id, _ in rows})
+        index.mark_complete()
+    console.print(f"[green]✔ 标签索引已重建: {len(rows)} 篇笔记[/green]")
+
 # -----------------------------------------------------------------------------
 # Main Commands
 # -----------------------------------------------------------------------------
 @app.command()
 def init(
     config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径"),
-    force: bool = typer.Option(False, "--force", "-f", help="强制重新初始化向量库")
+    force: bool = typer.Option(False, "--force", "-f", help="强制重新初始化向量库"),
+    precompute_summaries: bool = typer.Option(False, "--summaries", help="预先为长笔记生成摘要并写入缓存"),
+    embed_workers: Optional[int] = typer.Option(None, "--embed-workers", min=1, help="并行计算 Embedding 的进程数 (默认读取配置)")
 ):
     """
     全量扫描 Vault，建立初始向量索引。
     """
+    from src.core.ingest import StreamingIndexer
+
     cfg = get_config_or_exit(config_path)
     # 确保 TagManager 初始化
     TagManager()
 
     backup_mgr = get_backup_manager(cfg)
-    scanner = VaultScanner(cfg.vault_path)
+    scanner = get_scanner(cfg)
+    manifest = get_manifest(cfg)
 
     console.print(Panel(f"[bold green]开始初始化[/bold green]\n"
                         f"配置文件: {config_path}\n"
@@ -159,60 +356,93 @@ def init(
         console.print(f"[bold red]错误：Vault 路径不存在: {cfg.vault_path}[/bold red]")
         raise typer.Exit(code=1)
 
+    embed_pool = create_embed_pool(cfg, embed_workers or cfg.embedding.embed_workers)
+
     # 初始化向量管理器
     try:
-        vector_mgr = VectorStoreManager(cfg.embedding, cfg.get_active_llm_config())
+        if embed_pool is not None:
+            from src.core.vector_store import VectorStoreManager
+            vector_mgr = VectorStoreManager(cfg.embedding, cfg.get_active_llm_config(),
+                                            embedding_model=embed_pool, vault_root=cfg.vault_path)
+        else:
+            vector_mgr = get_vector_store(cfg)
     except Exception as e:
         console.print(f"[red]Vector Store 初始化失败: {e}[/red]")
+        if embed_pool is not None:
+            embed_pool.close()
         raise typer.Exit(code=1)
 
     if force:
         console.print("[yellow]警告：强制模式已开启，现有索引将被重置。[/yellow]")
-        vector_mgr.reset()
-
-    console.print("[bold blue]正在全量扫描 Vault...[/bold blue]")
-
-    files = scanner.scan_all()
-    console.print(f"[green]发现 {len(files)} 个 Markdown 笔记[/green]")
-
-    if files:
-        texts = []
-        metadatas = []
-        with console.status(f"[bold green]正在读取并向量化 {len(files)} 个文档...[/bold green]"):
-            for p in files:
-                try:
-                    content = p.read_text(encoding="utf-8", errors="ignore")
-                    if content.strip():
-                        texts.append(content)
-                        metadatas.append({"source": str(p.name), "path": str(p)})
-                except Exception as e:
-                    console.print(f"[red]读取文件 {p.name} 失败: {e}[/red]")
-
-            if texts:
-                vector_mgr.add_texts(texts, metadatas)
-                console.print(f"[green]成功索引了 {len(texts)} 个文档！[/green]")
-
-    save_last_run_time()
+        try:
+            vector_mgr.reset()
+        except RuntimeError as e:
+            console.print(f"[red]{e}[/red]")
+            raise typer.Exit(code=1)
+        # 清除索引进度，确保所有笔记重新写入 (Embedding 缓存仍可复用)
+        manifest.reset_state(embedded=False)
+        manifest.save()
+
+    console.print("[bold blue]正在流式扫描并索引 Vault...[/bold blue]")
+
+    indexer = StreamingIndexer(
+        vector_mgr,
+        manifest,
+        batch_size=cfg.embedding.batch_size,
+        checkpoint_interval=cfg.embedding.checkpoint_interval,
+        embed_pool=embed_pool,
+        tag_index=get_tag_index(cfg)
+    )
+    try:
+        with console.status("[bold green]正在读取并向量化文档...[/bold green]"):
+            stats = indexer.run(scanner.iter_all())
+    finally:
+        if embed_pool is not None:
+            embed_pool.close()
+
+    console.print(f"[green]发现 {stats.scanned} 个 Markdown 笔记：新索引 {stats.indexed} 篇，"
+                  f"跳过已索引 {stats.skipped} 篇，空笔记 {stats.empty} 篇[/green]")
+    if stats.removed:
+        console.print(f"[dim]已从向量库中清理 {stats.removed} 篇已删除或重命名的笔记[/dim]")
+    if stats.failed:
+        console.print(f"[yellow]⚠ 有 {stats.failed} 篇笔记索引失败，再次运行 init 将从断点继续[/yellow]")
+
+    if precompute_summaries:
+        run_precompute_summaries(cfg, scanner.iter_all())
+
+    print_embedding_cache_stats(vector_mgr)
     console.print("[bold green]✔ 初始化完成！索引已建立。[/bold green]")
 
 @app.command()
 def update(
     config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径"),
-    dry_run: bool = typer.Option(False, "--dry-run", help="仅模拟运行，不修改文件"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="仅模拟运行，不修改文件 (结果写入计划文件，可用 apply 执行)"),
+    plan_path: Optional[Path] = typer.Option(None, "--plan", help="dry-run 计划文件的输出路径 (默认写入 .auto_link_plans/)"),
+    workers: Optional[int] = typer.Option(None, "--workers", "-w", min=1, help="并发处理笔记的 worker 数量 (默认读取配置)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="不使用 LLM 响应缓存 (强制重新调用模型)"),
     verbose: bool = typer.Option(False, "--verbose", "-v", help="显示详细日志")
 ):
     """
     每日任务：扫描新增/修改的笔记，自动打标并生成链接。
     """
+    from datetime import datetime
+    from src.core.llm import LLMClient
+    from src.core.pipeline import UpdatePipeline
+    from src.core.plan import UpdatePlan
+
     cfg = get_config_or_exit(config_path)
     backup_mgr = get_backup_manager(cfg)
-    scanner = VaultScanner(cfg.vault_path)
+    scanner = get_scanner(cfg)
     tag_mgr = TagManager()
+    manifest = get_manifest(cfg)
+    tag_index = get_tag_index(cfg)
+    if no_cache:
+        disable_llm_caches(cfg)
 
     # 初始化组件
     try:
         llm_client = LLMClient(cfg)
-        vector_mgr = VectorStoreManager(cfg.embedding, cfg.get_active_llm_config())
+        vector_mgr = get_vector_store(cfg)
     except Exception as e:
         console.print(f"[red]组件初始化失败: {e}[/red]")
         raise typer.Exit(code=1)
@@ -225,170 +455,360 @@ def update(
 
     backup_mgr.prune_old_backups()
 
-    last_run = get_last_run_time()
+    # 清单为空时 (首次升级)，以旧版 .last_run 作为基线
+    legacy_last_run = get_last_run_time() if manifest.is_empty() else 0.0
     console.print("正在检查变更文件...")
-    changed_files = scanner.scan_changes(last_run)
+    seen = set()
+    changed_files = scanner.scan_changes(manifest, legacy_last_run, seen=seen)
+
+    # 已从 Vault 中删除或重命名的笔记：一次性清理其向量与清单记录
+    if not cfg.pipeline.dry_run:
+        removed = manifest.retain(seen)
+        if removed:
+            vector_mgr.delete_notes(removed)
+            tag_index.remove_notes(removed)
+            console.print(f"[dim]已从向量库中清理 {len(removed)} 篇已删除或重命名的笔记[/dim]")
 
     if not changed_files:
+        if not cfg.pipeline.dry_run:
+            manifest.save()
         console.print("[dim]没有发现变更。[/dim]")
         return
 
     console.print(f"[green]发现 {len(changed_files)} 个变更文件[/green]")
 
-    failed_count = 0
+    workers = workers if workers is not None else cfg.pipeline.workers
+    if workers > 1:
+        console.print(f"[dim]并发模式: {workers} 个 worker[/dim]")
 
-    for file_path in changed_files:
-        try:
-            rel_path = file_path.relative_to(cfg.vault_path)
-            console.print(f"\n[bold]处理文件: {rel_path}[/bold]")
+    pipeline = UpdatePipeline(cfg, llm_client, vector_mgr, tag_mgr, backup_mgr, manifest, tag_index)
+    if cfg.pipeline.dry_run:
+        pipeline.plan = UpdatePlan(vault_path=str(cfg.vault_path))
+    failed_count = pipeline.run(changed_files, workers=workers)
 
-            # 1. 备份
-            if not cfg.pipeline.dry_run:
-                backup_mgr.backup_file(file_path)
-
-            # 2. 初始化 FileModifier 进行内容读取和操作
-            try:
-                modifier = FileModifier(file_path)
-                content = modifier.post.content # 正文内容
-
-                # --- 自动收割现有 Tags ---
-                current_tags = modifier.post.get("tags", [])
-
-                # 确保 current_tags 是列表
-                if current_tags is None:
-                    current_tags = []
-                elif isinstance(current_tags, str):
-                    current_tags = [current_tags]
-
-                # 如果还不是列表（比如是 int/float），强制转为列表
-                if not isinstance(current_tags, list):
-                    current_tags = [str(current_tags)]
-
-                # 收割逻辑
-                for t in current_tags:
-                    t = str(t).strip()
-                    if t and t not in tag_mgr.get_all_tags() and not tag_mgr.is_blacklisted(t):
-                        if not cfg.pipeline.dry_run:
-                            if tag_mgr.add_tag(t):
-                                console.print(f"  [cyan]🎓 学习到用户自定义标签: {t}[/cyan]")
-
-            except Exception as e:
-                console.print(f"[yellow]文件解析警告: {e}，跳过处理[/yellow]")
-                failed_count += 1
-                continue
-
-            if not content.strip():
-                continue
-
-            # 3. LLM Tagging
-            existing_tags = tag_mgr.get_all_tags()
-            new_tags = llm_client.generate_tags(content, existing_tags)
-
-            # 过滤黑名单标签
-            valid_new_tags = [t for t in new_tags if not tag_mgr.is_blacklisted(t)]
-            if len(valid_new_tags) < len(new_tags):
-                console.print(f"  [dim]已过滤 {len(new_tags)-len(valid_new_tags)} 个黑名单标签[/dim]")
-
-            console.print(f"  🤖 建议标签: {valid_new_tags}")
-
-            # 应用标签 (FileModifier 会自动合并去重)
-            if modifier.update_tags(valid_new_tags):
-                console.print("  [green]✔ 标签已更新[/green]")
-                # 学习新标签
-                if not cfg.pipeline.dry_run:
-                    for t in valid_new_tags:
-                        if tag_mgr.add_tag(t):
-                            console.print(f"  [dim]新标签 '{t}' 已加入白名单[/dim]")
-
-            # 4. LLM Linking
-            # 先检索
-            related_docs_raw = vector_mgr.search(content, k=3)
-            # [调试] 打印检索到的原始结果
-            console.print(f"[debug] 原始检索结果: {[doc.metadata.get('source') for doc, score in related_docs_raw]}")
-
-            related_docs = []
-            for doc, score in related_docs_raw:
-                if doc.metadata.get("source") == file_path.name:
-                    continue
-                related_docs.append({
-                    "source": doc.metadata.get("source", "Unknown"),
-                    "path": doc.metadata.get("path", ""),
-                    "content": doc.page_content
-                })
-
-            if related_docs:
-                console.print(f"  🔍 检索到 {len(related_docs)} 篇相关笔记: {[d['source'] for d in related_docs]}")
-                insight = llm_client.generate_insight(file_path.stem, content, related_docs)
-                if insight:
-                    console.print(Panel(insight, title="生成的关联见解", border_style="magenta"))
-                    modifier.append_callout(insight)
-                    console.print("  [green]✔ 见解已追加[/green]")
-
-            # 5. 保存修改 & 更新向量库
-            if not cfg.pipeline.dry_run:
-                # FileModifier.save() 会负责根据标签数量自动调整 YAML 格式
-                modifier.save()
-
-                # 存入向量库
-                vector_mgr.add_texts([content], [{"source": file_path.name, "path": str(file_path)}])
-
-        except Exception as e:
-            console.print(f"[red]处理文件 {file_path.name} 出错: {e}[/red]")
-            failed_count += 1
-            # 打印完整的错误栈以便调试
-            # import traceback; traceback.print_exc()
+    vector_mgr.flush_cache()
+    print_embedding_cache_stats(vector_mgr)
+    print_llm_cache_stats(llm_client)
 
     if not cfg.pipeline.dry_run:
+        manifest.save()
         if failed_count == 0:
-            save_last_run_time()
-            console.print("[bold green]✔ 所有文件处理成功，已更新运行时间戳。[/bold green]")
+            console.print("[bold green]✔ 所有文件处理成功，已更新文件清单。[/bold green]")
         else:
-            console.print(f"[yellow]⚠ 有 {failed_count} 个文件处理失败，未更新时间戳。下次运行时将重试。[/yellow]")
+            console.print(f"[yellow]⚠ 有 {failed_count} 个文件处理失败，未记入清单。下次运行时将重试。[/yellow]")
+    elif pipeline.plan is not None:
+        if plan_path is None:
+            plan_path = PLAN_DIR / f"plan-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        pipeline.plan.save(plan_path)
+        console.print(f"[bold cyan]计划已写入 {plan_path} ({len(pipeline.plan.entries)} 个文件)，"
+                      f"确认无误后运行 apply {plan_path} 执行[/bold cyan]")
 
     console.print("[bold green]✔ 更新完成！[/bold green]")
 
+@app.command()
+def apply(
+    plan_file: Path = typer.Argument(..., help="update --dry-run 生成的计划文件"),
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径")
+):
+    """
+    执行 dry-run 生成的计划：直接写入计划中的标签与见解，不再调用 LLM。
+    生成计划后被修改过的文件会被跳过。
+    """
+    from src.core.llm import LLMClient
+    from src.core.pipeline import UpdatePipeline
+    from src.core.plan import UpdatePlan
+
+    cfg = get_config_or_exit(config_path)
+    try:
+        plan = UpdatePlan.load(plan_file)
+    except Exception as e:
+        console.print(f"[red]计划文件读取失败: {e}[/red]")
+        raise typer.Exit(code=1)
+
+    if plan.vault_path and Path(plan.vault_path) != cfg.vault_path:
+        console.print(f"[red]计划属于另一个 Vault ({plan.vault_path})，当前配置为 {cfg.vault_path}[/red]")
+        raise typer.Exit(code=1)
+
+    # apply 本身就是执行计划：即使配置中开启了 pipeline.dry_run 也要真正写入
+    if cfg.pipeline.dry_run:
+        console.print("[dim]忽略配置中的 pipeline.dry_run (apply 总是写入文件)[/dim]")
+        cfg.pipeline.dry_run = False
+
+    backup_mgr = get_backup_manager(cfg)
+    tag_mgr = TagManager()
+    manifest = get_manifest(cfg)
+    tag_index = get_tag_index(cfg)
+
+    # 初始化组件 (LLMClient 只用于清理摘要缓存，不会发起调用)
+    try:
+        llm_client = LLMClient(cfg)
+        vector_mgr = get_vector_store(cfg)
+    except Exception as e:
+        console.print(f"[red]组件初始化失败: {e}[/red]")
+        raise typer.Exit(code=1)
+
+    console.print(Panel(f"[bold blue]执行计划[/bold blue]\n计划文件: {plan_file}\n文件数: {len(plan.entries)}"))
+    backup_mgr.prune_old_backups()
+
+    pipeline = UpdatePipeline(cfg, llm_client, vector_mgr, tag_mgr, backup_mgr, manifest, tag_index)
+    stats = pipeline.apply(plan)
+
+    vector_mgr.flush_cache()
+    manifest.save()
+    console.print(f"[bold green]✔ 计划执行完成：应用 {stats['applied']} 个，"
+                  f"跳过 {stats['skipped']} 个，失败 {stats['failed']} 个[/bold green]")
+
+@app.command()
+def watch(
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径"),
+    workers: Optional[int] = typer.Option(None, "--workers", "-w", min=1, help="并发处理笔记的 worker 数量 (默认读取配置)"),
+    polling: bool = typer.Option(False, "--polling", help="强制使用轮询模式 (不使用文件系统事件)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="不使用 LLM 响应缓存 (强制重新调用模型)")
+):
+    """
+    监听模式：笔记保存后数秒内自动打标并生成链接，无需定时全量扫描。
+    """
+    from src.core.llm import LLMClient
+    from src.core.pipeline import UpdatePipeline
+    from src.core.watcher import VaultWatcher
+
+    cfg = get_config_or_exit(config_path)
+    backup_mgr = get_backup_manager(cfg)
+    scanner = get_scanner(cfg)
+    tag_mgr = TagManager()
+    manifest = get_manifest(cfg)
+    tag_index = get_tag_index(cfg)
+    if no_cache:
+        disable_llm_caches(cfg)
+
+    # 初始化组件
+    try:
+        llm_client = LLMClient(cfg)
+        vector_mgr = get_vector_store(cfg)
+    except Exception as e:
+        console.print(f"[red]组件初始化失败: {e}[/red]")
+        raise typer.Exit(code=1)
+
+    if manifest.is_empty():
+        console.print("[yellow]文件清单为空，请先运行 init 建立基线，否则首次变更检测会处理整个 Vault。[/yellow]")
+
+    backup_mgr.prune_old_backups()
+
+    workers = workers if workers is not None else cfg.pipeline.workers
+    pipeline = UpdatePipeline(cfg, llm_client, vector_mgr, tag_mgr, backup_mgr, manifest, tag_index)
+
+    def on_changes(files: List[Path]):
+        console.print(f"\n[green]检测到 {len(files)} 个笔记变更[/green]")
+        # 每批变更作为一次独立的运行，可单独撤销
+        failed_count = pipeline.run(files, workers=workers, command="watch")
+        vector_mgr.flush_cache()
+        manifest.save()
+        if failed_count:
+            console.print(f"[yellow]⚠ 有 {failed_count} 个文件处理失败，下次变更时将重试。[/yellow]")
+
+    def on_removed(note_ids: List[str]):
+        # 已删除或重命名的笔记：清理旧路径的向量与标签索引 (清单记录已由 watcher 移除)
+        vector_mgr.delete_notes(note_ids)
+        tag_index.remove_notes(note_ids)
+        manifest.save()
+        console.print(f"[dim]已从向量库中清理 {len(note_ids)} 篇已删除或重命名的笔记[/dim]")
+
+    watcher = VaultWatcher(
+        scanner,
+        manifest,
+        on_changes,
+        debounce_seconds=cfg.watch.debounce_seconds,
+        poll_interval=cfg.watch.poll_interval,
+        backend="polling" if polling else cfg.watch.backend,
+        on_removed=on_removed
+    )
+    try:
+        watcher.run()
+    except RuntimeError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        manifest.save()
+
 @app.command()
 def restore(
     config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径"),
     date: Optional[str] = typer.Option(None, help="恢复该日期修改的所有文件 (格式: YYYY-MM-DD)"),
     file: Optional[str] = typer.Option(None, help="恢复特定文件 (相对路径)"),
+    version: Optional[int] = typer.Option(None, "--version", help="配合 --file 使用：恢复指定版本 (见 backups versions)"),
+    run: Optional[str] = typer.Option(None, "--run", help="撤销一次运行的全部修改 (运行 ID 见 backups runs)"),
+    at: Optional[str] = typer.Option(None, "--at", help="把之后被修改过的文件恢复到该时间点 (格式: YYYY-MM-DD HH:MM)"),
     confirm: bool = typer.Option(False, "--yes", "-y", help="跳过确认提示")
 ):
     """
     回滚操作：将文件恢复到修改前的状态。
     """
+    from datetime import datetime
+
     cfg = get_config_or_exit(config_path)
-    backup_mgr = get_backup_manager(cfg)
 
-    if not date and not file:
-        console.print("[bold red]错误：必须指定 --date 或 --file[/bold red]")
+    if not any((date, file, run, at)):
+        console.print("[bold red]错误：必须指定 --date、--file、--run 或 --at[/bold red]")
+        raise typer.Exit(code=1)
+    if version is not None and not file:
+        console.print("[bold red]错误：--version 需要与 --file 一起使用[/bold red]")
         raise typer.Exit(code=1)
 
+    point = None
+    if at:
+        try:
+            point = datetime.fromisoformat(at)
+        except ValueError:
+            console.print(f"[bold red]错误：无法解析时间 '{at}' (格式: YYYY-MM-DD HH:MM)[/bold red]")
+            raise typer.Exit(code=1)
+
+    backup_mgr = get_backup_manager(cfg)
     console.print(Panel(f"[bold red]启动回滚程序[/bold red]\n备份路径: {cfg.safety.backup_path}"))
 
     if date:
         console.print(f"准备回滚日期: [bold]{date}[/bold]")
+    if run:
+        console.print(f"准备撤销运行: [bold]{run}[/bold]")
+    if point:
+        console.print(f"准备恢复到时间点: [bold]{point:%Y-%m-%d %H:%M:%S}[/bold]")
     if file:
-        console.print(f"准备回滚文件: [bold]{file}[/bold]")
+        console.print(f"准备回滚文件: [bold]{file}[/bold]" + (f" (版本 {version})" if version is not None else ""))
 
     if not confirm:
         if not typer.confirm("你确定要执行回滚吗？这将覆盖当前文件。"):
             console.print("[yellow]操作已取消[/yellow]")
             raise typer.Exit()
 
-    if date:
-        count = backup_mgr.restore_by_date(date)
+    for restore_fn, arg in ((backup_mgr.restore_by_date, date),
+                            (backup_mgr.restore_run, run),
+                            (backup_mgr.restore_to_time, point)):
+        if not arg:
+            continue
+        count = restore_fn(arg)
         if count > 0:
             console.print(f"[bold green]成功恢复了 {count} 个文件！[/bold green]")
         else:
             console.print("[yellow]没有文件被恢复。[/yellow]")
 
     if file:
-        success = backup_mgr.restore_file(file)
+        success = backup_mgr.restore_file(file, version_id=version)
         if not success:
              raise typer.Exit(code=1)
 
     console.print("[bold green]✔ 回滚操作结束！[/bold green]")
 
+# -----------------------------------------------------------------------------
+# Backup Commands
+# -----------------------------------------------------------------------------
+@backups_app.command("runs")
+def backup_runs(
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径"),
+    limit: int = typer.Option(20, "--limit", "-n", min=1, help="显示最近的 N 次运行")
+):
+    """列出最近的运行及其修改的文件数 (用于 restore --run)"""
+    from datetime import datetime
+    from rich.table import Table
+
+    cfg = get_config_or_exit(config_path)
+    runs = get_backup_manager(cfg).list_runs(limit)
+    if not runs:
+        console.print("[yellow]没有任何备份记录[/yellow]")
+        return
+
+    table = Table(title="备份运行记录")
+    table.add_column("运行 ID", style="cyan")
+    table.add_column("开始时间")
+    table.add_column("命令")
+    table.add_column("文件数", justify="right")
+    table.add_column("状态")
+    for r in runs:
+        table.add_row(r["run_id"], datetime.fromtimestamp(r["started"]).strftime("%Y-%m-%d %H:%M:%S"),
+                      r["command"], str(r["files"]),
+                      "完成" if r["finished"] is not None else "[yellow]进行中 / 已中断[/yellow]")
+    console.print(table)
+
+@backups_app.command("versions")
+def backup_versions(
+    file: str = typer.Argument(..., help="笔记路径 (相对于 Vault)"),
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径")
+):
+    """列出文件的所有备份版本 (用于 restore --file --version)"""
+    from datetime import datetime
+    from rich.table import Table
+
+    cfg = get_config_or_exit(config_path)
+    versions = get_backup_manager(cfg).list_versions(file)
+    if not versions:
+        console.print(f"[yellow]文件 {file} 没有备份记录[/yellow]")
+        return
+
+    table = Table(title=f"{file} 的备份版本")
+    table.add_column("版本", justify="right", style="cyan")
+    table.add_column("备份时间")
+    table.add_column("大小", justify="right")
+    table.add_column("运行 ID")
+    for v in versions:
+        table.add_row(str(v["id"]), datetime.fromtimestamp(v["time"]).strftime("%Y-%m-%d %H:%M:%S"),
+                      f"{v['size']:,} B", v["run_id"])
+    console.print(table)
+
+# -----------------------------------------------------------------------------
+# Daemon Commands
+# -----------------------------------------------------------------------------
+@daemon_app.command("start")
+def daemon_start(
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径")
+):
+    """在前台启动守护进程 (可用 nohup 或 systemd 放到后台)"""
+    from src.core.daemon import VectorStoreDaemon
+
+    cfg = get_config_or_exit(config_path)
+    try:
+        daemon = VectorStoreDaemon(
+            cfg,
+            Path(cfg.daemon.socket_path),
+            idle_timeout=cfg.daemon.idle_timeout_minutes * 60
+        )
+        daemon.serve()
+    except Exception as e:
+        console.print(f"[red]守护进程启动失败: {e}[/red]")
+        raise typer.Exit(code=1)
+
+@daemon_app.command("stop")
+def daemon_stop(
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径")
+):
+    """停止守护进程"""
+    from src.core.daemon import DaemonClient, ping_daemon
+
+    cfg = get_config_or_exit(config_path)
+    socket_path = Path(cfg.daemon.socket_path)
+    if ping_daemon(socket_path) is None:
+        console.print("[dim]守护进程未运行。[/dim]")
+        return
+    client = DaemonClient(socket_path, timeout=10)
+    try:
+        client.call("shutdown")
+    finally:
+        client.close()
+    console.print("[green]✔ 守护进程已停止[/green]")
+
+@daemon_app.command("status")
+def daemon_status(
+    config_path: str = typer.Option("config.yaml", "--config", "-c", help="配置文件路径")
+):
+    """查看守护进程状态"""
+    from src.core.daemon import ping_daemon
+
+    cfg = get_config_or_exit(config_path)
+    info = ping_daemon(Path(cfg.daemon.socket_path))
+    if info is None:
+        console.print("[dim]守护进程未运行。[/dim]")
+    else:
+        console.print(Panel(f"PID: {info['pid']}\n"
+                            f"Embedding模型: {info['model_name']} ({info['embedding_type']})\n"
+                            f"向量库: {info['persist_directory']}",
+                            title="守护进程运行中", border_style="green"))
+
 if __name__ == "__main__":
     app()
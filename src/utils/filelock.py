@@ -0,0 +1,27 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError: # Windows：没有 flock，退化为不加锁 (仅进程内线程锁生效)
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    跨进程互斥锁 (fcntl.flock 独占锁)，锁文件不存在时自动创建。
+    进程退出时锁由内核自动释放，不会因崩溃留下死锁。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,30 @@
+import hashlib
+
+from frontmatter.default_handlers import YAMLHandler
+
+_YAML_HANDLER = YAMLHandler()
+
+
+def hash_text(text: str) -> str:
+    """计算文本的 SHA-256 摘要 (十六进制)"""
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def extract_body(text: str) -> str:
+    """
+    去掉 Frontmatter，返回正文。
+    只做分割不解析 YAML，结果与 frontmatter.load(...).content 一致 (首尾空白已去除)。
+    """
+    text = text.strip()
+    if not _YAML_HANDLER.detect(text):
+        return text
+    try:
+        _, content = _YAML_HANDLER.split(text)
+    except ValueError:
+        return text
+    return content.strip()
+
+
+def hash_body(text: str) -> str:
+    """计算笔记正文 (不含 Frontmatter) 的摘要"""
+    return hash_text(extract_body(text))
@@ -0,0 +1,99 @@
+from datetime import datetime
+from pathlib import Path
+import os
+
+import pytest
+
+from src.core.backup_catalog import BackupCatalog
+from src.core.config import SafetyConfig
+from src.core.safety import BackupManager
+
+
+@pytest.fixture
+def vault(tmp_path: Path) -> Path:
+    root = tmp_path / "vault"
+    (root / "Notes").mkdir(parents=True)
+    return root
+
+
+def _manager(tmp_path: Path, vault: Path, **kwargs) -> BackupManager:
+    return BackupManager(SafetyConfig(backup_path=str(tmp_path / "backups"), **kwargs), vault)
+
+
+def _record(path: str, time: float, blob: str, run_id: str = "r1") -> dict:
+    return {"path": path, "date": "2024-01-01", "time": time, "mtime": None,
+            "blob": blob, "size": 1, "run_id": run_id}
+
+
+@pytest.mark.parametrize("compression", ["none", "zstd"])
+def test_restore_round_trip(tmp_path, vault, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    note = vault / "Notes" / "AI.md"
+    note.write_text("原始内容\n", encoding="utf-8")
+    os.utime(note, (1_700_000_000, 1_700_000_000))
+
+    manager = _manager(tmp_path, vault, backup_compression=compression)
+    assert manager.backup_file(note)
+    note.write_text("被修改的内容\n", encoding="utf-8")
+
+    assert manager.restore_file("Notes/AI.md")
+    assert note.read_text(encoding="utf-8") == "原始内容\n"
+    assert note.stat().st_mtime == 1_700_000_000
+    assert [v["path"] for v in manager.list_versions("Notes/AI.md")] == ["Notes/AI.md"]
+
+
+def test_as_of_picks_first_backup_after_the_point(tmp_path):
+    catalog = BackupCatalog(tmp_path / "catalog.sqlite3")
+    catalog.add_many([
+        _record("a.md", 100.0, "a-before"),
+        _record("a.md", 200.0, "a-first"),
+        _record("a.md", 200.0, "a-same-time"),
+        _record("a.md", 300.0, "a-later"),
+        _record("b.md", 250.0, "b-first"),
+        _record("c.md", 50.0, "c-old"),
+    ])
+
+    # 备份记录的是修改前的内容：时间点之后的第一次备份即为当时的内容，同一时刻取先写入的记录
+    assert {r["path"]: r["blob"] for r in catalog.as_of(150.0)} == {"a.md": "a-first", "b.md": "b-first"}
+    assert {r["path"]: r["blob"] for r in catalog.as_of(260.0)} == {"a.md": "a-later"}
+    assert catalog.as_of(400.0) == []
+    catalog.close()
+
+
+def test_restore_run_uses_first_version_in_run(tmp_path, vault):
+    note = vault / "Notes" / "AI.md"
+    note.write_text("v1", encoding="utf-8")
+    manager = _manager(tmp_path, vault)
+    run_id = manager.start_run("update")
+
+    manager.backup_file(note)
+    note.write_text("v2", encoding="utf-8")
+    manager.backup_file(note)
+    note.write_text("v3", encoding="utf-8")
+
+    assert [r["blob"] for r in manager.catalog.by_run(run_id)] == [manager.store.put(b"v1")]
+    assert manager.restore_run(run_id) == 1
+    assert note.read_text(encoding="utf-8") == "v1"
+
+
+def test_legacy_date_dir_is_imported_and_restorable(tmp_path, vault):
+    legacy = tmp_path / "backups" / "2024-01-05" / "Notes"
+    legacy.mkdir(parents=True)
+    old = legacy / "AI.md"
+    old.write_text("旧版备份\n", encoding="utf-8")
+    mtime = datetime(2024, 1, 5, 9, 30).timestamp()
+    os.utime(old, (mtime, mtime))
+
+    manager = _manager(tmp_path, vault)
+    assert not (tmp_path / "backups" / "2024-01-05").exists()
+    assert [r["run_id"] for r in manager.list_runs()] == ["legacy-2024-01-05"]
+
+    assert manager.restore_by_date("2024-01-05") == 1
+    restored = vault / "Notes" / "AI.md"
+    assert restored.read_text(encoding="utf-8") == "旧版备份\n"
+    assert restored.stat().st_mtime == mtime
+
+    # 再次打开不会重复导入
+    manager.catalog.close()
+    assert len(_manager(tmp_path, vault).list_versions("Notes/AI.md")) == 1
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from src.core.chunker import MarkdownChunker, estimate_tokens
+
+_WORDS = ["a", "token", "embedding", "supercalifragilistic", "x" * 300, "中文", "笔记", "，", "。", "(", "é", "_id", "42"]
+_SEPARATORS = [" ", " ", " ", "", "\n", "\n\n"]
+
+
+def _random_note(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(1, 6)):
+        if rng.random() < 0.5:
+            parts.append("#" * rng.randint(1, 3) + " 标题 " + rng.choice(_WORDS) + "\n")
+        body = "".join(rng.choice(_WORDS) + rng.choice(_SEPARATORS) for _ in range(rng.randint(0, 400)))
+        parts.append(body + "\n")
+        if rng.random() < 0.2:
+            parts.append("```\n# 代码块中的注释不是标题\n```\n")
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("max_tokens", [16, 50, 400])
+def test_chunks_respect_budget_and_rebuild_the_note(max_tokens):
+    rng = random.Random(max_tokens)
+    chunker = MarkdownChunker(max_tokens)
+    for _ in range(200):
+        text = _random_note(rng)
+        if not text.strip():
+            assert chunker.split(text) == [] # 纯空白笔记不产生分块
+            continue
+        chunks = chunker.split(text)
+        assert "".join(c.text for c in chunks) == text
+        for chunk in chunks:
+            assert estimate_tokens(chunk.text) <= max_tokens
+            assert chunk.tokens <= max_tokens
+
+
+def test_long_line_breaks_on_whitespace():
+    chunker = MarkdownChunker(16)
+    line = " ".join(["word"] * 100)
+    pieces = chunker._hard_split(line)
+    assert "".join(pieces) == line
+    assert all(estimate_tokens(p) <= 16 for p in pieces)
+    assert all(p.endswith(" ") for p in pieces[:-1])
+
+
+def test_split_is_deterministic_with_headings():
+    chunker = MarkdownChunker(16)
+    text = "# 安装\n\n" + "依赖 " * 20 + "\n## 依赖\n\n" + "pip install " * 10
+    first, second = chunker.split(text), chunker.split(text)
+    assert [c.hash for c in first] == [c.hash for c in second]
+    assert first[0].heading == "安装"
+    assert first[-1].heading == "安装 > 依赖"
+    assert [c.index for c in first] == list(range(len(first)))
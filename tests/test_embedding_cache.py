@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import numpy as np
+
+from src.core.embedding_cache import EmbeddingCache
+
+
+def test_round_trip_after_reopen(tmp_path: Path):
+    cache = EmbeddingCache(tmp_path, "model/a")
+    cache.put_many(["k1", "k2"], [[1.0, 2.0], [3.0, 4.0]])
+    cache.save()
+
+    reopened = EmbeddingCache(tmp_path, "model/a")
+    hit, miss = reopened.get_many(["k2", "k3"])
+    assert np.array_equal(hit, [3.0, 4.0])
+    assert miss is None
+    assert (reopened.hits, reopened.misses) == (1, 1)
+
+
+def test_two_writers_on_one_cache_dir(tmp_path: Path):
+    # 两个进程 (如 watch 与定时 update) 各自打开同一个缓存目录，交替写入与保存
+    first = EmbeddingCache(tmp_path, "m")
+    second = EmbeddingCache(tmp_path, "m")
+    first.put_many(["a"], [[1.0, 1.0]])
+    second.put_many(["b"], [[2.0, 2.0]])
+    second.save()
+    first.save()
+
+    merged = EmbeddingCache(tmp_path, "m")
+    a, b = merged.get_many(["a", "b"])
+    assert np.array_equal(a, [1.0, 1.0])
+    assert np.array_equal(b, [2.0, 2.0])
+
+
+def test_partial_row_is_truncated(tmp_path: Path):
+    cache = EmbeddingCache(tmp_path, "m")
+    cache.put_many(["a"], [[1.0, 1.0]])
+    cache.save()
+    with open(cache.data_path, "ab") as f:
+        f.write(b"\x00\x00") # 写入中断留下的半行
+
+    reopened = EmbeddingCache(tmp_path, "m")
+    reopened.put_many(["b"], [[2.0, 2.0]])
+    assert np.array_equal(reopened.get_many(["b"])[0], [2.0, 2.0])
+    assert reopened.data_path.stat().st_size == 2 * 2 * 4
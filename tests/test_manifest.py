@@ -0,0 +1,91 @@
+from pathlib import Path
+import os
+
+import pytest
+
+from src.core.manifest import VaultManifest
+
+
+@pytest.fixture
+def vault(tmp_path: Path) -> Path:
+    root = tmp_path / "vault"
+    (root / "Notes").mkdir(parents=True)
+    return root
+
+
+def _manifest(tmp_path: Path, vault: Path) -> VaultManifest:
+    return VaultManifest(vault, tmp_path / "manifest.json")
+
+
+def _write(path: Path, text: str, mtime_ns: int):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_new_file_is_changed_until_recorded(tmp_path, vault):
+    note = vault / "Notes" / "a.md"
+    _write(note, "正文\n", 1_000_000_000)
+    manifest = _manifest(tmp_path, vault)
+
+    assert manifest.is_changed(note)
+    entry = manifest.record(note, embedded=True)
+    assert entry.path == "Notes/a.md"
+    assert not manifest.is_changed(note)
+
+
+def test_stat_change_with_same_body_refreshes_stat(tmp_path, vault, monkeypatch):
+    note = vault / "Notes" / "a.md"
+    _write(note, "---\ntags: [x]\n---\n正文\n", 1_000_000_000)
+    manifest = _manifest(tmp_path, vault)
+    manifest.record(note)
+
+    # touch / 同步工具重写：mtime 变化、正文不变
+    os.utime(note, ns=(2_000_000_000, 2_000_000_000))
+    assert not manifest.is_changed(note)
+    assert manifest.get(note).mtime_ns == 2_000_000_000
+
+    # stat 一致时直接短路，不再读取文件
+    monkeypatch.setattr(Path, "read_text", lambda *a, **k: pytest.fail("不应读取文件"))
+    assert not manifest.is_changed(note)
+
+
+def test_frontmatter_only_edit_is_not_a_change(tmp_path, vault):
+    note = vault / "Notes" / "a.md"
+    _write(note, "---\ntags: [x]\n---\n正文\n", 1_000_000_000)
+    manifest = _manifest(tmp_path, vault)
+    manifest.record(note)
+
+    _write(note, "---\ntags: [x, y]\n---\n正文\n", 2_000_000_000)
+    assert not manifest.is_changed(note)
+
+    _write(note, "---\ntags: [x, y]\n---\n新的正文\n", 3_000_000_000)
+    assert manifest.is_changed(note)
+
+
+def test_state_survives_save_and_reload(tmp_path, vault):
+    a, b = vault / "Notes" / "a.md", vault / "b.md"
+    _write(a, "a", 1_000_000_000)
+    _write(b, "b", 1_000_000_000)
+    manifest = _manifest(tmp_path, vault)
+    manifest.record(a, embedded=True)
+    manifest.record(b)
+    manifest.record(a, tagged=True) # 未指定的状态字段保持不变
+    manifest.save()
+
+    reloaded = _manifest(tmp_path, vault)
+    entry = reloaded.get(a)
+    assert (entry.embedded, entry.tagged, entry.linked) == (True, True, False)
+    assert not reloaded.is_changed(b)
+
+
+def test_remove_and_retain(tmp_path, vault):
+    notes = [vault / f"{name}.md" for name in "abc"]
+    for note in notes:
+        _write(note, note.stem, 1_000_000_000)
+    manifest = _manifest(tmp_path, vault)
+    for note in notes:
+        manifest.record(note)
+
+    assert manifest.remove(["a.md", "missing.md"]) == ["a.md"]
+    assert manifest.retain({"c.md"}) == ["b.md"]
+    assert list(manifest.entries) == ["c.md"]
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import rate_limiter
+from src.core.rate_limiter import TokenBucket, call_with_retry
+
+
+class FakeClock:
+    """替换 rate_limiter 模块中的 time：sleep 直接推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return fake
+
+
+class HttpError(Exception):
+    def __init__(self, status_code: int, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def test_bucket_refills_at_the_configured_rate(clock):
+    bucket = TokenBucket(60) # 每秒 1 个，容量 10
+    for _ in range(10):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+
+    clock.now += 100 # 空闲后最多积攒到容量上限
+    bucket._refill()
+    assert bucket.tokens == pytest.approx(bucket.capacity)
+
+
+def test_oversized_request_is_charged_in_full(clock):
+    bucket = TokenBucket(600) # 每秒 10 个，容量 100
+    bucket.acquire(150) # 桶满即放行，余额变为负数
+    assert clock.sleeps == []
+    assert bucket.tokens == pytest.approx(-50)
+
+    bucket.acquire(1) # 先补回欠下的额度
+    assert sum(clock.sleeps) == pytest.approx(5.1)
+
+
+def test_429_is_retried_with_backoff(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: high)
+    calls = []
+
+    def flaky():
+        calls.append(clock.now)
+        if len(calls) < 3:
+            raise HttpError(429)
+        return "ok"
+
+    assert call_with_retry(flaky, max_retries=3, base_delay=1.0) == "ok"
+    assert clock.sleeps == [1.0, 2.0]
+
+
+def test_retry_after_is_honoured_but_capped(clock):
+    errors = [HttpError(429, {"retry-after": "120"}), HttpError(503, {"retry-after": "2"})]
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert call_with_retry(flaky, max_delay=30.0) == "ok"
+    assert clock.sleeps == [30.0, 2.0]
+
+
+def test_non_retryable_and_exhausted_errors_are_raised(clock):
+    with pytest.raises(HttpError):
+        call_with_retry(lambda: (_ for _ in ()).throw(HttpError(400)))
+    assert clock.sleeps == []
+
+    def always_429():
+        raise HttpError(429)
+
+    with pytest.raises(HttpError):
+        call_with_retry(always_429, max_retries=2)
+    assert len(clock.sleeps) == 2
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from src.core import response_cache
+from src.core.response_cache import ResponseCache
+
+
+def _key(model: str = "gpt-4o", template: str = "给 {note} 打标签", prompt: str = "给 A 打标签") -> str:
+    return ResponseCache.make_key("openai", model, 0.3, template, prompt)
+
+
+def test_hit_and_miss_on_prompt_or_model_change(tmp_path: Path):
+    cache = ResponseCache(tmp_path / "responses.sqlite3")
+    cache.put(_key(), '{"tags": ["AI"]}', "openai", "gpt-4o")
+
+    assert cache.get(_key()) == '{"tags": ["AI"]}'
+    assert cache.get(_key(model="gpt-4o-mini")) is None
+    assert cache.get(_key(template="为 {note} 推荐标签")) is None
+    assert cache.get(_key(prompt="给 B 打标签")) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    cache.discard(_key())
+    assert cache.get(_key()) is None
+    cache.close()
+
+
+def test_entries_persist_and_expire(tmp_path: Path, monkeypatch):
+    clock = {"now": 1_000.0}
+    monkeypatch.setattr(response_cache.time, "time", lambda: clock["now"])
+    cache = ResponseCache(tmp_path / "responses.sqlite3", ttl_seconds=60)
+    cache.put(_key(), "cached")
+    cache.close()
+
+    clock["now"] += 30
+    reopened = ResponseCache(tmp_path / "responses.sqlite3", ttl_seconds=60)
+    assert reopened.get(_key()) == "cached"
+
+    clock["now"] += 61
+    assert reopened.get(_key()) is None
+    reopened.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path, monkeypatch):
+    clock = {"now": 1_000.0}
+    monkeypatch.setattr(response_cache.time, "time", lambda: clock["now"])
+    cache = ResponseCache(tmp_path / "responses.sqlite3", max_entries=2)
+    for name in ("a", "b"):
+        clock["now"] += 1
+        cache.put(name, name)
+    clock["now"] += 1
+    cache.get("a") # a 最近被访问，b 先被淘汰
+    clock["now"] += 1
+    cache.put("c", "c")
+
+    assert [cache.get(k) for k in ("a", "b", "c")] == ["a", None, "c"]
+    cache.close()
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from src.core.summary_cache import SummaryCache
+
+
+def test_hit_and_miss_on_content_prompt_or_model_change(tmp_path: Path):
+    cache = SummaryCache(tmp_path / "summaries.sqlite3")
+    key = SummaryCache.make_key("content-v1", "prompt-v1", "openai:gpt-4o")
+    cache.put(key, "摘要", "content-v1", "Notes/AI.md")
+
+    assert cache.get(key) == "摘要"
+    assert cache.get(SummaryCache.make_key("content-v2", "prompt-v1", "openai:gpt-4o")) is None
+    assert cache.get(SummaryCache.make_key("content-v1", "prompt-v2", "openai:gpt-4o")) is None
+    assert cache.get(SummaryCache.make_key("content-v1", "prompt-v1", "openai:gpt-4o-mini")) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+    cache.close()
+
+
+def test_new_content_replaces_old_summary_of_the_same_note(tmp_path: Path):
+    cache = SummaryCache(tmp_path / "summaries.sqlite3")
+    old = SummaryCache.make_key("v1", "p", "m")
+    new = SummaryCache.make_key("v2", "p", "m")
+    other = SummaryCache.make_key("x", "p", "m")
+    cache.put(old, "旧摘要", "v1", "a.md")
+    cache.put(other, "其他笔记", "x", "b.md")
+    cache.put(new, "新摘要", "v2", "a.md")
+
+    assert cache.get(old) is None
+    assert cache.get(new) == "新摘要"
+    assert cache.get(other) == "其他笔记"
+
+    assert cache.invalidate("a.md", keep_hash="v2") == 0
+    assert cache.invalidate("a.md") == 1
+    assert cache.get(new) is None
+    cache.close()
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import pytest
+
+from src.core.tag_index import TagIndex
+
+
+@pytest.fixture
+def index(tmp_path: Path) -> TagIndex:
+    idx = TagIndex(tmp_path / "tags.sqlite3")
+    idx.set_many([
+        ("a.md", ["AI", "Python", "AI", " "]), # 重复与空白标签被忽略
+        ("b.md", ["AI"]),
+        ("c.md", []),
+    ])
+    yield idx
+    idx.close()
+
+
+def test_counts_and_lookups(index):
+    assert index.note_count() == 3
+    assert index.tag_counts() == {"AI": 2, "Python": 1}
+    assert index.tags_of("a.md") == ["AI", "Python"]
+    assert index.notes_with("AI") == ["a.md", "b.md"]
+    assert index.untagged_count() == 1
+    assert sorted(map(sorted, index.tag_lists())) == [["AI"], ["AI", "Python"]]
+
+
+def test_retagging_and_removal_update_counts(index):
+    index.set_note_tags("a.md", ["Rust"])
+    assert index.tag_counts() == {"AI": 1, "Rust": 1}
+
+    assert index.retain({"a.md", "c.md"}) == 1
+    assert index.tag_counts() == {"Rust": 1}
+    assert sorted(index.note_ids()) == ["a.md", "c.md"]
+
+
+def test_orphans_and_prompt_vocabulary(index):
+    whitelist = ["AI", "Python", "Unused"]
+    assert index.orphans(whitelist) == ["Unused"]
+    assert index.orphans(whitelist, max_notes=1) == ["Python", "Unused"]
+    assert index.prompt_vocabulary(whitelist, min_notes=2) == ["AI"]
+    assert index.prompt_vocabulary(whitelist, min_notes=0) == whitelist
+
+
+def test_completion_flag_persists(tmp_path: Path):
+    idx = TagIndex(tmp_path / "tags.sqlite3")
+    assert not idx.is_complete
+    idx.mark_complete()
+    idx.close()
+    assert TagIndex(tmp_path / "tags.sqlite3").is_complete
@@ -0,0 +1,117 @@
+from pathlib import Path
+from typing import List
+import hashlib
+import uuid
+
+import chromadb
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from src.core.config import EmbeddingConfig, ProviderConfig
+from src.core.vector_store import VectorStoreManager
+
+
+class FakeEmbeddings(Embeddings):
+    """按文本哈希生成确定性向量，测试中不加载任何模型"""
+
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255 for b in digest[:8]]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+def _section(title: str) -> str:
+    return f"# {title}\n\n" + " ".join(f"{title.lower()}{i}" for i in range(40)) + "\n\n"
+
+
+def _open(tmp_path: Path, vault: Path) -> VectorStoreManager:
+    return VectorStoreManager(
+        EmbeddingConfig(chunk_max_tokens=16, cache_enable=False),
+        ProviderConfig(provider_type="openai", model="test"),
+        persist_directory=str(tmp_path / "chroma"),
+        embedding_model=FakeEmbeddings(),
+        vault_root=vault,
+    )
+
+
+def _ids(mgr: VectorStoreManager, note_id: str) -> List[str]:
+    return sorted(mgr.collection.get(where={"note_id": note_id})["ids"])
+
+
+@pytest.fixture
+def vault(tmp_path: Path) -> Path:
+    root = tmp_path / "vault"
+    root.mkdir()
+    return root
+
+
+def test_upsert_uses_stable_ids_and_drops_stale_chunks(tmp_path, vault):
+    mgr = _open(tmp_path, vault)
+    meta = {"source": "a.md", "path": str(vault / "dir" / "a.md")}
+
+    assert mgr.add_texts([_section("One") + _section("Two") + _section("Three")], [meta], verbose=False) == 1
+    long_ids = _ids(mgr, "dir/a.md")
+    assert len(long_ids) >= 3
+    assert all(i.startswith("dir/a.md#") for i in long_ids)
+
+    # 内容未变化：不重新索引
+    assert mgr.add_texts([_section("One") + _section("Two") + _section("Three")], [meta], verbose=False) == 0
+
+    # 笔记变短：多出来的旧分块被删除，剩余分块沿用原 ID
+    assert mgr.add_texts([_section("Uno")], [meta], verbose=False) == 1
+    short_ids = _ids(mgr, "dir/a.md")
+    assert 0 < len(short_ids) < len(long_ids)
+    assert set(short_ids) <= set(long_ids)
+    assert mgr.collection.count() == len(short_ids)
+
+
+def test_legacy_chunks_get_note_id_backfilled(tmp_path, vault):
+    # 旧版数据：随机 ID，元数据只有绝对路径与文件名
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    legacy = client.get_or_create_collection(VectorStoreManager.COLLECTION_NAME)
+    legacy.add(
+        ids=[str(uuid.uuid4()), str(uuid.uuid4())],
+        embeddings=[[0.1] * 8, [0.2] * 8],
+        documents=["old a", "old b"],
+        metadatas=[
+            {"source": "a.md", "path": str(vault / "x" / "a.md")},
+            {"source": "a.md", "path": str(vault / "y" / "a.md")},
+        ],
+    )
+
+    mgr = _open(tmp_path, vault)
+    metas = mgr.collection.get(include=["metadatas"])["metadatas"]
+    assert sorted(m["note_id"] for m in metas) == ["x/a.md", "y/a.md"]
+
+
+def test_prune_removes_renamed_notes(tmp_path, vault):
+    mgr = _open(tmp_path, vault)
+    mgr.add_texts(
+        [_section("Old"), _section("Kept")],
+        [{"source": "old.md", "path": str(vault / "old.md")},
+         {"source": "kept.md", "path": str(vault / "kept.md")}],
+        verbose=False,
+    )
+    # old.md 重命名为 new.md
+    mgr.add_texts([_section("Old")], [{"source": "new.md", "path": str(vault / "new.md")}], verbose=False)
+
+    assert mgr.prune({"new.md", "kept.md"}) == 1
+    assert _ids(mgr, "old.md") == []
+    assert _ids(mgr, "new.md") and _ids(mgr, "kept.md")
+
+
+def test_prune_pages_through_the_collection(tmp_path, vault):
+    mgr = _open(tmp_path, vault)
+    mgr.WRITE_BATCH = 2 # 强制多页
+    names = [f"n{i}.md" for i in range(5)]
+    mgr.add_texts([_section(n[:2].upper()) for n in names],
+                  [{"source": n, "path": str(vault / n)} for n in names], verbose=False)
+
+    assert mgr.prune({"n0.md", "n3.md"}) == 3
+    remaining = {m["note_id"] for m in mgr.collection.get(include=["metadatas"])["metadatas"]}
+    assert remaining == {"n0.md", "n3.md"}
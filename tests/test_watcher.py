@@ -0,0 +1,50 @@
+from pathlib import Path
+import threading
+
+import pytest
+
+from src.core.manifest import VaultManifest
+from src.core.scanner import VaultScanner
+from src.core.watcher import VaultWatcher
+
+
+@pytest.mark.parametrize("backend", ["native", "polling"])
+def test_startup_catches_up_on_offline_edits(tmp_path: Path, backend):
+    if backend == "native":
+        pytest.importorskip("watchdog")
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    edited, deleted, unchanged = vault / "edited.md", vault / "deleted.md", vault / "unchanged.md"
+    for note in (edited, deleted, unchanged):
+        note.write_text(note.stem, encoding="utf-8")
+    manifest = VaultManifest(vault, tmp_path / "manifest.json")
+    for note in (edited, deleted, unchanged):
+        manifest.record(note)
+
+    # watch 停止期间：修改一篇、删除一篇
+    edited.write_text("离线修改后的正文", encoding="utf-8")
+    deleted.unlink()
+
+    dispatched, removed = [], []
+    done = threading.Event()
+
+    def on_changes(paths):
+        dispatched.extend(paths)
+        for p in paths:
+            manifest.record(p)
+        done.set()
+
+    watcher = VaultWatcher(VaultScanner(vault), manifest, on_changes,
+                           debounce_seconds=0.1, poll_interval=0.1, backend=backend,
+                           on_removed=removed.extend)
+    thread = threading.Thread(target=watcher.run, daemon=True)
+    thread.start()
+    try:
+        assert done.wait(10)
+    finally:
+        watcher.stop()
+        thread.join(10)
+
+    assert dispatched == [edited]
+    assert removed == ["deleted.md"]
+    assert "deleted.md" not in manifest.entries